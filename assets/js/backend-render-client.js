@@ -98,17 +98,66 @@
           onProgress && onProgress('✅ 渲染完成');
           return task;
         }
-        if (task.status === 'failed') {
+        if (task.status === 'failed' || task.status === 'expired') {
           throw new Error(task.error_message || '后端渲染失败');
         }
 
-        onProgress && onProgress(task.status === 'running' ? '⏳ 后端渲染中...' : '⏳ 任务排队中...');
+        onProgress && onProgress(statusMessage(task.status, task.progress));
         await sleep(pollIntervalMs);
       }
 
       throw new Error('渲染超时，请稍后重试');
     }
 
+    function statusMessage(status, progress) {
+      if (status !== 'running') return '⏳ 任务排队中...';
+      if (!progress) return '⏳ 后端渲染中...';
+      const pages = progress.pages_total > 1 ? `，第 ${progress.pages_rasterized}/${progress.pages_total} 页` : '';
+      return `⏳ 后端渲染中... ${Math.round(progress.percent)}%${pages}`;
+    }
+
+    function streamRenderTask(taskId, onProgress) {
+      return new Promise((resolve, reject) => {
+        const source = new global.EventSource(backendApiUrl(`/api/v1/render/tasks/${taskId}/events`));
+        let settled = false;
+
+        const finish = (callback, value) => {
+          if (settled) return;
+          settled = true;
+          global.clearTimeout(timer);
+          source.close();
+          callback(value);
+        };
+        const timer = global.setTimeout(() => finish(reject, new Error('渲染超时，请稍后重试')), timeoutMs);
+
+        source.addEventListener('status', (message) => {
+          const task = JSON.parse(message.data);
+          if (task.status === 'success') {
+            onProgress && onProgress('✅ 渲染完成');
+            finish(resolve, task);
+          } else if (task.status === 'failed' || task.status === 'expired') {
+            finish(reject, new Error(task.error_message || '后端渲染失败'));
+          } else {
+            onProgress && onProgress(statusMessage(task.status, task.progress));
+          }
+        });
+        // Connection problems (proxy without streaming, old server) fall back to polling.
+        source.onerror = () => finish(reject, Object.assign(new Error('事件流不可用'), { streamUnavailable: true }));
+      });
+    }
+
+    async function watchRenderTask(taskId, onProgress) {
+      if (typeof global.EventSource === 'undefined') {
+        return pollRenderTask(taskId, onProgress);
+      }
+      try {
+        return await streamRenderTask(taskId, onProgress);
+      } catch (error) {
+        if (!error.streamUnavailable) throw error;
+        return pollRenderTask(taskId, onProgress);
+      }
+    }
+
     async function fetchRenderedFile(task) {
       if (!task.file_url) {
         throw new Error('任务完成但未返回下载地址');
@@ -127,7 +176,7 @@
 
     async function runRenderTask(payload, onProgress) {
       const taskId = await submitRenderTask(payload);
-      const task = await pollRenderTask(taskId, onProgress);
+      const task = await watchRenderTask(taskId, onProgress);
       return fetchRenderedFile(task);
     }
 
@@ -150,6 +199,7 @@
       backendApiUrl,
       submitRenderTask,
       pollRenderTask,
+      watchRenderTask,
       fetchRenderedFile,
       runRenderTask,
       polishNote,
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.services.metrics import get_render_metrics, render_metric
+from app.services.render_service import task_status_counts
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+TASK_STATUSES = ("pending", "running", "success", "failed", "expired")
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request, db: Session = Depends(get_db)) -> PlainTextResponse:
+    """Prometheus text exposition of render timings, backlog, task counts and cache hit rates."""
+    executor = request.app.state.render_executor
+    counts = task_status_counts(db)
+    lines = get_render_metrics().render()
+    lines += render_metric("render_queue_depth", "Render slots taken by queued or running tasks.", {(): executor.depth})
+    lines += render_metric("render_queue_capacity", "Render slots before submissions get 503.", {(): executor.capacity})
+    lines += render_metric("render_in_flight", "Tasks currently rendering.", {(): counts.get("running", 0)})
+    lines += render_metric(
+        "render_tasks",
+        "Render tasks by status.",
+        {(("status", status),): counts.get(status, 0) for status in (*TASK_STATUSES, *sorted(set(counts) - set(TASK_STATUSES)))},
+    )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -30,6 +30,7 @@ def polish_note(payload: NotePolishRequest) -> NotePolishResponse:
             target_fill_min=result.target_fill_min,
             target_fill_max=result.target_fill_max,
             expanded_rounds=result.expanded_rounds,
+            condensed_rounds=result.condensed_rounds,
             character_count=result.character_count,
         ),
     )
@@ -1,29 +1,125 @@
-from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.core.database import get_db
-from app.services.render_service import get_render_task_or_none
+from app.core.database import get_async_db, get_db
+from app.services.batch_service import get_render_batch_or_none, iter_batch_zip
+from app.services.download_cache import IMMUTABLE_CACHE_CONTROL, DownloadEntry, etag_matches, get_download_cache
+from app.services.encoders import media_type_for
+from app.services.render_service import aget_render_task_or_none, format_profile, profile_path
+from app.services.retention import get_access_recorder
+from app.services.variants import VariantUnavailableError, get_variant, snap_width
 
 router = APIRouter()
 
 
+@router.get("/batches/{batch_id}")
+def download_render_batch(batch_id: str, db: Session = Depends(get_db)) -> StreamingResponse:
+    batch = get_render_batch_or_none(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render batch not found")
+    # Items are appended as they finish, so the archive starts downloading before the batch is done.
+    return StreamingResponse(
+        iter_batch_zip(batch.id, batch.item_count),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch-{batch.id}.zip"'},
+    )
+
+
+async def _download_entry(task_id: str, db: AsyncSession) -> DownloadEntry:
+    cache = get_download_cache()
+    entry = cache.get(task_id)
+    if entry is None:
+        task = await aget_render_task_or_none(db, task_id)
+        if not task:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render task not found")
+        if task.status == "expired":
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail=task.error_message or "Output expired")
+        if task.status != "success" or not task.output_file_path:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Task not completed. current_status={task.status}",
+            )
+        try:
+            entry = DownloadEntry.from_task(task)
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output file missing") from exc
+        cache.put(task_id, entry)
+    get_access_recorder().record(task_id)
+    return entry
+
+
+@router.get("/{task_id}/variants")
+async def download_render_variant(
+    task_id: str,
+    request: Request,
+    w: int = Query(ge=1, le=4096),
+    image_format: Literal["webp", "jpeg", "png"] = Query(default="webp", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    """
+    Downscaled copy of a finished render (the first page of paged outputs). ``w`` is rounded up to
+    one of ``variant_widths``; each derivative is generated once and stored beside the original.
+    """
+    entry = await _download_entry(task_id, db)
+    width = snap_width(w)
+    headers = {
+        "ETag": f'{entry.etag[:-1]}-w{width}-{image_format}"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    try:
+        path = await run_in_threadpool(get_variant, entry.path, width, image_format)
+    except VariantUnavailableError as exc:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    except FileNotFoundError as exc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output file missing") from exc
+    return FileResponse(path=path, media_type=media_type_for(path), headers=headers)
+
+
+@router.get("/{task_id}/profile")
+async def download_render_profile(
+    task_id: str,
+    profile_format: Literal["pstats", "text"] = Query(default="pstats", alias="format"),
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    """
+    cProfile capture of a task submitted with ``debug_profile``: the binary pstats dump (for
+    ``python -m pstats`` or snakeviz) or, with ``format=text``, the top functions by cumulative time.
+    """
+    task = await aget_render_task_or_none(db, task_id)
+    path = profile_path(task_id)
+    if not task or not path.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+    if profile_format == "text":
+        return PlainTextResponse(await run_in_threadpool(format_profile, path))
+    return FileResponse(path=path, media_type="application/octet-stream", filename=path.name)
+
+
 @router.get("/{task_id}")
-def download_render_file(task_id: str, db: Session = Depends(get_db)) -> FileResponse:
-    task = get_render_task_or_none(db, task_id)
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render task not found")
-    if task.status != "success" or not task.output_file_path:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=f"Task not completed. current_status={task.status}",
-        )
-
-    file_path = Path(task.output_file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output file missing")
-
-    filename = task.output_file_name or f"{task.id}.png"
-    return FileResponse(path=file_path, media_type="image/png", filename=filename)
+async def download_render_file(
+    task_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+) -> Response:
+    """
+    Serve a finished render. Outputs are immutable, so responses carry a strong ETag and a
+    one-year ``immutable`` Cache-Control; ``If-None-Match`` gets a 304 and ``Range`` a 206.
+    """
+    entry = await _download_entry(task_id, db)
+    headers = {"ETag": entry.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    # FileResponse handles Range/If-Range and uses zero-copy ``pathsend`` when the server offers it.
+    return FileResponse(
+        path=entry.path,
+        media_type=entry.media_type,
+        filename=entry.filename,
+        stat_result=entry.stat_result,
+        headers=headers,
+    )
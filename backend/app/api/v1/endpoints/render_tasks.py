@@ -1,19 +1,64 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_async_db, get_db
 from app.models.render_task import RenderTask
-from app.schemas.render import RenderTaskCreateRequest, RenderTaskResponse, RenderTaskSubmitResponse
-from app.services.render_service import create_render_task, get_render_task_or_none
-from app.workers.render_worker import dispatch_render_task
+from app.schemas.render import (
+    RenderBatchCreateRequest,
+    RenderBatchResponse,
+    RenderBatchSubmitResponse,
+    RenderTaskCreateRequest,
+    RenderTaskResponse,
+    RenderTaskSubmitResponse,
+)
+from app.services.batch_service import batch_status, create_render_batch, get_render_batch_or_none, list_batch_tasks
+from app.services.render_service import (
+    aget_render_task_or_none,
+    create_render_task,
+    get_render_task_or_none,
+    profile_path,
+    render_preview,
+)
+from app.services.task_events import get_task_event_bus, watch_task
+from app.workers.executor import DatabaseRenderQueue, RenderDispatchError, RenderExecutor, RenderQueueFullError
 
 router = APIRouter()
 
 
+def get_render_executor(request: Request) -> RenderExecutor | DatabaseRenderQueue:
+    return request.app.state.render_executor
+
+
+def _reserve_or_503(executor: RenderExecutor | DatabaseRenderQueue, slots: int = 1) -> None:
+    try:
+        executor.reserve(slots)
+    except RenderQueueFullError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="渲染队列已满，请稍后重试",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+def _dispatch_failed_503(exc: RenderDispatchError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="渲染进程不可用，请稍后重试",
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 def _to_render_task_response(task: RenderTask) -> RenderTaskResponse:
     file_url = None
     if task.status == "success":
         file_url = f"/api/v1/files/{task.id}"
+    profile_url = None
+    if task.input_json.get("debug_profile") and profile_path(task.id).is_file():
+        profile_url = f"/api/v1/files/{task.id}/profile"
 
     return RenderTaskResponse(
         task_id=task.id,
@@ -21,6 +66,9 @@ def _to_render_task_response(task: RenderTask) -> RenderTaskResponse:
         input_json=task.input_json,
         file_url=file_url,
         error_message=task.error_message,
+        progress=(task.status == "running" and get_task_event_bus().latest_progress(task.id)) or task.progress_json,
+        timings=task.timings_json,
+        profile_url=profile_url,
         created_at=task.created_at,
         updated_at=task.updated_at,
         completed_at=task.completed_at,
@@ -30,17 +78,129 @@ def _to_render_task_response(task: RenderTask) -> RenderTaskResponse:
 @router.post("/tasks", response_model=RenderTaskSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
 def submit_render_task(
     payload: RenderTaskCreateRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
+    executor: RenderExecutor | DatabaseRenderQueue = Depends(get_render_executor),
 ) -> RenderTaskSubmitResponse:
-    task = create_render_task(db, payload)
-    background_tasks.add_task(dispatch_render_task, task.id)
+    _reserve_or_503(executor)
+    try:
+        task = create_render_task(db, payload)
+    except Exception:
+        executor.release()
+        raise
+    if task.status == "pending":
+        try:
+            executor.submit(task.id, task.cache_key)
+        except RenderDispatchError as exc:
+            raise _dispatch_failed_503(exc) from exc
+    else:
+        executor.release()
     return RenderTaskSubmitResponse(task_id=task.id, status=task.status)
 
 
 @router.get("/tasks/{task_id}", response_model=RenderTaskResponse)
-def get_render_task(task_id: str, db: Session = Depends(get_db)) -> RenderTaskResponse:
-    task = get_render_task_or_none(db, task_id)
+async def get_render_task(task_id: str, db: AsyncSession = Depends(get_async_db)) -> RenderTaskResponse:
+    task = await aget_render_task_or_none(db, task_id)
     if not task:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render task not found")
     return _to_render_task_response(task)
+
+
+@router.get("/tasks/{task_id}/events", response_class=StreamingResponse)
+def stream_render_task_events(task_id: str, db: Session = Depends(get_db)) -> StreamingResponse:
+    """Server-sent events: the current status, then every transition until success or failure."""
+    if not get_render_task_or_none(db, task_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render task not found")
+
+    async def events():
+        async for event in watch_task(task_id):
+            yield f"event: status\ndata: {event.to_json()}\n\n" if event else ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/tasks/{task_id}/ws")
+async def render_task_events_websocket(websocket: WebSocket, task_id: str) -> None:
+    """WebSocket variant of the event stream: one JSON text frame per status, closed once finished."""
+    await websocket.accept()
+    found = False
+    async for event in watch_task(task_id):
+        found = True
+        if event:
+            await websocket.send_text(event.to_json())
+    await websocket.close(code=1000 if found else 4404)
+
+
+@router.post("/batches", response_model=RenderBatchSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+def submit_render_batch(
+    payload: RenderBatchCreateRequest,
+    db: Session = Depends(get_db),
+    executor: RenderExecutor | DatabaseRenderQueue = Depends(get_render_executor),
+) -> RenderBatchSubmitResponse:
+    # One slot per text, as for single tasks; items finished from the cache hand theirs back.
+    slots = len(payload.texts)
+    if slots > executor.capacity:
+        # Retrying cannot help a batch that would not fit even into an empty queue.
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"批量任务数超过渲染队列容量（{executor.capacity}），请拆分后提交",
+        )
+    _reserve_or_503(executor, slots)
+    try:
+        batch, tasks = create_render_batch(db, payload)
+    except Exception:
+        executor.release(slots)
+        raise
+    pending_ids = [task.id for task in tasks if task.status == "pending"]
+    executor.release(slots - len(pending_ids))
+    if pending_ids:
+        try:
+            executor.submit_batch(pending_ids)
+        except RenderDispatchError as exc:
+            raise _dispatch_failed_503(exc) from exc
+    overall, _ = batch_status(tasks)
+    return RenderBatchSubmitResponse(batch_id=batch.id, status=overall, task_ids=[task.id for task in tasks])
+
+
+@router.get("/batches/{batch_id}", response_model=RenderBatchResponse)
+def get_render_batch(batch_id: str, db: Session = Depends(get_db)) -> RenderBatchResponse:
+    batch = get_render_batch_or_none(db, batch_id)
+    if not batch:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Render batch not found")
+    tasks = list_batch_tasks(db, batch_id)
+    overall, counts = batch_status(tasks)
+    return RenderBatchResponse(
+        batch_id=batch.id,
+        status=overall,
+        item_count=batch.item_count,
+        status_counts=counts,
+        task_ids=[task.id for task in tasks],
+        file_url=f"/api/v1/files/batches/{batch.id}",
+        created_at=batch.created_at,
+    )
+
+
+@router.post(
+    "/preview",
+    response_class=Response,
+    responses={200: {"content": {"image/jpeg": {}, "image/webp": {}}}},
+)
+def preview_render(
+    payload: RenderTaskCreateRequest,
+    page: int = Query(default=0, ge=0),
+    image_format: Literal["jpeg", "webp"] = Query(default="jpeg", alias="format"),
+) -> Response:
+    result = render_preview(payload, page=page, image_format=image_format)
+    return Response(
+        content=result.content,
+        media_type=result.media_type,
+        headers={
+            "Cache-Control": "no-store",
+            "X-Page-Count": str(result.page_count),
+            "X-Preview-Truncated": "1" if result.truncated else "0",
+            "X-Render-Time-Ms": str(result.elapsed_ms),
+        },
+    )
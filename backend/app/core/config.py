@@ -1,5 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Literal
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -20,12 +21,59 @@ class Settings(BaseSettings):
     project_root: Path = Field(default_factory=lambda: Path(__file__).resolve().parents[3])
 
     database_url: str | None = None
+    database_busy_timeout_ms: int = 5000
+    database_pool_size: int = 10
+    database_max_overflow: int = 20
+    database_pool_timeout_seconds: float = 30.0
+    database_pool_recycle_seconds: int = 1800
     render_scale: float = 0.5
+    render_max_pages: int = 100
+    render_page_workers: int | None = None
+    render_band_threads: int = 4
+    render_band_min_pixels: int = 4_000_000
+    render_workers: int | None = None
+    render_queue_size: int = 64
+    render_retry_after_seconds: int = 5
+    render_worker_start_method: str = "spawn"
+    render_dispatch: Literal["process_pool", "queue"] = "process_pool"
+    render_lease_seconds: int = 60
+    render_heartbeat_seconds: int = 15
+    render_max_attempts: int = 3
+    render_poll_interval_seconds: float = 1.0
+    render_batch_stream_timeout_seconds: int = 1800
+    task_event_fallback_seconds: float = 5.0
+    task_progress_cache_size: int = 1024
+    render_progress_flush_seconds: float = 1.0
+    preview_max_side: int = 1200
+    preview_budget_ms: int = 150
+    preview_quality: int = 80
     ai_base_url: str = "https://api.openai.com"
     ai_api_key: str | None = None
     ai_model: str = "gpt-5.3-codex"
     ai_timeout_seconds: int = 90
     ai_max_tokens: int = 4096
+    glyph_cache_max_bytes: int = 64 * 1024 * 1024
+    font_cache_max_instances: int = 32
+    background_cache_max_bytes: int = 512 * 1024 * 1024
+    download_cache_max_entries: int = 4096
+    download_cache_ttl_seconds: float = 300.0
+    variant_widths: list[int] = [160, 320, 640, 1280]
+    variant_quality: int = 80
+    variant_pregenerate_widths: list[int] = [320]
+    variant_pregenerate_format: Literal["webp", "jpeg", "png"] = "webp"
+    storage_backend: Literal["local", "s3"] = "local"
+    s3_bucket: str | None = None
+    s3_prefix: str = "renders/"
+    s3_endpoint_url: str | None = None
+    s3_region: str | None = None
+    retention_enabled: bool = True
+    retention_ttl_hours: dict[str, float] = {"success": 720.0, "failed": 72.0}
+    render_storage_budget_bytes: int | None = 10 * 1024 * 1024 * 1024
+    retention_sweep_interval_seconds: float = 600.0
+    retention_orphan_grace_seconds: float = 3600.0
+    retention_profile_ttl_hours: float = 72.0
+    # cProfile dumps expose code paths and cost CPU; opt in per deployment.
+    render_profile_allowed: bool = False
 
     @property
     def resolved_database_url(self) -> str:
@@ -54,6 +102,26 @@ class Settings(BaseSettings):
     def render_dir(self) -> Path:
         return self.storage_dir / "renders"
 
+    @property
+    def profile_dir(self) -> Path:
+        return self.storage_dir / "profiles"
+
+    @property
+    def blob_dir(self) -> Path:
+        return self.storage_dir / "blobs"
+
+    @property
+    def blob_cache_dir(self) -> Path:
+        return self.storage_dir / "cache" / "blobs"
+
+    @property
+    def background_cache_dir(self) -> Path:
+        return self.storage_dir / "cache" / "backgrounds"
+
+    @property
+    def font_metrics_dir(self) -> Path:
+        return self.storage_dir / "cache" / "font_metrics"
+
 
 @lru_cache
 def get_settings() -> Settings:
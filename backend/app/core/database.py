@@ -1,19 +1,93 @@
-from collections.abc import Generator
+import logging
+from collections.abc import AsyncGenerator, Generator
+from functools import lru_cache
+from typing import Any
 
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Engine, Table, create_engine, event, inspect, literal, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import get_settings
 from app.models.base import Base
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
 
-connect_args: dict[str, object] = {}
-if settings.resolved_database_url.startswith("sqlite"):
-    connect_args["check_same_thread"] = False
+# Async drivers for the sync URLs we accept; the async engine is only built when first used.
+ASYNC_DRIVERS: dict[str, str] = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+psycopg_async",
+}
 
-engine = create_engine(settings.resolved_database_url, connect_args=connect_args)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def _is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """
+    Engine keyword arguments for ``url``.
+
+    SQLite serializes writers, so a short ``busy_timeout`` (set by :func:`_apply_sqlite_pragmas`)
+    replaces pooling limits; server databases get a bounded, pre-pinged pool.
+    """
+    if _is_sqlite(url):
+        return {"connect_args": {"check_same_thread": False, "timeout": settings.database_busy_timeout_ms / 1000}}
+    return {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout_seconds,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": True,
+    }
+
+
+def _apply_sqlite_pragmas(dbapi_connection: Any, _: Any) -> None:
+    # WAL lets readers proceed while a writer commits; NORMAL only fsyncs at checkpoints in WAL mode.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.database_busy_timeout_ms)}")
+    cursor.close()
+
+
+def configure_engine(engine: Engine) -> Engine:
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+engine = configure_engine(create_engine(settings.resolved_database_url, **engine_options(settings.resolved_database_url)))
+# Loaded rows stay readable after commit, so finishing a task does not re-select it.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    url = async_database_url(settings.resolved_database_url)
+    async_engine = create_async_engine(url, **engine_options(url))
+    configure_engine(async_engine.sync_engine)
+    return async_engine
+
+
+@lru_cache
+def get_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+async def dispose_async_engine() -> None:
+    """Close pooled async connections; they are bound to the event loop that opened them."""
+    if get_async_engine.cache_info().currsize:
+        await get_async_engine().dispose()
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -24,7 +98,55 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+def _add_column_sql(bind: Engine, table: Table, column: Column) -> str:
+    dialect = bind.dialect
+    preparer = dialect.identifier_preparer
+    sql = (
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=dialect)}"
+    )
+    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+    if default is not None:
+        sql += f" DEFAULT {literal(default).compile(dialect=dialect, compile_kwargs={'literal_binds': True})}"
+        if not column.nullable:
+            sql += " NOT NULL"
+    return sql
+
+
+def upgrade_schema(bind: Engine) -> list[str]:
+    """
+    Add the columns and indexes the models declare but an existing database lacks.
+
+    ``create_all`` only creates missing tables, so tables created by an older release are brought
+    up to date here with ``ALTER TABLE ... ADD COLUMN``. Columns are only ever added, which keeps
+    the step idempotent and safe to run at every startup. Required columns take their scalar
+    default as the server default so existing rows stay valid. Returns the added columns.
+    """
+    inspector = inspect(bind)
+    tables = [table for table in Base.metadata.sorted_tables if inspector.has_table(table.name)]
+    added: list[str] = []
+    with bind.begin() as connection:
+        for table in tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    connection.execute(text(_add_column_sql(bind, table, column)))
+                    added.append(f"{table.name}.{column.name}")
+    for table in tables:
+        for index in table.indexes:
+            index.create(bind, checkfirst=True)
+    if added:
+        logger.info("Added database columns: %s", ", ".join(added))
+    return added
+
+
 def init_db() -> None:
-    from app.models import asset, render_task, template, user  # noqa: F401
+    from app.models import asset, render_batch, render_blob, render_task, template, user  # noqa: F401
 
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
@@ -29,18 +29,52 @@ CREATE TABLE IF NOT EXISTS templates (
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
+CREATE TABLE IF NOT EXISTS render_batches (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NULL,
+    settings_json JSONB NOT NULL DEFAULT '{}'::jsonb,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_render_batches_user_id ON render_batches(user_id);
+
+CREATE TABLE IF NOT EXISTS render_blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    storage_key VARCHAR(255) NOT NULL,
+    size_bytes BIGINT NOT NULL DEFAULT 0,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    released_at TIMESTAMPTZ NULL
+);
+CREATE INDEX IF NOT EXISTS idx_render_blobs_ref_count ON render_blobs(ref_count);
+CREATE INDEX IF NOT EXISTS idx_render_blobs_released_at ON render_blobs(released_at) WHERE ref_count <= 0;
+
 CREATE TABLE IF NOT EXISTS render_tasks (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID NULL,
     status VARCHAR(20) NOT NULL,
     input_json JSONB NOT NULL DEFAULT '{}'::jsonb,
+    cache_key VARCHAR(64) NULL,
+    batch_id UUID NULL,
+    batch_index INTEGER NULL,
+    blob_hash VARCHAR(64) NULL,
     output_file_path VARCHAR(500) NULL,
     output_file_name VARCHAR(255) NULL,
     error_message TEXT NULL,
+    progress_json JSONB NULL,
+    timings_json JSONB NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(64) NULL,
+    lease_expires_at TIMESTAMPTZ NULL,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     started_at TIMESTAMPTZ NULL,
     completed_at TIMESTAMPTZ NULL,
+    last_accessed_at TIMESTAMPTZ NULL,
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 CREATE INDEX IF NOT EXISTS idx_render_tasks_status ON render_tasks(status);
 CREATE INDEX IF NOT EXISTS idx_render_tasks_user_id ON render_tasks(user_id);
+CREATE INDEX IF NOT EXISTS idx_render_tasks_cache_key ON render_tasks(cache_key);
+CREATE INDEX IF NOT EXISTS idx_render_tasks_blob_hash ON render_tasks(blob_hash);
+CREATE INDEX IF NOT EXISTS idx_render_tasks_batch_id ON render_tasks(batch_id, batch_index);
+CREATE INDEX IF NOT EXISTS idx_render_tasks_lease_expires_at ON render_tasks(lease_expires_at);
@@ -0,0 +1,16 @@
+-- PostgreSQL 升级脚本：为按旧版 ddl.sql 建立的数据库补齐新增列。
+-- 可重复执行；先执行本脚本，再执行 ddl.sql 补建新表与索引。
+-- （SQLite 开发库由应用启动时的 init_db 自动补齐。）
+
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS cache_key VARCHAR(64) NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS batch_id UUID NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS batch_index INTEGER NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS blob_hash VARCHAR(64) NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS progress_json JSONB NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS timings_json JSONB NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS worker_id VARCHAR(64) NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMPTZ NULL;
+ALTER TABLE render_tasks ADD COLUMN IF NOT EXISTS last_accessed_at TIMESTAMPTZ NULL;
+
+ALTER TABLE render_blobs ADD COLUMN IF NOT EXISTS released_at TIMESTAMPTZ NULL;
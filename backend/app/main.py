@@ -3,19 +3,34 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.metrics import router as metrics_router
 from app.api.v1 import api_v1_router
 from app.core.config import get_settings
-from app.core.database import init_db
+from app.core.database import dispose_async_engine, init_db
+from app.services.render_service import shutdown_page_pool
+from app.services.retention import RetentionSweeper
+from app.workers.executor import create_render_executor
 
 settings = get_settings()
 
 
 @asynccontextmanager
-async def lifespan(_: FastAPI):
+async def lifespan(app: FastAPI):
     settings.storage_dir.mkdir(parents=True, exist_ok=True)
     settings.render_dir.mkdir(parents=True, exist_ok=True)
     init_db()
-    yield
+    app.state.render_executor = create_render_executor()
+    app.state.render_executor.recover()
+    sweeper = RetentionSweeper(settings.retention_sweep_interval_seconds)
+    if settings.retention_enabled:
+        sweeper.start()
+    try:
+        yield
+    finally:
+        sweeper.stop()
+        app.state.render_executor.shutdown()
+        shutdown_page_pool()
+        await dispose_async_engine()
 
 
 app = FastAPI(
@@ -34,3 +49,4 @@ app.add_middleware(
 )
 
 app.include_router(api_v1_router, prefix="/api/v1")
+app.include_router(metrics_router)
@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Index, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class RenderBlob(Base):
+    __tablename__ = "render_blobs"
+
+    hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    storage_key: Mapped[str] = mapped_column(String(255), nullable=False)
+    size_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    ref_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+    # When the last reference went; the row is deleted once this is older than the purge grace.
+    released_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    # The purge only looks up unreferenced rows by their release time.
+    __table_args__ = (
+        Index(
+            "idx_render_blobs_released_at",
+            released_at,
+            postgresql_where=ref_count <= 0,
+            sqlite_where=ref_count <= 0,
+        ),
+    )
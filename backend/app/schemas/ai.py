@@ -4,6 +4,8 @@ from pydantic import BaseModel, Field
 
 from app.schemas.render import PaperType
 
+DEFAULT_FONT_FAMILY = "清松手写体5-行楷"
+
 
 class ContentTemplate(str, Enum):
     """文案结构模板枚举"""
@@ -17,12 +19,14 @@ class NotePolishRequest(BaseModel):
     content_template: ContentTemplate = ContentTemplate.CONCEPT
     text: str = Field(min_length=1, max_length=12000)
     paper_type: PaperType = PaperType.A4_PORTRAIT
+    font_family: str = DEFAULT_FONT_FAMILY
     font_size: int = Field(default=24, ge=12, le=80)
     line_height: float = Field(default=1.8, ge=1.0, le=4.0)
     render_scale: float = Field(default=0.5, ge=0.2, le=1.0)
     target_fill_min: float = Field(default=0.75, ge=0.4, le=0.95)
     target_fill_max: float = Field(default=0.90, ge=0.5, le=1.0)
     max_expand_rounds: int = Field(default=1, ge=0, le=2)
+    max_condense_rounds: int = Field(default=1, ge=0, le=2)
 
 
 class NotePolishMetadata(BaseModel):
@@ -32,6 +36,7 @@ class NotePolishMetadata(BaseModel):
     target_fill_min: float
     target_fill_max: float
     expanded_rounds: int
+    condensed_rounds: int = 0
     character_count: int
 
 
@@ -1,5 +1,6 @@
 from datetime import datetime
 from enum import Enum
+from typing import Annotated
 
 from pydantic import BaseModel, Field
 
@@ -24,8 +25,25 @@ class PaperBackground(str, Enum):
     REAL_BLANK_USED = "real-blank-used"
 
 
-class RenderTaskCreateRequest(BaseModel):
-    text: str = Field(min_length=1, max_length=12000)
+class MultiPageFormat(str, Enum):
+    PDF = "pdf"
+    ZIP = "zip"
+
+
+class OutputFormat(str, Enum):
+    PNG = "png"
+    PNG_OPTIMIZED = "png-optimized"
+    PNG_GRAY = "png-gray"
+    PNG_PALETTE = "png-palette"
+    WEBP_LOSSLESS = "webp-lossless"
+    WEBP = "webp"
+    JPEG = "jpeg"
+
+
+RenderText = Annotated[str, Field(min_length=1, max_length=12000)]
+
+
+class RenderSettings(BaseModel):
     font_family: str = "清松手写体5-行楷"
     paper_type: PaperType = PaperType.A4_PORTRAIT
     paper_background: PaperBackground = PaperBackground.WHITE
@@ -39,20 +57,61 @@ class RenderTaskCreateRequest(BaseModel):
 
     render_scale: float = Field(default=0.5, ge=0.2, le=1.0)
     random_seed: int | None = None
+    multipage_format: MultiPageFormat = MultiPageFormat.PDF
+    output_format: OutputFormat = OutputFormat.PNG
+    output_quality: int = Field(default=85, ge=1, le=100)
     user_id: str | None = None
 
 
+class RenderTaskCreateRequest(RenderSettings):
+    text: RenderText
+    debug_profile: bool = False
+
+
+class RenderBatchCreateRequest(RenderSettings):
+    texts: list[RenderText] = Field(min_length=1, max_length=200)
+
+
 class RenderTaskSubmitResponse(BaseModel):
     task_id: str
     status: str
 
 
+class RenderTaskProgress(BaseModel):
+    phase: str
+    chars_total: int
+    chars_laid_out: int
+    pages_total: int
+    pages_rasterized: int
+    percent: float
+    truncated: bool = False
+
+
 class RenderTaskResponse(BaseModel):
     task_id: str
     status: str
     input_json: dict
     file_url: str | None = None
     error_message: str | None = None
+    progress: RenderTaskProgress | None = None
+    timings: dict[str, float] | None = None
+    profile_url: str | None = None
     created_at: datetime
     updated_at: datetime
     completed_at: datetime | None = None
+
+
+class RenderBatchSubmitResponse(BaseModel):
+    batch_id: str
+    status: str
+    task_ids: list[str]
+
+
+class RenderBatchResponse(BaseModel):
+    batch_id: str
+    status: str
+    item_count: int
+    status_counts: dict[str, int]
+    task_ids: list[str]
+    file_url: str
+    created_at: datetime
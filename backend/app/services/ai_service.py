@@ -1,14 +1,15 @@
 from __future__ import annotations
 
-import math
 import re
 from dataclasses import dataclass
 
 import httpx
 
 from app.core.config import get_settings
-from app.schemas.ai import ContentTemplate, NotePolishRequest
-from app.services.render_service import PAPER_SIZES
+from app.schemas.ai import DEFAULT_FONT_FAMILY, ContentTemplate, NotePolishRequest
+from app.services.font_metrics import get_fill_metrics
+from app.services.layout_engine import PageGeometry, layout_text
+from app.services.render_service import paper_canvas_size
 
 settings = get_settings()
 MODEL_ALIASES = {
@@ -187,6 +188,7 @@ class PolishResult:
     target_fill_max: float
     expanded_rounds: int
     character_count: int
+    condensed_rounds: int = 0
     layout_mode: str = "a4_note"
 
 
@@ -379,16 +381,16 @@ def _request_chat_completion(messages: list[dict[str, str]]) -> str:
     raise AiServiceError("未能连接到可用的 AI 端点")
 
 
-def _weighted_char_count(text: str) -> float:
-    score = 0.0
-    for char in text:
-        if char.isspace():
-            score += 0.35
-        elif ord(char) < 128:
-            score += 0.55
-        else:
-            score += 1.0
-    return score
+# Layout stops once a draft is this many pages long; the ratio cannot exceed it.
+FILL_MAX_PAGES = 2
+# Width of a typical full-width character, used to size the first draft.
+TYPICAL_CHAR = "中"
+# Notes break lines after headings and list items, so lines are rarely written full.
+LINE_FILL = 0.78
+
+
+def _page_geometry(paper_type: str, font_size: int, line_height: float, render_scale: float) -> PageGeometry:
+    return PageGeometry.for_canvas(paper_canvas_size(paper_type, render_scale), font_size, line_height)
 
 
 def estimate_fill_ratio(
@@ -397,62 +399,57 @@ def estimate_fill_ratio(
     font_size: int,
     line_height: float,
     render_scale: float,
+    font_family: str = DEFAULT_FONT_FAMILY,
 ) -> float:
-    paper_width, paper_height = PAPER_SIZES.get(paper_type, PAPER_SIZES["a4-portrait"])
-    canvas_width = max(720, int(paper_width * render_scale))
-    canvas_height = max(1024, int(paper_height * render_scale))
-
-    margin_x = int(canvas_width * 0.09)
-    margin_top = int(canvas_height * 0.09)
-    margin_bottom = int(canvas_height * 0.09)
-    usable_width = max(120, canvas_width - margin_x * 2)
-    usable_height = max(240, canvas_height - margin_top - margin_bottom)
-
-    char_width = max(7.5, font_size * 0.62)
-    chars_per_line = max(12.0, usable_width / char_width)
-    line_step = max(12.0, font_size * line_height)
-
-    lines = text.splitlines() or [text]
-    logical_lines = 0.0
-    for line in lines:
-        stripped = line.strip()
-        if not stripped:
-            logical_lines += 0.7
-            continue
-
-        weighted_chars = _weighted_char_count(stripped)
-        wraps = max(1.0, math.ceil(weighted_chars / chars_per_line))
-        logical_lines += wraps
+    """
+    Share of the first page's writing area ``text`` fills, using the renderer's own wrapping.
+
+    Values above 1.0 mean the text runs onto further pages (1.5 = one full page and half of the
+    next). Glyph widths come from the font's metrics index rather than a per-character guess.
+    """
+    font_size = max(12, int(font_size))
+    geometry = _page_geometry(paper_type, font_size, line_height, render_scale)
+    layout = layout_text(
+        text,
+        geometry,
+        get_fill_metrics(font_family, font_size),
+        font_size,
+        random_seed=0,
+        max_pages=FILL_MAX_PAGES,
+    )
+    if layout.truncated:
+        return float(FILL_MAX_PAGES)
+    if not len(layout):
+        return 0.0
+    usable_height = geometry.max_y - geometry.margin_top
+    return layout.page_count - 1 + (layout.bottom - geometry.margin_top) / usable_height
 
-        if stripped.startswith("# "):
-            logical_lines += 0.9
-        elif stripped.startswith("## "):
-            logical_lines += 0.6
-        elif stripped.startswith("### "):
-            logical_lines += 0.4
 
-    occupied_height = logical_lines * line_step
-    return max(0.0, min(1.5, occupied_height / usable_height))
+def _fill_ratio(text: str, payload: NotePolishRequest) -> float:
+    return estimate_fill_ratio(
+        text,
+        payload.paper_type.value,
+        payload.font_size,
+        payload.line_height,
+        payload.render_scale,
+        payload.font_family,
+    )
 
 
 def _estimate_target_chars(payload: NotePolishRequest) -> int:
-    paper_width, paper_height = PAPER_SIZES.get(payload.paper_type.value, PAPER_SIZES["a4-portrait"])
-    canvas_width = max(720, int(paper_width * payload.render_scale))
-    canvas_height = max(1024, int(paper_height * payload.render_scale))
+    font_size = max(12, payload.font_size)
+    geometry = _page_geometry(payload.paper_type.value, font_size, payload.line_height, payload.render_scale)
+    char_width, char_height = get_fill_metrics(payload.font_family, font_size).measure(TYPICAL_CHAR)
+    chars_per_line = max(1, (geometry.max_x - geometry.margin_x) // char_width)
+    lines_per_page = max(1, (geometry.max_y - geometry.margin_top - char_height) // geometry.line_step + 1)
 
-    margin_x = int(canvas_width * 0.09)
-    margin_top = int(canvas_height * 0.09)
-    margin_bottom = int(canvas_height * 0.09)
-    usable_width = max(120, canvas_width - margin_x * 2)
-    usable_height = max(240, canvas_height - margin_top - margin_bottom)
+    target_ratio = (payload.target_fill_min + payload.target_fill_max) / 2
+    return int(lines_per_page * target_ratio * chars_per_line * LINE_FILL)
 
-    char_width = max(7.5, payload.font_size * 0.62)
-    chars_per_line = max(12.0, usable_width / char_width)
-    line_step = max(12.0, payload.font_size * payload.line_height)
 
-    target_ratio = (payload.target_fill_min + payload.target_fill_max) / 2
-    target_lines = max(30.0, (usable_height * target_ratio) / line_step)
-    return int(target_lines * chars_per_line * 0.78)
+def _target_chars_for(text: str, fill_ratio: float, target_ratio: float) -> int:
+    """Length that should move ``text`` from ``fill_ratio`` to ``target_ratio``; fill grows about linearly."""
+    return int(len(text) * target_ratio / max(fill_ratio, 0.05))
 
 
 def _build_initial_prompt(source_text: str, target_chars: int) -> str:
@@ -480,6 +477,16 @@ def _build_expand_prompt(current_text: str, current_ratio: float, payload: NoteP
     )
 
 
+def _build_condense_prompt(current_text: str, current_ratio: float, payload: NotePolishRequest, target_chars: int) -> str:
+    return (
+        "当前稿件超出一页，请在保留全部区块与层级结构的前提下压缩篇幅。\n"
+        f"当前估算铺满度为 {current_ratio:.0%}，目标不超过 {payload.target_fill_max:.0%}。\n"
+        f"请把内容精简到约 {target_chars} 字，合并重复要点，删去次要示例，不要输出 Emoji。\n\n"
+        "当前稿件：\n"
+        f"{current_text}"
+    )
+
+
 def polish_note_text(payload: NotePolishRequest) -> PolishResult:
     """根据用户输入和模板类型润色笔记文本"""
 
@@ -498,18 +505,13 @@ def polish_note_text(payload: NotePolishRequest) -> PolishResult:
     )
 
     polished_text = _normalize_text(first_pass)
-    fill_ratio = estimate_fill_ratio(
-        polished_text,
-        payload.paper_type.value,
-        payload.font_size,
-        payload.line_height,
-        payload.render_scale,
-    )
+    fill_ratio = _fill_ratio(polished_text, payload)
+    target_ratio = (payload.target_fill_min + payload.target_fill_max) / 2
 
     expanded_rounds = 0
     while fill_ratio < payload.target_fill_min and expanded_rounds < payload.max_expand_rounds:
         expanded_rounds += 1
-        target_chars = int(target_chars * 1.20)
+        target_chars = _target_chars_for(polished_text, fill_ratio, target_ratio)
         expanded_text = _request_chat_completion(
             [
                 {"role": "system", "content": system_prompt},
@@ -520,13 +522,24 @@ def polish_note_text(payload: NotePolishRequest) -> PolishResult:
             ]
         )
         polished_text = _normalize_text(expanded_text)
-        fill_ratio = estimate_fill_ratio(
-            polished_text,
-            payload.paper_type.value,
-            payload.font_size,
-            payload.line_height,
-            payload.render_scale,
+        fill_ratio = _fill_ratio(polished_text, payload)
+
+    # Text past the bottom margin continues on a second page, which a one-page note must not do.
+    condensed_rounds = 0
+    while fill_ratio > 1.0 and condensed_rounds < payload.max_condense_rounds:
+        condensed_rounds += 1
+        target_chars = _target_chars_for(polished_text, fill_ratio, target_ratio)
+        condensed_text = _request_chat_completion(
+            [
+                {"role": "system", "content": system_prompt},
+                {
+                    "role": "user",
+                    "content": _build_condense_prompt(polished_text, fill_ratio, payload, target_chars),
+                },
+            ]
         )
+        polished_text = _normalize_text(condensed_text)
+        fill_ratio = _fill_ratio(polished_text, payload)
 
     return PolishResult(
         polished_text=polished_text,
@@ -535,5 +548,6 @@ def polish_note_text(payload: NotePolishRequest) -> PolishResult:
         target_fill_min=payload.target_fill_min,
         target_fill_max=payload.target_fill_max,
         expanded_rounds=expanded_rounds,
+        condensed_rounds=condensed_rounds,
         character_count=len(polished_text),
     )
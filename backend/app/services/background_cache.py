@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image
+
+from app.core.config import get_settings
+from app.services.asset_service import PAPER_BACKGROUND_CONFIG
+
+settings = get_settings()
+
+BackgroundKey = tuple[str, int, int]
+
+
+class BackgroundCache:
+    """
+    Ready-to-paste paper canvases keyed by (paper_background, width, height).
+
+    The canvas size already encodes paper_type and render_scale. Prepared canvases are
+    persisted as raw pixel files under ``cache_dir`` and memory-mapped back, so a new process
+    skips the JPEG decode and LANCZOS resize entirely. Pillow keeps RGB pixels padded to four
+    bytes, so the files hold RGBX rows: that layout maps zero-copy and the page cache is shared
+    by every process rendering the same paper.
+
+    ``max_bytes`` bounds the directory as well: each load touches its file's mtime and the
+    least recently used files are deleted once the total exceeds the budget.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._canvases: OrderedDict[BackgroundKey, Image.Image] = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: dict[BackgroundKey, threading.Lock] = {}
+
+    def get(self, paper_background: str, size: tuple[int, int]) -> Image.Image | None:
+        """Return a read-only canvas for an image-backed paper, or None if the paper has no usable file."""
+        source_path = _source_path(paper_background)
+        if source_path is None:
+            return None
+
+        key = (paper_background, size[0], size[1])
+        with self._lock:
+            canvas = self._lookup(key)
+            if canvas is not None:
+                return canvas
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                canvas = self._lookup(key)
+                if canvas is not None:
+                    return canvas
+                self.misses += 1
+
+            canvas = self._load_or_prepare(key, source_path)
+            with self._lock:
+                self._store(key, canvas)
+                # Later callers find the canvas (or load their own if it was too large to keep).
+                self._key_locks.pop(key, None)
+            return canvas
+
+    def _lookup(self, key: BackgroundKey) -> Image.Image | None:
+        canvas = self._canvases.get(key)
+        if canvas is not None:
+            self._canvases.move_to_end(key)
+            self.hits += 1
+        return canvas
+
+    def _store(self, key: BackgroundKey, canvas: Image.Image) -> None:
+        nbytes = key[1] * key[2] * 4
+        if nbytes > self.max_bytes:
+            return
+        self._canvases[key] = canvas
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            (_, width, height), _ = self._canvases.popitem(last=False)
+            self.current_bytes -= width * height * 4
+
+    def _raw_path(self, key: BackgroundKey, source_path: Path) -> Path:
+        paper_background, width, height = key
+        return self.cache_dir / f"{paper_background}-{width}x{height}-{source_path.stat().st_mtime_ns}.rgbx"
+
+    def _load_or_prepare(self, key: BackgroundKey, source_path: Path) -> Image.Image:
+        size = (key[1], key[2])
+        raw_path = self._raw_path(key, source_path)
+        if raw_path.exists():
+            os.utime(raw_path)
+        else:
+            self._persist(raw_path, _prepare_canvas(source_path, size))
+            self._trim_disk(keep=raw_path)
+
+        with raw_path.open("rb") as fp:
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return Image.frombuffer("RGBX", size, mapped, "raw", "RGBX", 0, 1)
+
+    def _persist(self, raw_path: Path, canvas: Image.Image) -> None:
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in raw_path.parent.glob(f"{raw_path.name.rsplit('-', 1)[0]}-*.rgbx"):
+            stale.unlink(missing_ok=True)
+        tmp_path = raw_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_bytes(canvas.convert("RGBX").tobytes())
+        os.replace(tmp_path, raw_path)
+
+    def _trim_disk(self, keep: Path) -> None:
+        """Delete the least recently used raw files until the directory fits in ``max_bytes``."""
+        files = []
+        for path in self.cache_dir.glob("*.rgbx"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                # Processes that already mapped the file keep their pages until they drop the canvas.
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError:  # pragma: no cover - mapped files cannot be deleted on Windows
+                continue
+            total -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._canvases.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._canvases),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _source_path(paper_background: str) -> Path | None:
+    file_name = PAPER_BACKGROUND_CONFIG.get(paper_background, {}).get("file_name")
+    if not file_name:
+        return None
+    bg_path = settings.papers_dir / file_name
+    if not bg_path.exists():
+        return None
+    return bg_path
+
+
+def _prepare_canvas(source_path: Path, size: tuple[int, int]) -> Image.Image:
+    canvas = Image.new("RGB", size, color=(255, 255, 255))
+    with Image.open(source_path) as bg:
+        bg = bg.convert("RGB")
+        target_w, target_h = size
+        scale = min(target_w / bg.width, target_h / bg.height)
+        draw_w = int(bg.width * scale)
+        draw_h = int(bg.height * scale)
+        resized = bg.resize((draw_w, draw_h), Image.Resampling.LANCZOS)
+        offset_x = (target_w - draw_w) // 2
+        offset_y = (target_h - draw_h) // 2
+        canvas.paste(resized, (offset_x, offset_y))
+    return canvas
+
+
+@lru_cache
+def get_background_cache() -> BackgroundCache:
+    return BackgroundCache(cache_dir=settings.background_cache_dir, max_bytes=settings.background_cache_max_bytes)
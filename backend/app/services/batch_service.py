@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import zipfile
+from collections import Counter
+from collections.abc import AsyncIterator
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+from app.core.database import get_async_sessionmaker
+from app.models.render_batch import RenderBatch
+from app.models.render_task import RenderTask
+from app.schemas.render import RenderBatchCreateRequest, RenderTaskCreateRequest
+from app.services.blob_storage import task_output_path
+from app.services.render_service import build_render_task
+
+settings = get_settings()
+
+FINISHED_STATUSES = {"success", "failed", "expired"}
+ZIP_CHUNK_BYTES = 1024 * 1024
+
+
+def create_render_batch(db: Session, payload: RenderBatchCreateRequest) -> tuple[RenderBatch, list[RenderTask]]:
+    """Create the batch and one task per text with a single commit; cached items finish immediately."""
+    shared = payload.model_dump(exclude={"texts"})
+    batch = RenderBatch(
+        id=str(uuid4()),
+        user_id=payload.user_id,
+        settings_json=payload.model_dump(mode="json", exclude={"texts"}),
+        item_count=len(payload.texts),
+    )
+    tasks = [
+        build_render_task(db, RenderTaskCreateRequest(text=text, **shared), batch_id=batch.id, batch_index=index)
+        for index, text in enumerate(payload.texts)
+    ]
+    db.add(batch)
+    db.add_all(tasks)
+    db.commit()
+    return batch, tasks
+
+
+def get_render_batch_or_none(db: Session, batch_id: str) -> RenderBatch | None:
+    return db.query(RenderBatch).filter(RenderBatch.id == batch_id).first()
+
+
+def list_batch_tasks(db: Session, batch_id: str) -> list[RenderTask]:
+    return db.query(RenderTask).filter(RenderTask.batch_id == batch_id).order_by(RenderTask.batch_index).all()
+
+
+async def alist_batch_tasks(db: AsyncSession, batch_id: str) -> list[RenderTask]:
+    result = await db.execute(
+        select(RenderTask).where(RenderTask.batch_id == batch_id).order_by(RenderTask.batch_index)
+    )
+    return list(result.scalars())
+
+
+def batch_status(tasks: list[RenderTask]) -> tuple[str, dict[str, int]]:
+    """Overall status plus per-status counts; a finished batch with any failed item is ``failed``."""
+    counts = dict(Counter(task.status for task in tasks))
+    if any(task.status not in FINISHED_STATUSES for task in tasks):
+        overall = "pending" if set(counts) <= {"pending"} else "running"
+    else:
+        overall = "failed" if counts.get("failed") else "success"
+    return overall, counts
+
+
+class _ZipStream:
+    """Write-only sink for :class:`zipfile.ZipFile`; each :meth:`drain` hands back what was written since."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_stem(task: RenderTask, item_count: int) -> str:
+    return f"{(task.batch_index or 0) + 1:0{max(3, len(str(item_count)))}d}"
+
+
+async def _write_entry(
+    archive: zipfile.ZipFile, stream: _ZipStream, task: RenderTask, item_count: int
+) -> AsyncIterator[bytes]:
+    """Add ``task``'s entry to ``archive``, yielding the archive bytes chunk by chunk as they are written."""
+    stem = _entry_stem(task, item_count)
+    if task.status not in FINISHED_STATUSES:
+        archive.writestr(f"{stem}.error.txt", f"等待渲染超时，当前状态：{task.status}")
+    elif task.status != "success":
+        archive.writestr(f"{stem}.error.txt", task.error_message or "渲染失败")
+    else:
+        try:
+            path = await run_in_threadpool(task_output_path, task)
+            handle = await run_in_threadpool(path.open, "rb")
+        except FileNotFoundError:
+            archive.writestr(f"{stem}.error.txt", "输出文件已丢失")
+        else:
+            try:
+                info = zipfile.ZipInfo(stem + path.suffix, date_time=time.localtime()[:6])
+                info.file_size = os.fstat(handle.fileno()).st_size
+                with archive.open(info, "w") as entry:
+                    while chunk := await run_in_threadpool(handle.read, ZIP_CHUNK_BYTES):
+                        entry.write(chunk)
+                        yield stream.drain()
+            finally:
+                handle.close()
+    yield stream.drain()
+
+
+async def iter_batch_zip(batch_id: str, item_count: int, poll_interval: float = 0.2) -> AsyncIterator[bytes]:
+    """
+    Stream the batch as a ZIP, adding each item as soon as it finishes.
+
+    Items appear in completion order under their 1-based batch position; failed items become a
+    ``.error.txt`` entry so the archive always holds one entry per text. Outputs are already
+    compressed images, so entries are stored rather than deflated, and each file is copied in
+    chunks. Items still unfinished after ``render_batch_stream_timeout_seconds`` are closed out
+    as errors so the download always ends. Waiting happens on the event loop, so a slow batch
+    does not hold a threadpool thread.
+    """
+    stream = _ZipStream()
+    emitted: set[str] = set()
+    deadline = time.monotonic() + settings.render_batch_stream_timeout_seconds
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        while len(emitted) < item_count:
+            timed_out = time.monotonic() > deadline
+            async with get_async_sessionmaker()() as db:
+                finished = [
+                    task
+                    for task in await alist_batch_tasks(db, batch_id)
+                    if (timed_out or task.status in FINISHED_STATUSES) and task.id not in emitted
+                ]
+            for task in finished:
+                async for data in _write_entry(archive, stream, task, item_count):
+                    yield data
+                emitted.add(task.id)
+            if not finished:
+                if timed_out:
+                    break
+                await asyncio.sleep(poll_interval)
+    yield stream.drain()
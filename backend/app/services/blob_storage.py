@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from datetime import timedelta
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.render_blob import RenderBlob
+from app.models.render_task import RenderTask, utcnow
+from app.services.variants import cover_path
+
+settings = get_settings()
+
+NO_SYNC = {"synchronize_session": False}
+# Dialect inserts supporting ON CONFLICT, used to create-or-reference a blob row in one statement.
+UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+HASH_CHUNK_BYTES = 1024 * 1024
+SWEEP_CHUNK_SIZE = 500
+
+# ``(key, size_bytes, modified)`` of one stored blob; ``modified`` is a POSIX timestamp.
+StoredBlob = tuple[str, int, float]
+
+
+def blob_key(digest: str, suffix: str) -> str:
+    """Sharded storage key: two levels of 256 directories keep every directory small."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+def cover_key(key: str) -> str:
+    """Key of a PDF blob's first-page cover, stored beside it and deleted with it."""
+    return cover_path(Path(key)).as_posix()
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        while chunk := handle.read(HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_blob_name(name: str) -> bool:
+    """``{hash}.png`` is a blob; derivatives (``{hash}.w320.webp``) and temp files are not."""
+    return not name.startswith(".") and "." not in Path(name).stem
+
+
+def _scan_blob_files(root: Path) -> Iterator[tuple[str, list[Path]]]:
+    """Files under a sharded ``root`` grouped by blob hash, derivatives and temp files included."""
+    if not root.is_dir():
+        return
+    for shard in root.glob("*/*"):
+        if not shard.is_dir():
+            continue
+        groups: dict[str, list[Path]] = {}
+        for path in shard.iterdir():
+            groups.setdefault(path.name.lstrip(".").split(".", 1)[0], []).append(path)
+        yield from groups.items()
+
+
+def _remove_with_derivatives(path: Path) -> None:
+    """Delete a stored file and the variants generated beside it (``{hash}.w320.webp`` ...)."""
+    if not path.parent.is_dir():
+        return
+    for sibling in path.parent.glob(f"{path.stem}.*"):
+        sibling.unlink(missing_ok=True)
+
+
+class LocalBlobStorage:
+    """Content-addressed files under ``root``; identical outputs are stored once."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def put(self, key: str, source: Path) -> None:
+        """Move ``source`` into the store under ``key``; an existing copy holds the same bytes and is replaced atomically."""
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, target)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def describe(self, key: str) -> str:
+        return str(self.root / key)
+
+    def delete(self, key: str) -> None:
+        path = self.root / key
+        _remove_with_derivatives(path)
+        for shard in (path.parent, path.parent.parent):
+            try:
+                shard.rmdir()
+            except OSError:
+                break  # still holds other blobs
+
+    def iter_blobs(self) -> Iterator[StoredBlob]:
+        for _, paths in _scan_blob_files(self.root):
+            for path in paths:
+                if _is_blob_name(path.name):
+                    try:
+                        stat_result = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield path.relative_to(self.root).as_posix(), stat_result.st_size, stat_result.st_mtime
+
+    def delete_if_older(self, key: str, cutoff: float) -> bool:
+        """Delete ``key`` unless it was (re)written at or after ``cutoff``."""
+        try:
+            if (self.root / key).stat().st_mtime >= cutoff:
+                return False
+        except FileNotFoundError:
+            return False
+        self.delete(key)
+        return True
+
+    def cache_bytes(self) -> int:
+        return 0
+
+    def trim_cache(self, max_bytes: int, cutoff: float) -> tuple[int, int]:
+        return 0, 0
+
+
+class S3BlobStorage:
+    """
+    Content-addressed objects in an S3-compatible bucket.
+
+    Readers need local files (``FileResponse``, variant decoding, batch archives), so objects are
+    downloaded once into ``cache_dir`` on first use; derivatives are generated beside those copies.
+    Reads refresh a copy's mtime, and :meth:`trim_cache` drops the least recently read ones.
+    """
+
+    def __init__(self, bucket: str, prefix: str, cache_dir: Path, client: Any = None) -> None:
+        if client is None:
+            try:
+                import boto3
+            except ImportError as exc:  # pragma: no cover - depends on the deployment
+                raise RuntimeError("S3 存储需要安装 boto3") from exc
+            client = boto3.client("s3", endpoint_url=settings.s3_endpoint_url, region_name=settings.s3_region)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def _is_missing(self, exc: Exception) -> bool:
+        return exc.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")  # type: ignore[attr-defined]
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.ClientError as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+        return True
+
+    def put(self, key: str, source: Path) -> None:
+        if self._exists(key):
+            # Refresh LastModified so the orphan sweep treats the object as freshly written.
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=self._object_key(key),
+                CopySource={"Bucket": self.bucket, "Key": self._object_key(key)},
+                MetadataDirective="REPLACE",
+            )
+        else:
+            self.client.upload_file(str(source), self.bucket, self._object_key(key))
+        # The render just produced these bytes; keep them as the local copy.
+        cached = self.cache_dir / key
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, cached)
+
+    def local_path(self, key: str) -> Path:
+        cached = self.cache_dir / key
+        try:
+            os.utime(cached)
+            return cached
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if not cached.exists():
+                cached.parent.mkdir(parents=True, exist_ok=True)
+                partial = cached.with_name(f".{cached.name}.{os.getpid()}.tmp")
+                try:
+                    self.client.download_file(self.bucket, self._object_key(key), str(partial))
+                except self.client.exceptions.ClientError as exc:
+                    partial.unlink(missing_ok=True)
+                    if self._is_missing(exc):
+                        raise FileNotFoundError(self.describe(key)) from exc
+                    raise
+                os.replace(partial, cached)
+        if cached.suffix == ".pdf" and not cover_path(cached).exists():
+            # Thumbnails of a PDF are cut from its cover, which a cache trim drops with the copy.
+            try:
+                self.local_path(cover_key(key))
+            except FileNotFoundError:
+                pass
+        return cached
+
+    def describe(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        if key.endswith(".pdf"):
+            self.client.delete_object(Bucket=self.bucket, Key=self._object_key(cover_key(key)))
+        _remove_with_derivatives(self.cache_dir / key)
+
+    def iter_blobs(self) -> Iterator[StoredBlob]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", ()):
+                key = item["Key"][len(self.prefix) :]
+                if _is_blob_name(key.rsplit("/", 1)[-1]):
+                    yield key, item["Size"], item["LastModified"].timestamp()
+
+    def delete_if_older(self, key: str, cutoff: float) -> bool:
+        """Delete ``key`` unless it was (re)written at or after ``cutoff``."""
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self.client.exceptions.ClientError as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+        if head["LastModified"].timestamp() >= cutoff:
+            return False
+        self.delete(key)
+        return True
+
+    def _cached_groups(self) -> list[tuple[float, int, list[Path]]]:
+        groups = []
+        for _, paths in _scan_blob_files(self.cache_dir):
+            stats = []
+            for path in paths:
+                try:
+                    stats.append(path.stat())
+                except FileNotFoundError:
+                    continue
+            if stats:
+                groups.append((max(stat.st_mtime for stat in stats), sum(stat.st_size for stat in stats), paths))
+        return groups
+
+    def cache_bytes(self) -> int:
+        """Disk used by local copies and their derivatives."""
+        return sum(size for _, size, _ in self._cached_groups())
+
+    def trim_cache(self, max_bytes: int, cutoff: float) -> tuple[int, int]:
+        """
+        Drop the least recently read local copies (with their derivatives) until the cache fits
+        ``max_bytes``; copies read at or after ``cutoff`` may still back a cached download and stay.
+        Returns ``(files, bytes)`` removed.
+        """
+        groups = sorted(self._cached_groups(), key=lambda group: group[0])
+        total = sum(size for _, size, _ in groups)
+        deleted = freed = 0
+        for modified, size, paths in groups:
+            if total <= max_bytes or modified >= cutoff:
+                break
+            for path in paths:
+                path.unlink(missing_ok=True)
+            deleted += len(paths)
+            freed += size
+            total -= size
+        return deleted, freed
+
+
+BlobStorage = LocalBlobStorage | S3BlobStorage
+
+
+@lru_cache
+def get_blob_storage() -> BlobStorage:
+    if settings.storage_backend == "s3":
+        if not settings.s3_bucket:
+            raise RuntimeError("HW_BACKEND_S3_BUCKET 未配置")
+        return S3BlobStorage(settings.s3_bucket, settings.s3_prefix, settings.blob_cache_dir)
+    return LocalBlobStorage(settings.blob_dir)
+
+
+def retain_blob(db: Session, digest: str, storage_key: str | None = None, size_bytes: int = 0) -> None:
+    """
+    Add one reference to ``digest``, creating its row when ``storage_key`` is given.
+
+    The row is created with ``INSERT .. ON CONFLICT DO UPDATE``, so two workers storing the same
+    bytes at once both count their reference instead of one failing on the primary key.
+    """
+    if storage_key is None:
+        db.execute(
+            update(RenderBlob)
+            .where(RenderBlob.hash == digest)
+            .values(ref_count=RenderBlob.ref_count + 1, released_at=None),
+            execution_options=NO_SYNC,
+        )
+        return
+    insert = UPSERT_INSERTS[db.get_bind().dialect.name]
+    statement = insert(RenderBlob).values(hash=digest, storage_key=storage_key, size_bytes=size_bytes, ref_count=1)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[RenderBlob.hash],
+            set_={"ref_count": RenderBlob.ref_count + 1, "released_at": None},
+        )
+    )
+
+
+def release_blobs(db: Session, digests: Iterable[str | None]) -> None:
+    """Drop one reference per listed digest; unreferenced blobs are removed by :func:`purge_unreferenced_blobs`."""
+    for digest, count in Counter(digest for digest in digests if digest).items():
+        db.execute(
+            update(RenderBlob).where(RenderBlob.hash == digest).values(ref_count=RenderBlob.ref_count - count),
+            execution_options=NO_SYNC,
+        )
+
+
+def purge_unreferenced_blobs(db: Session, grace_seconds: float | None = None) -> tuple[int, int]:
+    """
+    Delete blobs nobody references; returns ``(files, bytes)`` removed from storage.
+
+    A row losing its last reference is stamped with ``released_at`` and deleted once that is
+    ``grace_seconds`` (default ``retention_orphan_grace_seconds``) old. Files are never removed
+    together with their row, only by :func:`sweep_orphaned_blobs`, so a render that stores the
+    same bytes right after the row is gone simply writes a new file and row.
+    """
+    grace = settings.retention_orphan_grace_seconds if grace_seconds is None else grace_seconds
+    now = utcnow()
+    db.execute(
+        update(RenderBlob)
+        .where(RenderBlob.ref_count <= 0, RenderBlob.released_at.is_(None))
+        .values(released_at=now),
+        execution_options=NO_SYNC,
+    )
+    db.execute(
+        delete(RenderBlob).where(
+            RenderBlob.ref_count <= 0, RenderBlob.released_at <= now - timedelta(seconds=grace)
+        ),
+        execution_options=NO_SYNC,
+    )
+    db.commit()
+    return sweep_orphaned_blobs(db, time.time() - grace)
+
+
+def sweep_orphaned_blobs(db: Session, cutoff: float) -> tuple[int, int]:
+    """
+    Remove stored blobs without a row that were last written before ``cutoff``.
+
+    These are blobs whose row was purged, and files put by a render whose commit then failed.
+    Every put rewrites (or, on S3, touches) the object, so a blob a render is storing right now is
+    newer than ``cutoff`` and stays; its age is re-checked just before it is deleted.
+    """
+    storage = get_blob_storage()
+    stale = (blob for blob in storage.iter_blobs() if blob[2] < cutoff)
+    deleted = freed = 0
+    while chunk := list(islice(stale, SWEEP_CHUNK_SIZE)):
+        digests = [Path(key).name.split(".", 1)[0] for key, _, _ in chunk]
+        known = set(db.scalars(select(RenderBlob.storage_key).where(RenderBlob.hash.in_(digests))))
+        for key, size_bytes, _ in chunk:
+            if key not in known and storage.delete_if_older(key, cutoff):
+                deleted += 1
+                freed += size_bytes
+    return deleted, freed
+
+
+def store_render_output(db: Session, task: RenderTask, output_path: Path) -> None:
+    """
+    Move a freshly rendered file into blob storage and point ``task`` at it.
+
+    The blob row and reference are added to the session; they commit together with the task. If
+    that commit fails, the file is left without a row and :func:`sweep_orphaned_blobs` removes it
+    after the grace period.
+    """
+    digest = file_digest(output_path)
+    key = blob_key(digest, output_path.suffix)
+    size_bytes = output_path.stat().st_size
+    storage = get_blob_storage()
+    storage.put(key, output_path)
+    cover = cover_path(output_path)
+    if cover.exists():
+        storage.put(cover_key(key), cover)
+    retain_blob(db, digest, key, size_bytes)
+    task.blob_hash = digest
+    task.output_file_name = f"{task.id}{output_path.suffix}"
+    task.output_file_path = storage.describe(key)
+
+
+def task_output_path(task: RenderTask) -> Path:
+    """Local file holding ``task``'s output; rows from before blob storage point at ``render_dir``."""
+    if task.blob_hash:
+        suffix = Path(task.output_file_name or "").suffix
+        return get_blob_storage().local_path(blob_key(task.blob_hash, suffix))
+    return Path(task.output_file_path or "")
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from app.core.config import get_settings
+from app.models.render_task import RenderTask
+from app.services.blob_storage import task_output_path
+from app.services.encoders import media_type_for
+
+settings = get_settings()
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@dataclass(frozen=True)
+class DownloadEntry:
+    path: Path
+    filename: str
+    media_type: str
+    etag: str
+    stat_result: os.stat_result
+
+    @classmethod
+    def from_task(cls, task: RenderTask) -> DownloadEntry:
+        """Describe a finished task's output; raises ``FileNotFoundError`` when the file is gone."""
+        path = task_output_path(task)
+        stat_result = path.stat()
+        return cls(
+            path=path,
+            filename=task.output_file_name or f"{task.id}{path.suffix}",
+            media_type=media_type_for(path),
+            # Blobs are named by content hash, so every task sharing the bytes shares one validator.
+            etag=f'"{task.blob_hash or task.cache_key or task.id}"',
+            stat_result=stat_result,
+        )
+
+
+class DownloadCache:
+    """
+    LRU of finished downloads keyed by task id, so repeat requests skip the DB lookup and ``stat``.
+
+    Successful renders never change, but their files can be removed by retention in another
+    process; entries therefore also expire after ``ttl_seconds``.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, DownloadEntry]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, task_id: str) -> DownloadEntry | None:
+        with self._lock:
+            item = self._entries.get(task_id)
+            if item is None or time.monotonic() - item[0] > self.ttl_seconds:
+                self._entries.pop(task_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(task_id)
+            self.hits += 1
+            return item[1]
+
+    def put(self, task_id: str, entry: DownloadEntry) -> None:
+        with self._lock:
+            self._entries[task_id] = (time.monotonic(), entry)
+            self._entries.move_to_end(task_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, task_id: str) -> None:
+        with self._lock:
+            self._entries.pop(task_id, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """``If-None-Match`` semantics: weak comparison against any listed validator, or ``*``."""
+    if not if_none_match:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+@lru_cache
+def get_download_cache() -> DownloadCache:
+    return DownloadCache(
+        max_entries=settings.download_cache_max_entries,
+        ttl_seconds=settings.download_cache_ttl_seconds,
+    )
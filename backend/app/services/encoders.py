@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import io
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PIL import Image
+
+from app.schemas.render import OutputFormat
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    pil_format: str
+    extension: str
+    media_type: str
+    options: dict[str, object] = field(default_factory=dict)
+    lossy: bool = False
+    prepare: Callable[[Image.Image], Image.Image] | None = None
+
+
+def _to_grayscale(image: Image.Image) -> Image.Image:
+    return image.convert("L")
+
+
+def _to_palette(image: Image.Image) -> Image.Image:
+    # Dark ink on plain paper needs few tones; fast octree keeps this cheaper than a full PNG pass.
+    return image.quantize(colors=16, method=Image.Quantize.FASTOCTREE)
+
+
+ENCODER_PROFILES: dict[OutputFormat, EncoderProfile] = {
+    OutputFormat.PNG: EncoderProfile("PNG", ".png", "image/png", {"compress_level": 1}),
+    OutputFormat.PNG_OPTIMIZED: EncoderProfile("PNG", ".png", "image/png", {"optimize": True}),
+    OutputFormat.PNG_GRAY: EncoderProfile("PNG", ".png", "image/png", {"compress_level": 1}, prepare=_to_grayscale),
+    OutputFormat.PNG_PALETTE: EncoderProfile("PNG", ".png", "image/png", {"compress_level": 1}, prepare=_to_palette),
+    OutputFormat.WEBP_LOSSLESS: EncoderProfile(
+        "WEBP", ".webp", "image/webp", {"lossless": True, "method": 0, "quality": 0}
+    ),
+    OutputFormat.WEBP: EncoderProfile("WEBP", ".webp", "image/webp", {"method": 0}, lossy=True),
+    OutputFormat.JPEG: EncoderProfile("JPEG", ".jpg", "image/jpeg", lossy=True),
+}
+
+MEDIA_TYPES: dict[str, str] = {
+    **{profile.extension: profile.media_type for profile in ENCODER_PROFILES.values()},
+    ".pdf": "application/pdf",
+    ".zip": "application/zip",
+}
+
+
+def get_encoder_profile(output_format: OutputFormat) -> EncoderProfile:
+    return ENCODER_PROFILES[output_format]
+
+
+def encode_image(image: Image.Image, output_format: OutputFormat, quality: int = 85) -> bytes:
+    buffer = io.BytesIO()
+    save_image(image, buffer, output_format, quality)
+    return buffer.getvalue()
+
+
+def save_image(image: Image.Image, target: Path | io.BytesIO, output_format: OutputFormat, quality: int = 85) -> None:
+    profile = get_encoder_profile(output_format)
+    options = dict(profile.options)
+    if profile.lossy:
+        options["quality"] = quality
+    if profile.prepare is not None:
+        image = profile.prepare(image)
+    image.save(target, format=profile.pil_format, **options)
+
+
+def media_type_for(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix.lower(), "application/octet-stream")
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import ImageFont
+
+from app.core.config import get_settings
+from app.services.asset_service import FONT_FILE_MAP, resolve_font_path
+from app.services.layout_engine import GlyphMetrics, get_glyph_metrics
+
+settings = get_settings()
+
+# Glyph boxes are measured once at this size and scaled; at 12-80 px the scaled width matches a
+# direct measurement to within a pixel for all but a handful of glyphs.
+REFERENCE_SIZE = 256
+INDEX_VERSION = 1
+INDEXED_RANGES = (
+    (0x20, 0x7F),  # ASCII
+    (0xA0, 0x100),  # Latin-1 punctuation
+    (0x2000, 0x2070),  # general punctuation
+    (0x2190, 0x2200),  # arrows
+    (0x2460, 0x2500),  # circled numbers ①②③
+    (0x25A0, 0x2600),  # geometric shapes □
+    (0x3000, 0x3040),  # CJK symbols and punctuation
+    (0x4E00, 0xA000),  # CJK unified ideographs
+    (0xFF00, 0xFFF0),  # full-width forms
+)
+
+
+class FontMetricsIndex:
+    """
+    Ink box of every common character of one font file at :data:`REFERENCE_SIZE`.
+
+    Fill estimation lays out whole drafts per request; this index lets it do so without loading
+    the font at each size. Indexes are persisted as JSON under ``cache_dir`` keyed by the font's
+    mtime, so a process only measures a font the first time any process sees it. Characters
+    outside :data:`INDEXED_RANGES` are measured on demand and kept in memory.
+    """
+
+    def __init__(self, font_path: Path, boxes: dict[str, tuple[int, int]]) -> None:
+        self.font_path = font_path
+        self.boxes = boxes
+        self._font: ImageFont.FreeTypeFont | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, font_path: Path) -> FontMetricsIndex:
+        index = cls(font_path, {})
+        for start, stop in INDEXED_RANGES:
+            for code in range(start, stop):
+                index.box(chr(code))
+        return index
+
+    @classmethod
+    def load_or_build(cls, font_path: Path, cache_dir: Path) -> FontMetricsIndex:
+        index_path = cache_dir / f"{font_path.stem}-{font_path.stat().st_mtime_ns}.json"
+        try:
+            data = json.loads(index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            data = None
+        if data and data.get("version") == INDEX_VERSION and data.get("reference_size") == REFERENCE_SIZE:
+            return cls(font_path, dict(zip(data["chars"], zip(data["widths"], data["heights"]))))
+        index = cls.build(font_path)
+        index.save(index_path)
+        return index
+
+    def save(self, index_path: Path) -> None:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in index_path.parent.glob(f"{index_path.name.rsplit('-', 1)[0]}-*.json"):
+            stale.unlink(missing_ok=True)
+        chars = list(self.boxes)
+        data = {
+            "version": INDEX_VERSION,
+            "reference_size": REFERENCE_SIZE,
+            "font": self.font_path.name,
+            "chars": "".join(chars),
+            "widths": [self.boxes[char][0] for char in chars],
+            "heights": [self.boxes[char][1] for char in chars],
+        }
+        tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+
+    def box(self, char: str) -> tuple[int, int]:
+        """Ink width and height of ``char`` at :data:`REFERENCE_SIZE`."""
+        size = self.boxes.get(char)
+        if size is None:
+            with self._lock:
+                if self._font is None:
+                    self._font = ImageFont.truetype(str(self.font_path), REFERENCE_SIZE)
+                bbox = self._font.getbbox(char)
+            size = (int(bbox[2] - bbox[0]), int(bbox[3] - bbox[1]))
+            self.boxes[char] = size
+        return size
+
+
+class ScaledGlyphMetrics:
+    """:class:`GlyphMetrics` stand-in for :func:`layout_text` that scales a :class:`FontMetricsIndex`."""
+
+    def __init__(self, index: FontMetricsIndex, font_size: int) -> None:
+        self.index = index
+        self.scale = font_size / REFERENCE_SIZE
+        self._sizes: dict[str, tuple[int, int]] = {}
+
+    def measure(self, char: str) -> tuple[int, int]:
+        size = self._sizes.get(char)
+        if size is None:
+            width, height = self.index.box(char)
+            # Same rounding and two-pixel spacing as GlyphMetrics.measure.
+            size = (max(1, round(width * self.scale)) + 2, max(1, round(height * self.scale)))
+            self._sizes[char] = size
+        return size
+
+
+@lru_cache
+def get_font_metrics_index(font_path: Path) -> FontMetricsIndex:
+    return FontMetricsIndex.load_or_build(font_path, settings.font_metrics_dir)
+
+
+def get_fill_metrics(font_family: str, font_size: int) -> ScaledGlyphMetrics | GlyphMetrics:
+    """Glyph metrics for fill estimation; fonts without a file fall back to the renderer's own."""
+    font_path = resolve_font_path(font_family)
+    if font_path is None or not font_path.exists():
+        return get_glyph_metrics(font_family, font_size)
+    return ScaledGlyphMetrics(get_font_metrics_index(font_path), font_size)
+
+
+def precompute_font_metrics() -> list[Path]:
+    """Build (or load) the index of every font in ``FONT_FILE_MAP`` that is installed."""
+    built = []
+    for font_family in FONT_FILE_MAP:
+        font_path = resolve_font_path(font_family)
+        if font_path is not None and font_path.exists():
+            get_font_metrics_index(font_path)
+            built.append(font_path)
+    return built
+
+
+if __name__ == "__main__":
+    for path in precompute_font_metrics():
+        print(f"indexed {path.name}")
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import mmap
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import ImageFont
+
+from app.core.config import get_settings
+from app.services.asset_service import resolve_font_path
+
+settings = get_settings()
+
+DEFAULT_FONT_KEY = "default"
+
+LoadedFont = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+
+class _SharedFontBytes:
+    """File-like shim so every sized ``FreeTypeFont`` reuses one bytes buffer instead of its own copy."""
+
+    def __init__(self, data: bytes) -> None:
+        self._data = data
+
+    def read(self) -> bytes:
+        return self._data
+
+
+class FontRegistry:
+    """Loads each font file from ``FONT_FILE_MAP`` once and keeps sized instances in a bounded LRU."""
+
+    def __init__(self, max_instances: int) -> None:
+        self.max_instances = max_instances
+        self.hits = 0
+        self.misses = 0
+        self._font_bytes: dict[Path, bytes] = {}
+        self._fonts: OrderedDict[tuple[str, int], LoadedFont] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def font_key(self, font_family: str) -> str:
+        font_path = resolve_font_path(font_family)
+        if font_path and font_path.exists():
+            return str(font_path)
+        return DEFAULT_FONT_KEY
+
+    def get(self, font_family: str, font_size: int) -> LoadedFont:
+        key = (self.font_key(font_family), font_size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+
+            self.misses += 1
+            font = self._load(key[0], font_size)
+            self._fonts[key] = font
+            while len(self._fonts) > self.max_instances:
+                self._fonts.popitem(last=False)
+            return font
+
+    def _load(self, font_key: str, font_size: int) -> LoadedFont:
+        if font_key == DEFAULT_FONT_KEY:
+            return ImageFont.load_default()
+
+        font_path = Path(font_key)
+        data = self._font_bytes.get(font_path)
+        if data is None:
+            with font_path.open("rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                # FreeType (via Pillow) only accepts read-only bytes, so copy the mapping out exactly once.
+                data = mapped[:]
+            self._font_bytes[font_path] = data
+        return ImageFont.truetype(_SharedFontBytes(data), font_size)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fonts.clear()
+            self._font_bytes.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._fonts),
+            "files": len(self._font_bytes),
+            "file_bytes": sum(len(data) for data in self._font_bytes.values()),
+            "max_instances": self.max_instances,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+@lru_cache
+def get_font_registry() -> FontRegistry:
+    return FontRegistry(max_instances=settings.font_cache_max_instances)
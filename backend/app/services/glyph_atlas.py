@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core.config import get_settings
+
+settings = get_settings()
+
+GlyphKey = tuple[str, int, str, int]
+
+
+@dataclass(frozen=True)
+class Glyph:
+    """A pre-rasterized character: coverage mask plus its bbox relative to the draw origin."""
+
+    mask: Image.Image
+    bbox: tuple[int, int, int, int]
+
+    @property
+    def nbytes(self) -> int:
+        return self.mask.width * self.mask.height
+
+    def faded(self, alpha: int) -> Glyph:
+        """The same glyph with its coverage scaled by ``alpha / 255``."""
+        return Glyph(mask=self.mask.point(lambda value: value * alpha // 255), bbox=self.bbox)
+
+    def paste(self, image: Image.Image, xy: tuple[int, int], fill: int | tuple[int, ...]) -> None:
+        """Composite the glyph onto ``image`` exactly as ``ImageDraw.text(xy, ...)`` would."""
+        if not self.nbytes:
+            return
+        left = xy[0] + self.bbox[0]
+        top = xy[1] + self.bbox[1]
+        image.paste(fill, (left, top, left + self.mask.width, top + self.mask.height), self.mask)
+
+
+class GlyphAtlas:
+    """
+    Process-wide LRU of rasterized glyphs keyed by (font file, size, char, alpha), bounded by
+    mask bytes. Faded copies used for ghost strokes are entries of their own, so they count
+    against the budget and are evicted like any other glyph.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._glyphs: OrderedDict[GlyphKey, Glyph] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        font_key: str,
+        font: ImageFont.FreeTypeFont | ImageFont.ImageFont,
+        char: str,
+        alpha: int = 255,
+    ) -> Glyph:
+        size = getattr(font, "size", 0)
+        key = (font_key, size, char, alpha)
+        with self._lock:
+            glyph = self._lookup(key)
+            if glyph is not None:
+                self.hits += 1
+                return glyph
+
+            # FreeType faces are not thread-safe, so rasterize while holding the lock.
+            self.misses += 1
+            if alpha == 255:
+                return self._store(key, _rasterize(font, char))
+            base_key = (font_key, size, char, 255)
+            base = self._lookup(base_key) or self._store(base_key, _rasterize(font, char))
+            return self._store(key, base.faded(alpha))
+
+    def _lookup(self, key: GlyphKey) -> Glyph | None:
+        glyph = self._glyphs.get(key)
+        if glyph is not None:
+            self._glyphs.move_to_end(key)
+        return glyph
+
+    def _store(self, key: GlyphKey, glyph: Glyph) -> Glyph:
+        if glyph.nbytes <= self.max_bytes:
+            self._glyphs[key] = glyph
+            self.current_bytes += glyph.nbytes
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._glyphs.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+        return glyph
+
+    def clear(self) -> None:
+        with self._lock:
+            self._glyphs.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._glyphs),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def _rasterize(font: ImageFont.FreeTypeFont | ImageFont.ImageFont, char: str) -> Glyph:
+    bbox = font.getbbox(char)
+    left, top, right, bottom = (int(value) for value in bbox)
+    mask = Image.new("L", (max(0, right - left), max(0, bottom - top)), 0)
+    if mask.width and mask.height:
+        ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=font)
+    return Glyph(mask=mask, bbox=(left, top, right, bottom))
+
+
+@lru_cache
+def get_glyph_atlas() -> GlyphAtlas:
+    return GlyphAtlas(max_bytes=settings.glyph_cache_max_bytes)
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from PIL import Image, ImageDraw
+
+from app.services.glyph_atlas import Glyph
+
+
+class InkLayer:
+    """
+    Single-channel ink coverage for one canvas, composited onto the paper once at the end.
+
+    Every stroke lands on an ``L`` image as coverage (0 = paper, 255 = solid ink) through
+    Pillow's C paste/draw paths. Pasting full coverage through a glyph mask gives
+    ``e + a * (1 - e)``, the same result as stacking repeated draws of one ink colour, so
+    thickening passes combine exactly as before without touching the RGB canvas per pass.
+    Ghost strokes are pasted through a pre-faded mask (see ``GlyphAtlas.get(alpha=...)``) and
+    therefore honour their alpha.
+
+    A layer may cover only a horizontal band of the page starting at row ``top``; callers keep
+    passing page coordinates and strokes outside the band are clipped.
+    """
+
+    def __init__(self, size: tuple[int, int], top: int = 0) -> None:
+        self.top = top
+        self.coverage = Image.new("L", size, 0)
+        self._draw = ImageDraw.Draw(self.coverage)
+
+    def add_glyph(self, glyph: Glyph, xy: tuple[int, int]) -> None:
+        glyph.paste(self.coverage, (xy[0], xy[1] - self.top), 255)
+
+    def add_ghost(self, faded: Glyph, xy: tuple[int, int]) -> None:
+        faded.paste(self.coverage, (xy[0], xy[1] - self.top), 255)
+
+    def add_line(self, points: list[tuple[int, int]], width: int) -> None:
+        self._draw.line([(x, y - self.top) for x, y in points], fill=255, width=width)
+
+    def composite(self, image: Image.Image, color: tuple[int, int, int]) -> None:
+        width, height = self.coverage.size
+        image.paste(color, (0, self.top, width, self.top + height), self.coverage)
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import random
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, replace
+
+from app.services.font_registry import get_font_registry
+
+THICKEN = 1
+GHOST = 2
+SCRATCH = 4
+
+
+@dataclass(frozen=True)
+class PageGeometry:
+    width: int
+    height: int
+    margin_x: int
+    margin_top: int
+    max_x: int
+    max_y: int
+    line_step: int
+
+    @classmethod
+    def for_canvas(cls, size: tuple[int, int], font_size: int, line_height: float) -> PageGeometry:
+        width, height = size
+        margin_x = int(width * 0.09)
+        margin_top = int(height * 0.09)
+        margin_bottom = int(height * 0.09)
+        return cls(
+            width=width,
+            height=height,
+            margin_x=margin_x,
+            margin_top=margin_top,
+            max_x=width - margin_x,
+            max_y=height - margin_bottom,
+            line_step=int(font_size * line_height),
+        )
+
+
+@dataclass(frozen=True)
+class EffectParams:
+    """Jitter and ink-effect strengths, each in 0..1 (the request fields divided by 100)."""
+
+    position_jitter: float
+    weight_variation: float
+    sloppiness: float
+    scratch_rate: float
+
+
+class GlyphMetrics:
+    """
+    Per-font cache of the advance and ink height the renderer uses for wrapping.
+
+    Only the measured sizes are kept; on a miss the font comes from the font registry, so these
+    caches never hold font instances outside its LRU.
+    """
+
+    def __init__(self, font_family: str, font_size: int) -> None:
+        self.font_family = font_family
+        self.font_size = font_size
+        self._sizes: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def measure(self, char: str) -> tuple[int, int]:
+        size = self._sizes.get(char)
+        if size is None:
+            font = get_font_registry().get(self.font_family, self.font_size)
+            with self._lock:
+                bbox = font.getbbox(char)
+            size = (max(1, int(bbox[2] - bbox[0])) + 2, max(1, int(bbox[3] - bbox[1])))
+            self._sizes[char] = size
+        return size
+
+
+_metrics: dict[tuple[str, int], GlyphMetrics] = {}
+_metrics_lock = threading.Lock()
+
+
+def get_glyph_metrics(font_family: str, font_size: int) -> GlyphMetrics:
+    key = (get_font_registry().font_key(font_family), font_size)
+    metrics = _metrics.get(key)
+    if metrics is None:
+        with _metrics_lock:
+            metrics = _metrics.setdefault(key, GlyphMetrics(font_family, font_size))
+    return metrics
+
+
+@dataclass
+class GlyphLayout:
+    """
+    Array-backed glyph placements produced by :func:`layout_text`.
+
+    Row ``i`` places ``glyphs[glyph_ids[i]]`` at ``(xs[i], ys[i])`` on ``pages[i]``. Effect
+    details are packed into single bytes: ``thicken`` holds the pass count in bits 0-1 and a
+    (dx, dy) bit pair per pass above that; ``ghost`` and ``scratch`` hold two offsets in -1..1
+    encoded base 3. ``bottom`` is the lowest ink edge on the last page.
+    """
+
+    font_size: int
+    scratch_width: int
+    glyphs: list[str] = field(default_factory=list)
+    advances: list[int] = field(default_factory=list)
+    xs: array = field(default_factory=lambda: array("i"))
+    ys: array = field(default_factory=lambda: array("i"))
+    glyph_ids: array = field(default_factory=lambda: array("I"))
+    pages: array = field(default_factory=lambda: array("H"))
+    flags: array = field(default_factory=lambda: array("B"))
+    thicken: array = field(default_factory=lambda: array("B"))
+    ghost: array = field(default_factory=lambda: array("B"))
+    scratch: array = field(default_factory=lambda: array("B"))
+    page_count: int = 0
+    bottom: int = 0
+    truncated: bool = False
+
+    def __len__(self) -> int:
+        return len(self.xs)
+
+    def page_bounds(self, page: int) -> tuple[int, int]:
+        """Row range of ``page``; rows are emitted in page order, so each page is contiguous."""
+        return bisect_left(self.pages, page), bisect_right(self.pages, page)
+
+    def for_page(self, page: int) -> GlyphLayout:
+        """A self-contained copy of one page's rows, small enough to ship to a worker process."""
+        start, end = self.page_bounds(page)
+        return replace(
+            self,
+            xs=self.xs[start:end],
+            ys=self.ys[start:end],
+            glyph_ids=self.glyph_ids[start:end],
+            pages=self.pages[start:end],
+            flags=self.flags[start:end],
+            thicken=self.thicken[start:end],
+            ghost=self.ghost[start:end],
+            scratch=self.scratch[start:end],
+        )
+
+    def thicken_offsets(self, index: int) -> list[tuple[int, int]]:
+        packed = self.thicken[index]
+        return [((packed >> (2 + pass_no * 2)) & 1, (packed >> (3 + pass_no * 2)) & 1) for pass_no in range(packed & 3)]
+
+    def ghost_offset(self, index: int) -> tuple[int, int]:
+        return _unpack_pair(self.ghost[index])
+
+    def scratch_offsets(self, index: int) -> tuple[int, int]:
+        return _unpack_pair(self.scratch[index])
+
+
+def _pack_pair(first: int, second: int) -> int:
+    return (first + 1) * 3 + (second + 1)
+
+
+def _unpack_pair(packed: int) -> tuple[int, int]:
+    return packed // 3 - 1, packed % 3 - 1
+
+
+def page_random(random_seed: int, page: int) -> random.Random:
+    """Independent, deterministic RNG stream for one page; page 0 keeps the historic seeding."""
+    if page == 0:
+        return random.Random(random_seed)
+    return random.Random(f"{random_seed}:{page}")
+
+
+def layout_text(
+    text: str,
+    geometry: PageGeometry,
+    metrics: GlyphMetrics,
+    font_size: int,
+    effects: EffectParams | None = None,
+    random_seed: int | None = None,
+    max_pages: int | None = None,
+) -> GlyphLayout:
+    """
+    Wrap ``text`` into glyph placements without drawing anything.
+
+    Text that overflows ``geometry.max_y`` continues at the top of the next page, up to
+    ``max_pages``. Each page samples its effects from its own :func:`page_random` stream, so
+    any page can be rasterized on its own; on page 0 the draws happen in the same order as the
+    original single-pass renderer, so a given seed still produces the same first page. With
+    ``effects=None`` no randomness is consumed and glyphs sit exactly on the wrapping grid,
+    which is all that fill estimation needs.
+    """
+    sloppiness = effects.sloppiness if effects else 0.0
+    layout = GlyphLayout(font_size=font_size, scratch_width=max(1, int(1 + sloppiness)))
+    glyph_index: dict[str, int] = {}
+    seed = random_seed if random_seed is not None else random.randint(1, 10_000_000)
+    page = 0
+    rand = page_random(seed, page)
+
+    cursor_y = geometry.margin_top
+    for raw_line in text.split("\n"):
+        cursor_x = geometry.margin_x
+        line_text = raw_line or " "
+        for char in line_text:
+            char_width, char_height = metrics.measure(char)
+
+            if cursor_x + char_width > geometry.max_x and cursor_x > geometry.margin_x:
+                cursor_x = geometry.margin_x
+                cursor_y += geometry.line_step
+
+            if cursor_y + char_height > geometry.max_y and cursor_y > geometry.margin_top:
+                cursor_x = geometry.margin_x
+                cursor_y = geometry.margin_top
+                page += 1
+
+            if page >= layout.page_count:
+                if max_pages is not None and page >= max_pages:
+                    layout.truncated = True
+                    return layout
+                layout.page_count = page + 1
+                layout.bottom = 0
+                rand = page_random(seed, page)
+
+            glyph_id = glyph_index.get(char)
+            if glyph_id is None:
+                glyph_id = glyph_index[char] = len(layout.glyphs)
+                layout.glyphs.append(char)
+                layout.advances.append(char_width)
+
+            final_x, final_y = cursor_x, cursor_y
+            flags = thicken = ghost = scratch = 0
+            if effects is not None:
+                final_x, final_y, flags, thicken, ghost, scratch = _sample_effects(
+                    rand, effects, font_size, cursor_x, cursor_y
+                )
+
+            layout.xs.append(final_x)
+            layout.ys.append(final_y)
+            layout.glyph_ids.append(glyph_id)
+            layout.pages.append(page)
+            layout.flags.append(flags)
+            layout.thicken.append(thicken)
+            layout.ghost.append(ghost)
+            layout.scratch.append(scratch)
+            layout.bottom = max(layout.bottom, cursor_y + char_height)
+
+            cursor_x += char_width
+
+        cursor_y += geometry.line_step
+        if cursor_y > geometry.max_y:
+            cursor_y = geometry.margin_top
+            page += 1
+
+    return layout
+
+
+def _sample_effects(
+    rand: random.Random,
+    effects: EffectParams,
+    font_size: int,
+    cursor_x: int,
+    cursor_y: int,
+) -> tuple[int, int, int, int, int, int]:
+    sloppiness = effects.sloppiness
+    x_jitter = (rand.random() - 0.5) * font_size * effects.position_jitter * (0.8 + sloppiness * 0.3)
+    y_jitter = (rand.random() - 0.5) * font_size * effects.position_jitter * (0.35 + sloppiness * 0.25)
+    final_x = int(cursor_x + x_jitter)
+    final_y = int(cursor_y + y_jitter)
+
+    flags = thicken = ghost = scratch = 0
+    if rand.random() < effects.weight_variation:
+        flags |= THICKEN
+        passes = 1 + rand.randint(0, 2)
+        thicken = passes
+        for pass_no in range(passes):
+            thicken |= rand.randint(0, 1) << (2 + pass_no * 2)
+            thicken |= rand.randint(0, 1) << (3 + pass_no * 2)
+
+    if rand.random() < sloppiness * 0.30:
+        flags |= GHOST
+        ghost = _pack_pair(rand.randint(-1, 1), rand.randint(-1, 1))
+
+    if rand.random() < effects.scratch_rate:
+        flags |= SCRATCH
+        scratch = _pack_pair(rand.randint(-1, 1), rand.randint(-1, 1))
+
+    return final_x, final_y, flags, thicken, ghost, scratch
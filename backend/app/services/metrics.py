@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import bisect
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TASK_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class StageTimer:
+    """Wall-clock seconds spent per render stage; repeated stages accumulate."""
+
+    def __init__(self) -> None:
+        self.durations: dict[str, float] = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - started
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def milliseconds(self) -> dict[str, float]:
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.durations.items()}
+        timings["total"] = round(self.elapsed * 1000, 1)
+        return timings
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Prometheus histogram with one label; thread-safe, cumulative buckets rendered on export."""
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...], label: str | None = None) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label = label
+        self._series: dict[str, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = "") -> None:
+        with self._lock:
+            counts, total = self._series.setdefault(label_value, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total[0]) for key, (counts, total) in sorted(self._series.items())}
+        for label_value, (counts, total) in series.items():
+            base = {self.label: label_value} if self.label else {}
+            cumulative = 0
+            for bound, count in zip((*map(str, self.buckets), "+Inf"), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**base, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(base)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(base)} {cumulative}")
+        return lines
+
+
+def render_metric(
+    name: str,
+    help_text: str,
+    samples: Mapping[tuple[tuple[str, str], ...], float],
+    metric_type: str = "gauge",
+) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{_format_labels(dict(labels))} {_format_value(value)}")
+    return lines
+
+
+def local_cache_stats() -> dict[str, dict[str, int]]:
+    from app.services.background_cache import get_background_cache
+    from app.services.download_cache import get_download_cache
+    from app.services.font_registry import get_font_registry
+    from app.services.glyph_atlas import get_glyph_atlas
+
+    getters: dict[str, Callable[[], Any]] = {
+        "glyph_atlas": get_glyph_atlas,
+        "font_registry": get_font_registry,
+        "background": get_background_cache,
+        "download": get_download_cache,
+    }
+    # Only report caches this process actually built.
+    return {name: getter().stats() for name, getter in getters.items() if getter.cache_info().currsize}
+
+
+def process_usage() -> tuple[float, int]:
+    """CPU seconds (user + system) and peak resident set size in bytes of this process."""
+    if resource is None:
+        return 0.0, 0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ``ru_maxrss`` is in bytes on macOS and kilobytes elsewhere.
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+@dataclass(frozen=True)
+class MetricsReport:
+    """One finished render, sent from a render process to the API process over the event queue."""
+
+    pid: int
+    outcome: str
+    total_seconds: float
+    stages: dict[str, float]
+    caches: dict[str, dict[str, int]] = field(default_factory=dict)
+    cpu_seconds: float = 0.0
+    max_rss_bytes: int = 0
+
+    def apply(self) -> None:
+        get_render_metrics().merge(self)
+
+
+class RenderMetrics:
+    """
+    Render-stage and task duration histograms plus cache statistics from render processes.
+
+    Render processes created by the executor call :meth:`forward_to` so their observations (and
+    a snapshot of their cache counters) travel to the API process, which serves ``/metrics``.
+    """
+
+    def __init__(self) -> None:
+        self.stage_seconds = Histogram(
+            "render_stage_seconds", "Time spent in each render stage.", STAGE_BUCKETS, label="stage"
+        )
+        self.task_seconds = Histogram(
+            "render_task_seconds", "Time from start to finish of a render task.", TASK_BUCKETS, label="outcome"
+        )
+        self._worker_caches: dict[int, dict[str, dict[str, int]]] = {}
+        self._worker_usage: dict[int, tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self._forward: Any = None
+
+    def forward_to(self, queue: Any) -> None:
+        self._forward = queue
+
+    def record_task(self, timer: StageTimer, outcome: str) -> None:
+        forwarding = self._forward is not None
+        cpu_seconds, max_rss_bytes = process_usage() if forwarding else (0.0, 0)
+        report = MetricsReport(
+            pid=os.getpid(),
+            outcome=outcome,
+            total_seconds=timer.elapsed,
+            stages=dict(timer.durations),
+            caches=local_cache_stats() if forwarding else {},
+            cpu_seconds=cpu_seconds,
+            max_rss_bytes=max_rss_bytes,
+        )
+        if forwarding:
+            self._forward.put(report)
+        else:
+            self.merge(report)
+
+    def merge(self, report: MetricsReport) -> None:
+        for stage, seconds in report.stages.items():
+            self.stage_seconds.observe(seconds, stage)
+        self.task_seconds.observe(report.total_seconds, report.outcome)
+        with self._lock:
+            if report.caches:
+                self._worker_caches[report.pid] = report.caches
+            if report.max_rss_bytes:
+                self._worker_usage[report.pid] = (report.cpu_seconds, report.max_rss_bytes)
+
+    def cache_stats(self) -> dict[str, dict[str, int]]:
+        """Counters of this process's caches plus the latest snapshot of every render process."""
+        with self._lock:
+            snapshots = [*self._worker_caches.values(), local_cache_stats()]
+        totals: dict[str, dict[str, int]] = {}
+        for snapshot in snapshots:
+            for name, stats in snapshot.items():
+                merged = totals.setdefault(name, {"hits": 0, "misses": 0, "entries": 0})
+                for key in merged:
+                    merged[key] += int(stats.get(key, 0))
+        return totals
+
+    def render(self) -> list[str]:
+        caches = self.cache_stats()
+        lines = [*self.stage_seconds.render(), *self.task_seconds.render()]
+        for key, help_text in (("hits", "Cache hits."), ("misses", "Cache misses.")):
+            samples = {(("cache", name),): stats[key] for name, stats in sorted(caches.items())}
+            lines += render_metric(f"render_cache_{key}_total", help_text, samples, metric_type="counter")
+        lines += render_metric(
+            "render_cache_hit_ratio",
+            "Cache hits divided by lookups since start.",
+            {
+                (("cache", name),): stats["hits"] / (stats["hits"] + stats["misses"])
+                for name, stats in sorted(caches.items())
+                if stats["hits"] + stats["misses"]
+            },
+        )
+        lines += render_metric(
+            "render_cache_entries",
+            "Entries currently held by each cache.",
+            {(("cache", name),): stats["entries"] for name, stats in sorted(caches.items())},
+        )
+        with self._lock:
+            workers = sorted(self._worker_usage.items())
+        lines += render_metric(
+            "render_worker_cpu_seconds_total",
+            "CPU time of each render process as of its last finished task.",
+            {(("pid", str(pid)),): cpu for pid, (cpu, _) in workers},
+            metric_type="counter",
+        )
+        lines += render_metric(
+            "render_worker_max_rss_bytes",
+            "Peak resident memory of each render process as of its last finished task.",
+            {(("pid", str(pid)),): rss for pid, (_, rss) in workers},
+        )
+        cpu_seconds, max_rss_bytes = process_usage()
+        if max_rss_bytes:
+            lines += render_metric(
+                "process_cpu_seconds_total", "CPU time of the API process.", {(): cpu_seconds}, metric_type="counter"
+            )
+            lines += render_metric("process_max_rss_bytes", "Peak resident memory of the API process.", {(): max_rss_bytes})
+        return lines
+
+
+@lru_cache
+def get_render_metrics() -> RenderMetrics:
+    return RenderMetrics()
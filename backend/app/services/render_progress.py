@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from sqlalchemy import update
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.models.render_task import RenderTask
+from app.services.task_events import TaskEvent, get_task_event_bus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Share of the overall percentage each phase covers; rasterizing pages dominates real renders.
+LAYOUT_SHARE = 5.0
+RASTER_SHARE = 85.0
+
+
+class RenderCancelledError(RuntimeError):
+    """The render was abandoned, e.g. because another worker took over its lease."""
+
+
+class ProgressReporter:
+    """
+    Progress of one running render: characters laid out, pages rasterized and the encode phase.
+
+    Every change is published on the task event bus, which keeps the latest value in memory for
+    status queries and SSE clients. The ``progress_json`` column is only written when at least
+    ``render_progress_flush_seconds`` passed since the previous write, so long renders cost a
+    bounded number of extra commits. Once ``cancelled`` is set, the next progress step raises
+    :class:`RenderCancelledError` so the render stops between pages.
+    """
+
+    def __init__(self, task_id: str, chars_total: int, cancelled: threading.Event | None = None) -> None:
+        self.task_id = task_id
+        self.cancelled = cancelled
+        self.state: dict[str, object] = {
+            "phase": "layout",
+            "chars_total": chars_total,
+            "chars_laid_out": 0,
+            "pages_total": 0,
+            "pages_rasterized": 0,
+            "truncated": False,
+            "percent": 0.0,
+        }
+        self._flushed_at = 0.0
+
+    def layout_done(self, chars_laid_out: int, pages_total: int, truncated: bool = False) -> None:
+        """``truncated`` means text past ``render_max_pages`` was dropped; it stays in the stored progress."""
+        self.state.update(
+            phase="raster",
+            chars_laid_out=chars_laid_out,
+            pages_total=pages_total,
+            truncated=truncated,
+            percent=LAYOUT_SHARE,
+        )
+        self._report()
+
+    def page_done(self) -> None:
+        pages = int(self.state["pages_rasterized"]) + 1
+        total = max(1, int(self.state["pages_total"]))
+        self.state.update(pages_rasterized=pages, percent=round(LAYOUT_SHARE + RASTER_SHARE * pages / total, 1))
+        self._report()
+
+    def encoding(self) -> None:
+        self.state.update(phase="encode", percent=LAYOUT_SHARE + RASTER_SHARE)
+        self._report()
+
+    def finished(self) -> dict[str, object]:
+        self.state.update(phase="done", percent=100.0)
+        return dict(self.state)
+
+    def _report(self) -> None:
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise RenderCancelledError(f"Render task {self.task_id} was cancelled")
+        snapshot = dict(self.state)
+        get_task_event_bus().publish(TaskEvent(task_id=self.task_id, status="running", progress=snapshot))
+        now = time.monotonic()
+        if now - self._flushed_at < settings.render_progress_flush_seconds:
+            return
+        self._flushed_at = now
+        try:
+            with SessionLocal() as db:
+                db.execute(
+                    update(RenderTask)
+                    .where(RenderTask.id == self.task_id, RenderTask.status == "running")
+                    .values(progress_json=snapshot),
+                    execution_options={"synchronize_session": False},
+                )
+                db.commit()
+        except Exception:  # noqa: BLE001
+            logger.exception("Failed to store progress of render task %s", self.task_id)
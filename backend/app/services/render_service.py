@@ -1,20 +1,67 @@
 from __future__ import annotations
 
-import random
+import cProfile
+import hashlib
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import zipfile
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from itertools import islice
+from multiprocessing import util as multiprocessing_util
 from pathlib import Path
+from typing import TypeVar
 from uuid import uuid4
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.config import get_settings
 from app.core.database import SessionLocal
 from app.models.render_task import RenderTask
-from app.schemas.render import RenderTaskCreateRequest
-from app.services.asset_service import PAPER_BACKGROUND_CONFIG, resolve_font_path
+from app.schemas.render import MultiPageFormat, OutputFormat, RenderTaskCreateRequest
+from app.services.background_cache import get_background_cache
+from app.services.blob_storage import retain_blob, store_render_output, task_output_path
+from app.services.encoders import encode_image, get_encoder_profile, save_image
+from app.services.font_registry import LoadedFont, get_font_registry
+from app.services.glyph_atlas import Glyph, get_glyph_atlas
+from app.services.ink_compositor import InkLayer
+from app.services.layout_engine import (
+    GHOST,
+    SCRATCH,
+    THICKEN,
+    EffectParams,
+    GlyphLayout,
+    PageGeometry,
+    get_glyph_metrics,
+    layout_text,
+)
+from app.services.metrics import StageTimer, get_render_metrics
+from app.services.render_progress import ProgressReporter, RenderCancelledError
+from app.services.task_events import publish_task_status
+from app.services.variants import pregenerate_variants, write_cover
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Bump whenever the pixels produced for an unchanged request change; it is part of the result cache key.
+RENDERER_VERSION = "2"
+
+# PAPER_SIZES are pixel dimensions at this resolution (A4 = 210mm x 297mm at 600 dpi).
+PAPER_DPI = 600
 
 PAPER_SIZES: dict[str, tuple[int, int]] = {
     "a4-portrait": (4960, 7015),
@@ -25,6 +72,9 @@ PAPER_SIZES: dict[str, tuple[int, int]] = {
     "a3-landscape": (9921, 7015),
 }
 
+TEXT_COLOR = (30, 30, 30)
+GHOST_ALPHA = 100
+
 BACKGROUND_COLORS: dict[str, tuple[int, int, int]] = {
     "white": (255, 255, 255),
     "cream": (255, 248, 220),
@@ -36,16 +86,110 @@ def utcnow() -> datetime:
     return datetime.now(timezone.utc)
 
 
-def create_render_task(db: Session, payload: RenderTaskCreateRequest) -> RenderTask:
+def render_cache_key(payload: RenderTaskCreateRequest) -> str | None:
+    """
+    Content address of a render: the normalized request plus ``RENDERER_VERSION``.
+
+    Only seeded requests are deterministic, so unseeded ones get no key and always render.
+    ``user_id`` and ``debug_profile`` do not influence the pixels and are left out.
+    """
+    if payload.random_seed is None:
+        return None
+    normalized = json.dumps(
+        {"renderer": RENDERER_VERSION, "payload": payload.model_dump(mode="json", exclude={"user_id", "debug_profile"})},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def find_cached_output(db: Session, cache_key: str | None, exclude_task_id: str | None = None) -> RenderTask | None:
+    """Most recent successful task for ``cache_key`` whose output file still exists."""
+    if cache_key is None:
+        return None
+    query = db.query(RenderTask).filter(RenderTask.cache_key == cache_key, RenderTask.status == "success")
+    if exclude_task_id:
+        query = query.filter(RenderTask.id != exclude_task_id)
+    for candidate in query.order_by(RenderTask.completed_at.desc()).limit(5):
+        # Blob references keep stored outputs alive; older rows point at files that may be gone.
+        if candidate.blob_hash or (candidate.output_file_path and Path(candidate.output_file_path).exists()):
+            return candidate
+    return None
+
+
+def _reuse_output(db: Session, task: RenderTask, source: RenderTask) -> None:
+    if source.blob_hash:
+        retain_blob(db, source.blob_hash)
+    task.status = "success"
+    task.blob_hash = source.blob_hash
+    task.output_file_name = f"{task.id}{Path(source.output_file_name or source.output_file_path or '').suffix}"
+    task.output_file_path = source.output_file_path
+    task.completed_at = utcnow()
+    task.updated_at = utcnow()
+
+
+def build_render_task(db: Session, payload: RenderTaskCreateRequest, **columns: object) -> RenderTask:
+    """A new, unsaved task row; identical seeded requests with a finished output are completed immediately."""
+    cache_key = render_cache_key(payload)
     task = RenderTask(
         id=str(uuid4()),
         user_id=payload.user_id,
         status="pending",
         input_json=payload.model_dump(mode="json"),
+        cache_key=cache_key,
+        **columns,
     )
+    # A profiling request has to render; it still leaves its output for later identical requests.
+    cached = None if _wants_profile(payload) else find_cached_output(db, cache_key)
+    if cached:
+        _reuse_output(db, task, cached)
+    return task
+
+
+def _wants_profile(payload: RenderTaskCreateRequest) -> bool:
+    return payload.debug_profile and settings.render_profile_allowed
+
+
+def profile_path(task_id: str) -> Path:
+    return settings.profile_dir / f"{task_id}.prof"
+
+
+@contextmanager
+def _profiled(task_id: str, enabled: bool) -> Iterator[None]:
+    """Capture a cProfile dump of this thread; band threads and page processes are not included."""
+    if not enabled:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        settings.profile_dir.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(profile_path(task_id))
+
+
+def format_profile(path: Path, limit: int = 60) -> str:
+    stream = io.StringIO()
+    pstats.Stats(str(path), stream=stream).strip_dirs().sort_stats("cumulative").print_stats(limit)
+    return stream.getvalue()
+
+
+def _task_timings(task: RenderTask, timer: StageTimer) -> dict[str, float]:
+    """Milliseconds per stage, the task total and the queue wait before a worker picked it up."""
+    timings = timer.milliseconds()
+    if task.started_at and task.created_at:
+        started, created = (value.replace(tzinfo=None) for value in (task.started_at, task.created_at))
+        timings["queue_wait"] = round(max(0.0, (started - created).total_seconds()) * 1000, 1)
+    return timings
+
+
+def create_render_task(db: Session, payload: RenderTaskCreateRequest) -> RenderTask:
+    task = build_render_task(db, payload)
     db.add(task)
     db.commit()
-    db.refresh(task)
     return task
 
 
@@ -53,6 +197,40 @@ def get_render_task_or_none(db: Session, task_id: str) -> RenderTask | None:
     return db.query(RenderTask).filter(RenderTask.id == task_id).first()
 
 
+def task_status_counts(db: Session) -> dict[str, int]:
+    return dict(db.execute(select(RenderTask.status, func.count()).group_by(RenderTask.status)).all())
+
+
+async def aget_render_task_or_none(db: AsyncSession, task_id: str) -> RenderTask | None:
+    return await db.get(RenderTask, task_id)
+
+
+_flights: dict[str, tuple[threading.Lock, int]] = {}
+_flights_lock = threading.Lock()
+
+
+@contextmanager
+def _single_flight(cache_key: str | None) -> Iterator[None]:
+    """Serialize renders of one cache key so followers can pick up the leader's output."""
+    if cache_key is None:
+        yield
+        return
+
+    with _flights_lock:
+        lock, waiters = _flights.get(cache_key, (threading.Lock(), 0))
+        _flights[cache_key] = (lock, waiters + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _flights_lock:
+            lock, waiters = _flights[cache_key]
+            if waiters <= 1:
+                del _flights[cache_key]
+            else:
+                _flights[cache_key] = (lock, waiters - 1)
+
+
 def _draw_background(image: Image.Image, paper_background: str) -> None:
     draw = ImageDraw.Draw(image)
     color = BACKGROUND_COLORS.get(paper_background)
@@ -60,160 +238,581 @@ def _draw_background(image: Image.Image, paper_background: str) -> None:
         draw.rectangle([(0, 0), image.size], fill=color)
         return
 
-    config = PAPER_BACKGROUND_CONFIG.get(paper_background, {})
-    file_name = config.get("file_name")
-    if not file_name:
+    canvas = get_background_cache().get(paper_background, image.size)
+    if canvas is None:
         draw.rectangle([(0, 0), image.size], fill=BACKGROUND_COLORS["white"])
         return
 
-    bg_path = settings.papers_dir / file_name
-    if not bg_path.exists():
-        draw.rectangle([(0, 0), image.size], fill=BACKGROUND_COLORS["white"])
-        return
+    image.paste(canvas, (0, 0))
 
-    with Image.open(bg_path) as bg:
-        bg = bg.convert("RGB")
-        target_w, target_h = image.size
-        scale = min(target_w / bg.width, target_h / bg.height)
-        draw_w = int(bg.width * scale)
-        draw_h = int(bg.height * scale)
-        resized = bg.resize((draw_w, draw_h), Image.Resampling.LANCZOS)
-        offset_x = (target_w - draw_w) // 2
-        offset_y = (target_h - draw_h) // 2
-        image.paste(resized, (offset_x, offset_y))
 
+def _prepare_background(paper_background: str, size: tuple[int, int]) -> None:
+    """Build or map the paper canvas up front, so its cost is measured apart from rasterization."""
+    if paper_background not in BACKGROUND_COLORS:
+        get_background_cache().get(paper_background, size)
 
-def _load_font(font_family: str, font_size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
-    font_path = resolve_font_path(font_family)
-    if font_path and font_path.exists():
-        return ImageFont.truetype(str(font_path), font_size)
-    return ImageFont.load_default()
 
+def _load_font(font_family: str, font_size: int) -> LoadedFont:
+    return get_font_registry().get(font_family, font_size)
+
+
+def _effect_params(payload: RenderTaskCreateRequest) -> EffectParams:
+    return EffectParams(
+        position_jitter=payload.position_jitter / 100.0,
+        weight_variation=payload.weight_variation / 100.0,
+        sloppiness=payload.note_sloppiness / 100.0,
+        scratch_rate=payload.scratch_rate / 100.0,
+    )
 
-def _draw_handwriting(image: Image.Image, payload: RenderTaskCreateRequest) -> None:
-    draw = ImageDraw.Draw(image)
-    text_color = (30, 30, 30)
-    position_jitter = payload.position_jitter / 100.0
-    scratch_rate = payload.scratch_rate / 100.0
-    weight_variation = payload.weight_variation / 100.0
-    sloppiness = payload.note_sloppiness / 100.0
 
+def _layout_handwriting(payload: RenderTaskCreateRequest, size: tuple[int, int]) -> GlyphLayout:
     font_size = max(12, int(payload.font_size))
-    font = _load_font(payload.font_family, font_size)
+    return layout_text(
+        payload.text,
+        PageGeometry.for_canvas(size, font_size, payload.line_height),
+        get_glyph_metrics(payload.font_family, font_size),
+        font_size,
+        effects=_effect_params(payload),
+        random_seed=payload.random_seed,
+        max_pages=settings.render_max_pages,
+    )
+
 
+def _rasterize_glyphs(
+    image: Image.Image,
+    layout: GlyphLayout,
+    font_family: str,
+    page: int = 0,
+    scale: float = 1.0,
+    deadline: float | None = None,
+) -> bool:
+    """
+    Draw one page of ``layout`` onto ``image``.
+
+    ``scale`` maps layout coordinates onto a smaller canvas (glyphs are rasterized at the scaled
+    font size) so previews keep the full render's line breaks. When ``deadline`` (a
+    ``time.perf_counter()`` value) passes, drawing stops early; the return value says whether
+    every glyph of the page made it onto the canvas. Large pages without a deadline are split
+    into horizontal bands rasterized on a thread pool (see :func:`_rasterize_bands`).
+    """
+    font_size = max(1, round(layout.font_size * scale))
+    font = _load_font(font_family, font_size)
+    font_key = get_font_registry().font_key(font_family)
+    atlas = get_glyph_atlas()
+    # Resolving every glyph up front keeps FreeType work out of the band threads.
+    glyphs = [atlas.get(font_key, font, char) for char in layout.glyphs]
+    rows = range(*layout.page_bounds(page))
+    ghosted = {layout.glyph_ids[index] for index in rows if layout.flags[index] & GHOST}
+    ghosts = {glyph_id: atlas.get(font_key, font, layout.glyphs[glyph_id], GHOST_ALPHA) for glyph_id in ghosted}
+
+    band_count = _band_count(image.size) if deadline is None else 1
+    if band_count > 1:
+        _rasterize_bands(image, layout, glyphs, ghosts, rows, scale, band_count)
+        return True
+
+    ink = InkLayer(image.size)
+    completed = _draw_rows(ink, layout, glyphs, ghosts, rows, scale, deadline)
+    ink.composite(image, TEXT_COLOR)
+    return completed
+
+
+def _draw_rows(
+    ink: InkLayer,
+    layout: GlyphLayout,
+    glyphs: list[Glyph],
+    ghosts: dict[int, Glyph],
+    rows: Iterable[int],
+    scale: float,
+    deadline: float | None = None,
+) -> bool:
+    scratch_offset_y = int(layout.font_size * 0.55)
+    scratch_width = max(1, round(layout.scratch_width * scale))
+
+    for count, index in enumerate(rows):
+        if deadline is not None and count % 64 == 0 and time.perf_counter() > deadline:
+            return False
+
+        glyph_id = layout.glyph_ids[index]
+        glyph = glyphs[glyph_id]
+        final_x = layout.xs[index]
+        final_y = layout.ys[index]
+        flags = layout.flags[index]
+
+        if flags & THICKEN:
+            for dx, dy in layout.thicken_offsets(index):
+                ink.add_glyph(glyph, (int((final_x + dx) * scale), int((final_y + dy) * scale)))
+
+        ink.add_glyph(glyph, (int(final_x * scale), int(final_y * scale)))
+
+        if flags & GHOST:
+            dx, dy = layout.ghost_offset(index)
+            ink.add_ghost(ghosts[glyph_id], (int((final_x + dx) * scale), int((final_y + dy) * scale)))
+
+        if flags & SCRATCH:
+            mid_y = final_y + scratch_offset_y
+            dy_start, dy_end = layout.scratch_offsets(index)
+            ink.add_line(
+                [
+                    (int((final_x - 2) * scale), int((mid_y + dy_start) * scale)),
+                    (int((final_x + layout.advances[glyph_id] + 2) * scale), int((mid_y + dy_end) * scale)),
+                ],
+                width=scratch_width,
+            )
+    return True
+
+
+_band_pool: ThreadPoolExecutor | None = None
+_band_pool_lock = threading.Lock()
+
+
+def _band_count(size: tuple[int, int]) -> int:
+    if settings.render_band_threads <= 1 or size[0] * size[1] < settings.render_band_min_pixels:
+        return 1
+    return settings.render_band_threads
+
+
+def _get_band_pool() -> ThreadPoolExecutor:
+    global _band_pool
+    with _band_pool_lock:
+        if _band_pool is None:
+            _band_pool = ThreadPoolExecutor(max_workers=settings.render_band_threads, thread_name_prefix="render-band")
+        return _band_pool
+
+
+def _rasterize_bands(
+    image: Image.Image,
+    layout: GlyphLayout,
+    glyphs: list[Glyph],
+    ghosts: dict[int, Glyph],
+    rows: range,
+    scale: float,
+    band_count: int,
+) -> None:
+    """
+    Rasterize horizontal bands of one page concurrently and composite each into place.
+
+    A row is assigned to every band its conservative vertical extent (ink bbox plus the largest
+    thicken/ghost/scratch offsets) touches. Each band keeps the page's row order, so every pixel
+    sees the same strokes in the same order as a single-band render and the output is
+    identical. Pillow releases the GIL inside paste/draw, which lets bands overlap.
+    """
     width, height = image.size
-    margin_x = int(width * 0.09)
-    margin_top = int(height * 0.09)
-    margin_bottom = int(height * 0.09)
-    max_x = width - margin_x
-    max_y = height - margin_bottom
-    line_step = int(font_size * payload.line_height)
-
-    random_seed = payload.random_seed if payload.random_seed is not None else random.randint(1, 10_000_000)
-    rand = random.Random(random_seed)
-
-    cursor_y = margin_top
-    for raw_line in payload.text.split("\n"):
-        cursor_x = margin_x
-        line_text = raw_line or " "
-        for char in line_text:
-            bbox = draw.textbbox((0, 0), char, font=font)
-            char_width = max(1, bbox[2] - bbox[0]) + 2
-            char_height = max(1, bbox[3] - bbox[1])
-
-            if cursor_x + char_width > max_x and cursor_x > margin_x:
-                cursor_x = margin_x
-                cursor_y += line_step
-
-            if cursor_y + char_height > max_y:
-                return
-
-            x_jitter = (rand.random() - 0.5) * font_size * position_jitter * (0.8 + sloppiness * 0.3)
-            y_jitter = (rand.random() - 0.5) * font_size * position_jitter * (0.35 + sloppiness * 0.25)
-            final_x = int(cursor_x + x_jitter)
-            final_y = int(cursor_y + y_jitter)
-
-            should_thicken = rand.random() < weight_variation
-            if should_thicken:
-                for _ in range(1 + rand.randint(0, 2)):
-                    draw.text(
-                        (final_x + rand.randint(0, 1), final_y + rand.randint(0, 1)),
-                        char,
-                        fill=text_color,
-                        font=font,
-                    )
+    band_height = -(-height // band_count)
+    band_rows: list[list[int]] = [[] for _ in range(band_count)]
+    pad = 2 + max(1, round(layout.scratch_width * scale))
+    scratch_bottom = int((layout.font_size * 0.55 + 1) * scale) + 1
+
+    for index in rows:
+        glyph = glyphs[layout.glyph_ids[index]]
+        origin_y = int(layout.ys[index] * scale)
+        top = origin_y + min(glyph.bbox[1], 0) - pad
+        bottom = origin_y + max(glyph.bbox[3], scratch_bottom) + pad
+        first = max(0, top // band_height)
+        last = min(band_count - 1, bottom // band_height)
+        for band in range(first, last + 1):
+            band_rows[band].append(index)
+
+    def draw_band(band: int) -> None:
+        top = band * band_height
+        ink = InkLayer((width, min(band_height, height - top)), top=top)
+        _draw_rows(ink, layout, glyphs, ghosts, band_rows[band], scale)
+        ink.composite(image, TEXT_COLOR)
+
+    list(_get_band_pool().map(draw_band, [band for band in range(band_count) if band * band_height < height]))
+
+
+def _draw_handwriting(image: Image.Image, payload: RenderTaskCreateRequest) -> None:
+    layout = _layout_handwriting(payload, image.size)
+    _rasterize_glyphs(image, layout, payload.font_family)
 
-            draw.text((final_x, final_y), char, fill=text_color, font=font)
-
-            if rand.random() < sloppiness * 0.30:
-                draw.text(
-                    (final_x + rand.randint(-1, 1), final_y + rand.randint(-1, 1)),
-                    char,
-                    fill=(30, 30, 30, 100),
-                    font=font,
-                )
-
-            if rand.random() < scratch_rate:
-                mid_y = final_y + int(font_size * 0.55)
-                draw.line(
-                    [
-                        (final_x - 2, mid_y + rand.randint(-1, 1)),
-                        (final_x + char_width + 2, mid_y + rand.randint(-1, 1)),
-                    ],
-                    fill=text_color,
-                    width=max(1, int(1 + sloppiness)),
-                )
-
-            cursor_x += char_width
-
-        cursor_y += line_step
-        if cursor_y > max_y:
-            return
-
-
-def render_handwriting_image(payload: RenderTaskCreateRequest, output_path: Path) -> None:
-    paper_width, paper_height = PAPER_SIZES.get(payload.paper_type.value, PAPER_SIZES["a4-portrait"])
-    render_scale = payload.render_scale or settings.render_scale
-    width = max(720, int(paper_width * render_scale))
-    height = max(1024, int(paper_height * render_scale))
-
-    image = Image.new("RGB", (width, height), color=(255, 255, 255))
+
+def paper_canvas_size(paper_type: str, render_scale: float | None) -> tuple[int, int]:
+    paper_width, paper_height = PAPER_SIZES.get(paper_type, PAPER_SIZES["a4-portrait"])
+    render_scale = render_scale or settings.render_scale
+    return max(720, int(paper_width * render_scale)), max(1024, int(paper_height * render_scale))
+
+
+def _canvas_size(payload: RenderTaskCreateRequest) -> tuple[int, int]:
+    return paper_canvas_size(payload.paper_type.value, payload.render_scale)
+
+
+def _render_page(
+    payload: RenderTaskCreateRequest,
+    layout: GlyphLayout,
+    size: tuple[int, int],
+    page: int,
+) -> Image.Image:
+    image = Image.new("RGB", size, color=(255, 255, 255))
     _draw_background(image, payload.paper_background.value)
-    _draw_handwriting(image, payload)
+    _rasterize_glyphs(image, layout, payload.font_family, page)
+    return image
+
+
+def _render_page_encoded(
+    payload: RenderTaskCreateRequest,
+    layout: GlyphLayout,
+    size: tuple[int, int],
+    page: int,
+) -> bytes:
+    return encode_image(_render_page(payload, layout, size, page), payload.output_format, payload.output_quality)
+
+
+_page_pool: ProcessPoolExecutor | None = None
+_page_pool_lock = threading.Lock()
+
+
+def _page_workers() -> int:
+    return settings.render_page_workers or os.cpu_count() or 1
+
+
+def _get_page_pool() -> ProcessPoolExecutor | None:
+    global _page_pool
+    if _page_workers() <= 1:
+        return None
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(max_workers=_page_workers())
+            # Render processes exit without running atexit hooks; multiprocessing finalizers do run.
+            multiprocessing_util.Finalize(None, shutdown_page_pool, exitpriority=10)
+        return _page_pool
+
+
+def shutdown_page_pool() -> None:
+    """Stop the page worker processes; the next multi-page render starts a new pool."""
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+def _iter_pages(
+    payload: RenderTaskCreateRequest,
+    layout: GlyphLayout,
+    size: tuple[int, int],
+    render_page: Callable[[RenderTaskCreateRequest, GlyphLayout, tuple[int, int], int], T],
+    progress: ProgressReporter | None = None,
+) -> Iterator[T]:
+    """
+    Rasterize every page in order, fanning out to worker processes; each page only ships its own rows.
+
+    Only a couple of pages per worker are in flight, so callers that write each page as it
+    arrives hold a bounded number of page images however long the document is.
+    """
+    pool = _get_page_pool() if layout.page_count > 1 else None
+    pages = iter(range(layout.page_count))
+    if pool is None:
+        for page in pages:
+            result = render_page(payload, layout, size, page)
+            if progress is not None:
+                progress.page_done()
+            yield result
+        return
+
+    def submit(page: int) -> Future[T]:
+        return pool.submit(render_page, payload, layout.for_page(page), size, page)
+
+    pending = deque(submit(page) for page in islice(pages, _page_workers() * 2))
+    try:
+        while pending:
+            result = pending.popleft().result()
+            for page in islice(pages, 1):
+                pending.append(submit(page))
+            if progress is not None:
+                progress.page_done()
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def render_handwriting_image(
+    payload: RenderTaskCreateRequest,
+    output_path: Path,
+    progress: ProgressReporter | None = None,
+    timer: StageTimer | None = None,
+) -> Path:
+    """
+    Render ``payload`` and return the file actually written.
+
+    A single page is encoded with the ``output_format`` profile; ``output_path`` only supplies the
+    directory and stem. Overflowing text continues onto more pages, which are written as a
+    multi-page PDF or a ZIP of encoded pages (see ``multipage_format``).
+    """
+    timer = timer or StageTimer()
+    size = _canvas_size(payload)
+    with timer.stage("font_load"):
+        get_glyph_metrics(payload.font_family, max(12, int(payload.font_size)))
+    with timer.stage("background"):
+        _prepare_background(payload.paper_background.value, size)
+    with timer.stage("layout"):
+        layout = _layout_handwriting(payload, size)
+    if layout.truncated:
+        logger.warning("Text exceeds render_max_pages=%s; the rest is not rendered", settings.render_max_pages)
+    if progress is not None:
+        progress.layout_done(len(layout), layout.page_count, layout.truncated)
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    image.save(output_path, format="PNG", optimize=True)
+    profile = get_encoder_profile(payload.output_format)
+
+    if layout.page_count <= 1:
+        output_path = output_path.with_suffix(profile.extension)
+        with timer.stage("rasterize"):
+            image = _render_page(payload, layout, size, 0)
+        if progress is not None:
+            progress.page_done()
+            progress.encoding()
+        with timer.stage("encode"):
+            save_image(image, output_path, payload.output_format, payload.output_quality)
+        return output_path
+
+    pages = _iter_pages(
+        payload,
+        layout,
+        size,
+        _render_page_encoded if payload.multipage_format == MultiPageFormat.ZIP else _render_page,
+        progress,
+    )
+    if payload.multipage_format == MultiPageFormat.ZIP:
+        # Pages come back already encoded, so the encode stage is only the archive write.
+        output_path = output_path.with_suffix(".zip")
+        with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED) as archive:
+            for page_no in range(1, layout.page_count + 1):
+                with timer.stage("rasterize"):
+                    data = next(pages)
+                with timer.stage("encode"):
+                    archive.writestr(f"page-{page_no:03d}{profile.extension}", data)
+    else:
+        # Each page is appended to the PDF as it arrives instead of holding every page image.
+        output_path = output_path.with_suffix(".pdf")
+        paper_width, _ = PAPER_SIZES.get(payload.paper_type.value, PAPER_SIZES["a4-portrait"])
+        resolution = PAPER_DPI * size[0] / paper_width
+        for page_no in range(layout.page_count):
+            with timer.stage("rasterize"):
+                image = next(pages)
+            with timer.stage("encode"):
+                image.save(output_path, format="PDF", append=page_no > 0, resolution=resolution)
+                if page_no == 0:
+                    # Thumbnails of a PDF are cut from this cover; page one is only in memory now.
+                    write_cover(image, output_path)
+    return output_path
+
+
+@dataclass
+class PreviewResult:
+    content: bytes
+    media_type: str
+    page_count: int
+    truncated: bool
+    elapsed_ms: float
+
+
+PREVIEW_FORMATS: dict[str, OutputFormat] = {
+    "jpeg": OutputFormat.JPEG,
+    "webp": OutputFormat.WEBP,
+}
+
+
+def render_preview(payload: RenderTaskCreateRequest, page: int = 0, image_format: str = "jpeg") -> PreviewResult:
+    """
+    Render one page synchronously for interactive previews, without a task row or output file.
+
+    Layout runs at the full canvas size so line breaks match the final render; only the raster
+    stage is scaled down so the long side fits ``preview_max_side``. Glyph drawing stops once
+    ``preview_budget_ms`` is spent, and the result is flagged as truncated.
+    """
+    started = time.perf_counter()
+    deadline = started + settings.preview_budget_ms / 1000
+    size = _canvas_size(payload)
+    layout = _layout_handwriting(payload, size)
+    page = min(page, max(0, layout.page_count - 1))
+
+    scale = min(1.0, settings.preview_max_side / max(size))
+    preview_size = (max(1, int(size[0] * scale)), max(1, int(size[1] * scale)))
+    image = Image.new("RGB", preview_size, color=(255, 255, 255))
+    _draw_background(image, payload.paper_background.value)
+    completed = _rasterize_glyphs(image, layout, payload.font_family, page, scale=scale, deadline=deadline)
+
+    output_format = PREVIEW_FORMATS.get(image_format, OutputFormat.JPEG)
+    return PreviewResult(
+        content=encode_image(image, output_format, settings.preview_quality),
+        media_type=get_encoder_profile(output_format).media_type,
+        page_count=layout.page_count,
+        truncated=not completed,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+    )
+
+
+POOL_CLAIM_PREFIX = "pool:"
+
+
+def _start_tasks(db: Session, task_ids: list[str]) -> list[RenderTask]:
+    """
+    Move still-pending tasks to ``running`` with one UPDATE and one commit.
+
+    The rows are tagged with a claim token so that, when the same task is dispatched twice, only
+    the call whose UPDATE matched renders it.
+    """
+    now = utcnow()
+    token = f"{POOL_CLAIM_PREFIX}{os.getpid()}:{uuid4().hex[:8]}"
+    db.execute(
+        update(RenderTask)
+        .where(RenderTask.id.in_(task_ids), RenderTask.status == "pending")
+        .values(status="running", worker_id=token, started_at=now, updated_at=now),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return (
+        db.query(RenderTask)
+        .filter(RenderTask.id.in_(task_ids), RenderTask.worker_id == token)
+        .order_by(RenderTask.batch_index)
+        .all()
+    )
+
+
+def fail_render_tasks(db: Session, task_ids: list[str], message: str) -> None:
+    """Fail the given tasks that never finished, e.g. because they could not be dispatched."""
+    now = utcnow()
+    db.execute(
+        update(RenderTask)
+        .where(RenderTask.id.in_(task_ids), RenderTask.status.in_(("pending", "running")))
+        .values(status="failed", error_message=message, completed_at=now, updated_at=now),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    for task in db.query(RenderTask).filter(RenderTask.id.in_(task_ids), RenderTask.status == "failed"):
+        publish_task_status(task)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def recover_pool_tasks(db: Session) -> list[RenderTask]:
+    """
+    Requeue what a previous process-pool run left behind and return every pending task.
+
+    Shutting the pool down cancels queued renders, which stay ``pending``; a hard stop also
+    strands ``running`` rows claimed by render processes that no longer exist. Those are reset
+    to ``pending`` so they are rendered again.
+    """
+    claimed = db.execute(
+        select(RenderTask.id, RenderTask.worker_id).where(
+            RenderTask.status == "running", RenderTask.worker_id.like(f"{POOL_CLAIM_PREFIX}%")
+        )
+    ).all()
+    stale = [task_id for task_id, worker_id in claimed if not _pid_alive(int(worker_id.split(":")[1]))]
+    if stale:
+        db.execute(
+            update(RenderTask)
+            .where(RenderTask.id.in_(stale), RenderTask.status == "running")
+            .values(status="pending", worker_id=None, started_at=None, updated_at=utcnow()),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+    return db.query(RenderTask).filter(RenderTask.status == "pending").order_by(RenderTask.created_at).all()
 
 
 def run_render_task(task_id: str) -> None:
+    run_render_tasks([task_id])
+
+
+def run_render_tasks(task_ids: list[str]) -> None:
+    """
+    Render several tasks back to back in one worker call.
+
+    The tasks are claimed with a single commit and share this process's font registry, glyph
+    atlas and background cache, so only the first one pays for the warm-up.
+    """
     db = SessionLocal()
     try:
-        task = get_render_task_or_none(db, task_id)
-        if not task:
-            return
+        tasks = _start_tasks(db, task_ids)
+        for task in tasks:
+            publish_task_status(task)
+        for task in tasks:
+            execute_render_task(db, task)
+    finally:
+        db.close()
 
-        task.status = "running"
-        task.started_at = utcnow()
-        task.updated_at = utcnow()
-        db.commit()
 
+def _owns(db: Session, task_id: str, owner: str) -> bool:
+    """
+    Whether ``owner`` still holds the task's lease. The check is an UPDATE, so on SQLite it also
+    takes the write lock and nobody can claim the task between this check and the commit.
+    """
+    result = db.execute(
+        update(RenderTask).where(RenderTask.id == task_id, RenderTask.worker_id == owner).values(worker_id=owner),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount == 1
+
+
+def execute_render_task(
+    db: Session,
+    task: RenderTask,
+    owner: str | None = None,
+    cancelled: threading.Event | None = None,
+) -> None:
+    """
+    Render a task already marked ``running`` and record success or failure on it.
+
+    Queue workers pass their ``owner`` id and the heartbeat's ``cancelled`` flag: the render
+    stops once the lease is lost, and no outcome is written unless the task is still theirs.
+    """
+    task_id = task.id
+    timer = StageTimer()
+    outcome = "failed"
+    try:
         payload = RenderTaskCreateRequest.model_validate(task.input_json)
-        file_name = f"{task.id}.png"
-        output_path = settings.render_dir / file_name
-        render_handwriting_image(payload, output_path)
-
-        task.status = "success"
-        task.output_file_name = file_name
-        task.output_file_path = str(output_path)
-        task.completed_at = utcnow()
-        task.updated_at = utcnow()
-        db.commit()
+        profile = _wants_profile(payload)
+        with _single_flight(task.cache_key):
+            cached = None if profile else find_cached_output(db, task.cache_key, exclude_task_id=task.id)
+            if cached:
+                _reuse_output(db, task, cached)
+            else:
+                progress = ProgressReporter(task.id, chars_total=len(payload.text), cancelled=cancelled)
+                with _profiled(task.id, profile):
+                    output_path = render_handwriting_image(
+                        payload, settings.render_dir / f"{task.id}.png", progress, timer
+                    )
+                with timer.stage("store"):
+                    store_render_output(db, task, output_path)
+                task.status = "success"
+                task.progress_json = progress.finished()
+                task.completed_at = utcnow()
+                task.updated_at = utcnow()
+            # Stored timings end here; the commit and variant stages only reach /metrics.
+            task.timings_json = _task_timings(task, timer)
+            with timer.stage("db_commit"):
+                if owner is not None and not _owns(db, task_id, owner):
+                    raise RenderCancelledError(f"Render task {task_id} was taken over by another worker")
+                db.commit()
+        publish_task_status(task)
+        if not cached:
+            with timer.stage("variants"):
+                pregenerate_variants(task_output_path(task))
+        outcome = "reused" if cached else "success"
+    except RenderCancelledError as exc:
+        # The new lease holder records the outcome; the reference this render took is rolled back.
+        db.rollback()
+        logger.warning("%s; discarding its result", exc)
+        outcome = "cancelled"
     except Exception as exc:  # noqa: BLE001
+        db.rollback()
         task = get_render_task_or_none(db, task_id)
-        if task:
+        if task and (owner is None or _owns(db, task_id, owner)):
             task.status = "failed"
             task.error_message = str(exc)
+            task.timings_json = _task_timings(task, timer)
             task.completed_at = utcnow()
             task.updated_at = utcnow()
             db.commit()
-    finally:
-        db.close()
+            publish_task_status(task)
+        else:
+            db.rollback()
+    get_render_metrics().record_task(timer, outcome)
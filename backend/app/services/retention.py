@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.models.render_blob import RenderBlob
+from app.models.render_task import RenderTask, utcnow
+from app.services.blob_storage import get_blob_storage, purge_unreferenced_blobs, release_blobs
+from app.services.download_cache import get_download_cache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+EXPIRED_MESSAGE = "渲染结果已过期清理，请重新提交任务"
+NO_SYNC = {"synchronize_session": False}
+# Statuses whose rows still own (or will own) a file named after them.
+LIVE_STATUSES = ("pending", "running", "success")
+CHUNK_SIZE = 500
+
+_last_used = func.coalesce(RenderTask.last_accessed_at, RenderTask.completed_at, RenderTask.updated_at)
+
+
+def _owner(name: str) -> str:
+    """Task id a file in ``render_dir`` belongs to: ``{id}.png``, ``{id}.w320.webp``, ``.{id}.png.*.tmp``."""
+    return name.lstrip(".").split(".", 1)[0]
+
+
+def _chunks(items: list[str]) -> Iterable[list[str]]:
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start : start + CHUNK_SIZE]
+
+
+@dataclass
+class SweepReport:
+    expired_tasks: int = 0
+    deleted_files: int = 0
+    freed_bytes: int = 0
+    storage_bytes: int = 0
+    expired_ids: list[str] = field(default_factory=list, repr=False)
+
+
+class AccessRecorder:
+    """
+    Download times of finished tasks, buffered in memory.
+
+    Downloads are usually served from the download cache without touching the database, so the
+    ``last_accessed_at`` column is written in one bulk UPDATE by :meth:`flush` instead.
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def record(self, task_id: str) -> None:
+        with self._lock:
+            self._pending[task_id] = utcnow()
+
+    def flush(self, db: Session) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            db.execute(
+                update(RenderTask),
+                [{"id": task_id, "last_accessed_at": accessed_at} for task_id, accessed_at in pending.items()],
+            )
+            db.commit()
+        return len(pending)
+
+
+@lru_cache
+def get_access_recorder() -> AccessRecorder:
+    return AccessRecorder()
+
+
+class _Directory:
+    """One ``scandir`` pass over ``render_dir``, grouped by owning task id."""
+
+    def __init__(self, root: Path) -> None:
+        self.groups: dict[str, list[os.DirEntry[str]]] = {}
+        if root.is_dir():
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        self.groups.setdefault(_owner(entry.name), []).append(entry)
+
+    def size(self, owner: str) -> int:
+        return sum(entry.stat().st_size for entry in self.groups.get(owner, ()))
+
+    @property
+    def total(self) -> int:
+        return sum(self.size(owner) for owner in self.groups)
+
+    def delete(self, owner: str, report: SweepReport) -> None:
+        for entry in self.groups.pop(owner, ()):
+            try:
+                size = entry.stat().st_size
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+            report.deleted_files += 1
+            report.freed_bytes += size
+
+
+def _expire_paths(db: Session, paths: list[str], now: datetime, report: SweepReport) -> None:
+    """Mark every successful task sharing one of ``paths`` as expired; reused outputs share files."""
+    for chunk in _chunks(paths):
+        rows = db.execute(
+            select(RenderTask.id, RenderTask.blob_hash).where(
+                RenderTask.status == "success", RenderTask.output_file_path.in_(chunk)
+            )
+        ).all()
+        _expire_ids(db, [task_id for task_id, _ in rows], now, report)
+        release_blobs(db, [blob_hash for _, blob_hash in rows])
+
+
+def _expire_ids(db: Session, ids: list[str], now: datetime, report: SweepReport) -> None:
+    for chunk in _chunks(ids):
+        db.execute(
+            update(RenderTask)
+            .where(RenderTask.id.in_(chunk))
+            .values(status="expired", error_message=func.coalesce(RenderTask.error_message, EXPIRED_MESSAGE), updated_at=now),
+            execution_options=NO_SYNC,
+        )
+        report.expired_ids.extend(chunk)
+    report.expired_tasks += len(ids)
+
+
+def _expire_by_ttl(db: Session, now: datetime, report: SweepReport) -> set[str]:
+    """Expire finished tasks past their status TTL; returns the ``render_dir`` owners whose files can go."""
+    owners: set[str] = set()
+    for status, hours in settings.retention_ttl_hours.items():
+        cutoff = now - timedelta(hours=hours)
+        if status == "success":
+            # A shared output lives as long as its most recently used task.
+            stale = db.scalars(
+                select(RenderTask.output_file_path)
+                .where(RenderTask.status == "success", RenderTask.output_file_path.is_not(None))
+                .group_by(RenderTask.output_file_path)
+                .having(func.max(_last_used) < cutoff)
+            ).all()
+            _expire_paths(db, list(stale), now, report)
+            owners.update(_owner(Path(path).name) for path in stale)
+        elif status not in LIVE_STATUSES:
+            ids = db.scalars(select(RenderTask.id).where(RenderTask.status == status, _last_used < cutoff)).all()
+            _expire_ids(db, list(ids), now, report)
+            owners.update(ids)
+    db.commit()
+    return owners
+
+
+def _delete_stale_profiles(report: SweepReport) -> None:
+    """Debug profiles are kept ``retention_profile_ttl_hours`` regardless of their task."""
+    cutoff = time.time() - settings.retention_profile_ttl_hours * 3600
+    directory = _Directory(settings.profile_dir)
+    for owner, entries in list(directory.groups.items()):
+        if all(entry.stat().st_mtime < cutoff for entry in entries):
+            directory.delete(owner, report)
+
+
+def sweep_render_storage(db: Session, now: datetime | None = None, render_dir: Path | None = None) -> SweepReport:
+    """
+    Bring stored outputs and ``render_tasks`` back in line with the retention settings.
+
+    1. Successful outputs unused for ``retention_ttl_hours["success"]`` and other finished tasks
+       older than their status TTL become ``expired``.
+    2. Successful tasks whose ``render_dir`` file disappeared are expired as well.
+    3. Files in ``render_dir`` no live task owns (failed renders, crashed temp files, expired
+       outputs whose delete failed) are removed once older than ``retention_orphan_grace_seconds``.
+    4. While blobs, local copies of remote blobs and ``render_dir`` exceed
+       ``render_storage_budget_bytes``, the least recently read local copies are dropped first
+       (they can be downloaded again), then the least recently downloaded outputs are expired.
+    5. Blobs left without references for the grace period are deleted from storage, and old
+       debug profiles too.
+
+    Rows are committed before files are unlinked, so a crash in between only leaves orphans behind.
+    """
+    now = now or utcnow()
+    report = SweepReport()
+    get_access_recorder().flush(db)
+    expired_owners = _expire_by_ttl(db, now, report)
+
+    directory = _Directory(render_dir or settings.render_dir)
+    for owner in expired_owners:
+        directory.delete(owner, report)
+    rows = db.execute(
+        select(RenderTask.output_file_path, func.max(RenderTask.blob_hash))
+        .where(RenderTask.status == "success", RenderTask.output_file_path.is_not(None))
+        .group_by(RenderTask.output_file_path)
+        .order_by(func.max(_last_used))
+    ).all()
+    live = [(path, blob_hash) for path, blob_hash in rows if path]
+    # Blob storage is authoritative for its own objects; only files in ``render_dir`` are checked.
+    missing = {
+        path
+        for path, blob_hash in live
+        if blob_hash is None and _owner(Path(path).name) not in directory.groups and not Path(path).exists()
+    }
+    _expire_paths(db, list(missing), now, report)
+    db.commit()
+
+    owned = {_owner(Path(path).name) for path, blob_hash in live if blob_hash is None and path not in missing}
+    owned.update(db.scalars(select(RenderTask.id).where(RenderTask.status.in_(("pending", "running")))).all())
+    grace_cutoff = time.time() - settings.retention_orphan_grace_seconds
+    for owner in [owner for owner in directory.groups if owner not in owned]:
+        if all(entry.stat().st_mtime < grace_cutoff for entry in directory.groups[owner]):
+            directory.delete(owner, report)
+
+    blob_sizes = dict(db.execute(select(RenderBlob.hash, RenderBlob.size_bytes).where(RenderBlob.ref_count > 0)).all())
+    budget = settings.render_storage_budget_bytes
+    storage = get_blob_storage()
+    cache_bytes = storage.cache_bytes()
+    total = directory.total + sum(blob_sizes.values()) + cache_bytes
+    if budget is not None and total > budget:
+        # Copies read within the download cache TTL may still be served from a cached path.
+        trimmed, trimmed_bytes = storage.trim_cache(
+            max(0, cache_bytes - (total - budget)), time.time() - settings.download_cache_ttl_seconds
+        )
+        report.deleted_files += trimmed
+        report.freed_bytes += trimmed_bytes
+        cache_bytes -= trimmed_bytes
+        total -= trimmed_bytes
+    if budget is not None and total > budget:
+        evicted: list[str] = []
+        for path, blob_hash in live:
+            if total <= budget:
+                break
+            if path in missing:
+                continue
+            if blob_hash is not None:
+                total -= blob_sizes.pop(blob_hash, 0)
+            elif _owner(Path(path).name) in directory.groups:
+                total -= directory.size(_owner(Path(path).name))
+            else:
+                continue
+            evicted.append(path)
+        _expire_paths(db, evicted, now, report)
+        db.commit()
+        for path in evicted:
+            directory.delete(_owner(Path(path).name), report)
+
+    purged, purged_bytes = purge_unreferenced_blobs(db)
+    report.deleted_files += purged
+    report.freed_bytes += purged_bytes
+    _delete_stale_profiles(report)
+    report.storage_bytes = directory.total + sum(blob_sizes.values()) + cache_bytes
+
+    cache = get_download_cache()
+    for task_id in report.expired_ids:
+        cache.invalidate(task_id)
+    return report
+
+
+class RetentionSweeper:
+    """Background thread running :func:`sweep_render_storage` every ``interval_seconds``."""
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Keep the download times gathered since the last sweep.
+        with SessionLocal() as db:
+            get_access_recorder().flush(db)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                with SessionLocal() as db:
+                    report = sweep_render_storage(db)
+                if report.expired_tasks or report.deleted_files:
+                    logger.info(
+                        "Retention sweep expired %d tasks, deleted %d files (%d bytes), %d bytes remain",
+                        report.expired_tasks,
+                        report.deleted_files,
+                        report.freed_bytes,
+                        report.storage_bytes,
+                    )
+            except Exception:  # noqa: BLE001
+                logger.exception("Retention sweep failed")
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.models.render_task import RenderTask
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = frozenset({"success", "failed", "expired"})
+
+
+@dataclass(frozen=True)
+class TaskEvent:
+    task_id: str
+    status: str
+    file_url: str | None = None
+    error_message: str | None = None
+    progress: dict[str, Any] | None = None
+
+    @classmethod
+    def from_task(cls, task: RenderTask) -> TaskEvent:
+        return cls(
+            task_id=task.id,
+            status=task.status,
+            file_url=f"/api/v1/files/{task.id}" if task.status == "success" else None,
+            error_message=task.error_message,
+            progress=task.progress_json,
+        )
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue[TaskEvent]
+
+
+class TaskEventBus:
+    """
+    In-process pub/sub of task status transitions, keyed by task id.
+
+    Publishers may run on any thread; events are handed to each subscriber's event loop. Render
+    worker processes have no subscribers of their own, so :meth:`forward_to` points their bus at a
+    multiprocessing queue that :meth:`start_bridge` drains back into the API process.
+
+    The latest progress of each running task is kept in memory (bounded by
+    ``task_progress_cache_size``) so status reads need not wait for the throttled DB write.
+    """
+
+    def __init__(self, max_progress_entries: int = 1024) -> None:
+        self._subscribers: dict[str, set[_Subscriber]] = {}
+        self._progress: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._max_progress_entries = max_progress_entries
+        self._lock = threading.Lock()
+        self._forward: Any = None
+
+    def forward_to(self, queue: Any) -> None:
+        self._forward = queue
+
+    def publish(self, event: TaskEvent) -> None:
+        if self._forward is not None:
+            self._forward.put(event)
+        else:
+            self.deliver(event)
+
+    def latest_progress(self, task_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            return self._progress.get(task_id)
+
+    def deliver(self, event: TaskEvent) -> None:
+        with self._lock:
+            if event.finished:
+                self._progress.pop(event.task_id, None)
+            elif event.progress is not None:
+                self._progress[event.task_id] = event.progress
+                self._progress.move_to_end(event.task_id)
+                while len(self._progress) > self._max_progress_entries:
+                    self._progress.popitem(last=False)
+            subscribers = list(self._subscribers.get(event.task_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.queue.put_nowait, event)
+            except RuntimeError:
+                pass  # the subscriber's loop already closed
+
+    @contextmanager
+    def subscribe(self, task_id: str) -> Iterator[asyncio.Queue[TaskEvent]]:
+        """Receive events for ``task_id``; must be entered from the consuming coroutine."""
+        subscriber = _Subscriber(loop=asyncio.get_running_loop(), queue=asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(subscriber)
+        try:
+            yield subscriber.queue
+        finally:
+            with self._lock:
+                remaining = self._subscribers.get(task_id)
+                if remaining is not None:
+                    remaining.discard(subscriber)
+                    if not remaining:
+                        del self._subscribers[task_id]
+
+    def start_bridge(self, queue: Any) -> threading.Thread:
+        """
+        Deliver events that worker processes put on ``queue`` until a ``None`` sentinel arrives.
+
+        Other messages sharing the queue (metrics reports) are applied in this process.
+        """
+
+        def drain() -> None:
+            while (message := queue.get()) is not None:
+                if isinstance(message, TaskEvent):
+                    self.deliver(message)
+                else:
+                    message.apply()
+
+        thread = threading.Thread(target=drain, name="task-event-bridge", daemon=True)
+        thread.start()
+        return thread
+
+
+@lru_cache
+def get_task_event_bus() -> TaskEventBus:
+    return TaskEventBus(max_progress_entries=settings.task_progress_cache_size)
+
+
+def publish_task_status(task: RenderTask) -> None:
+    try:
+        get_task_event_bus().publish(TaskEvent.from_task(task))
+    except Exception:  # noqa: BLE001
+        # Status events are best effort; the database row stays authoritative.
+        logger.exception("Failed to publish status of render task %s", task.id)
+
+
+def load_task_event(task_id: str) -> TaskEvent | None:
+    with SessionLocal() as db:
+        task = db.get(RenderTask, task_id)
+        if task is None:
+            return None
+        event = TaskEvent.from_task(task)
+    progress = get_task_event_bus().latest_progress(task_id)
+    if progress is not None and not event.finished:
+        event = replace(event, progress=progress)
+    return event
+
+
+async def watch_task(task_id: str) -> AsyncIterator[TaskEvent | None]:
+    """
+    Current status of ``task_id`` followed by each transition, ending after success or failure.
+
+    Progress updates of a running task arrive as events with an unchanged status.
+    ``None`` is yielded as a keep-alive whenever ``task_event_fallback_seconds`` pass quietly; the
+    row is re-read then too, which covers transitions made by workers on other nodes.
+    """
+    with get_task_event_bus().subscribe(task_id) as queue:
+        event = await run_in_threadpool(load_task_event, task_id)
+        if event is None:
+            return
+        yield event
+        while not event.finished:
+            try:
+                latest = await asyncio.wait_for(queue.get(), timeout=settings.task_event_fallback_seconds)
+            except asyncio.TimeoutError:
+                latest = await run_in_threadpool(load_task_event, task_id) or event
+            if latest == event:
+                yield None
+                continue
+            event = latest
+            yield event
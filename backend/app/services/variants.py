@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import threading
+import zipfile
+from pathlib import Path
+
+from PIL import Image
+
+from app.core.config import get_settings
+from app.schemas.render import OutputFormat
+from app.services.encoders import get_encoder_profile, save_image
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS: dict[str, OutputFormat] = {
+    "webp": OutputFormat.WEBP,
+    "jpeg": OutputFormat.JPEG,
+    "png": OutputFormat.PNG,
+}
+
+# Outputs a derivative can be decoded from; PDFs are decoded through their first-page cover.
+DECODABLE_SUFFIXES = {".png", ".jpg", ".webp", ".zip"}
+
+# Generation is serialized per derivative through a fixed set of striped locks, so the lock table
+# never grows; unrelated derivatives only rarely share a stripe.
+LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+class VariantUnavailableError(ValueError):
+    pass
+
+
+def snap_width(width: int) -> int:
+    """Round up to the nearest configured width so a handful of derivatives serve every request."""
+    widths = sorted(settings.variant_widths)
+    index = bisect.bisect_left(widths, width)
+    return widths[min(index, len(widths) - 1)]
+
+
+def variant_path(source: Path, width: int, image_format: str) -> Path:
+    extension = get_encoder_profile(VARIANT_FORMATS[image_format]).extension
+    return source.with_name(f"{source.stem}.w{width}{extension}")
+
+
+def cover_path(source: Path) -> Path:
+    """First-page image written beside a PDF output; Pillow cannot decode PDFs themselves."""
+    return source.with_name(f"{source.stem}.page1.png")
+
+
+def write_cover(image: Image.Image, source: Path) -> Path:
+    """Store ``image`` (page one, still in memory) as the cover of ``source`` at the largest variant width."""
+    target = cover_path(source)
+    _write_variant(image, target, max(settings.variant_widths), "png")
+    return target
+
+
+def _decodable_source(source: Path) -> Path | None:
+    if source.suffix.lower() == ".pdf":
+        cover = cover_path(source)
+        return cover if cover.exists() else None
+    return source if source.suffix.lower() in DECODABLE_SUFFIXES else None
+
+
+def _open_source(source: Path) -> Image.Image:
+    if source.suffix.lower() == ".zip":
+        # Paged ZIPs are previewed by their first page.
+        with zipfile.ZipFile(source) as archive:
+            names = sorted(archive.namelist())
+            if not names:
+                raise VariantUnavailableError("压缩包中没有页面")
+            with archive.open(names[0]) as member:
+                image = Image.open(member)
+                image.load()
+                return image
+    return Image.open(source)
+
+
+def _write_variant(image: Image.Image, target: Path, width: int, image_format: str) -> None:
+    # thumbnail() asks JPEG decoders for a reduced-size draft and box-reduces other formats
+    # before the final resample, so large pages are never fully decoded and resized in one go.
+    image.thumbnail((width, image.height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    save_image(image, tmp, VARIANT_FORMATS[image_format], settings.variant_quality)
+    os.replace(tmp, target)
+
+
+def _lock_for(target: Path) -> threading.Lock:
+    return _locks[hash(target) % LOCK_STRIPES]
+
+
+def get_variant(source: Path, width: int, image_format: str) -> Path:
+    """
+    Path of the ``width``-wide derivative of ``source``, generating it beside the original once.
+
+    Concurrent requests for the same derivative wait for a single encoder; files are written via
+    a temporary name and renamed, so readers never observe partial output.
+    """
+    target = variant_path(source, width, image_format)
+    if target.exists():
+        return target
+    decodable = _decodable_source(source)
+    if decodable is None:
+        raise VariantUnavailableError("该输出格式暂不支持缩略图")
+    with _lock_for(target):
+        if not target.exists():
+            with _open_source(decodable) as image:
+                _write_variant(image, target, width, image_format)
+    return target
+
+
+def pregenerate_variants(source: Path) -> None:
+    """Write the ``variant_pregenerate_widths`` derivatives of a freshly rendered output."""
+    if _decodable_source(source) is None:
+        return
+    for width in settings.variant_pregenerate_widths:
+        try:
+            get_variant(source, snap_width(width), settings.variant_pregenerate_format)
+        except Exception:  # noqa: BLE001
+            # Derivatives are an optimization; the request path generates any that are missing.
+            logger.exception("Failed to pre-generate %spx variant of %s", width, source.name)
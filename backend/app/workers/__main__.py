@@ -0,0 +1,59 @@
+"""
+Standalone render workers draining the ``render_tasks`` table.
+
+Usage (from ``backend/``, pointing at the same database as the API)::
+
+    HW_BACKEND_RENDER_DISPATCH=queue uvicorn app.main:app      # API only enqueues
+    python -m app.workers --processes 4                         # on any number of nodes
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+
+from app.core.config import get_settings
+from app.core.database import init_db
+from app.workers.task_queue import LOG_FORMAT, worker_process_main
+
+settings = get_settings()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=settings.render_workers or os.cpu_count() or 1,
+        help="worker processes on this node (default: HW_BACKEND_RENDER_WORKERS or CPU count)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    settings.storage_dir.mkdir(parents=True, exist_ok=True)
+    settings.render_dir.mkdir(parents=True, exist_ok=True)
+    init_db()
+
+    context = multiprocessing.get_context(settings.render_worker_start_method)
+    stop = context.Event()
+    processes = [
+        context.Process(target=worker_process_main, args=(stop,), name=f"render-worker-{index}")
+        for index in range(max(1, args.processes))
+    ]
+    for process in processes:
+        process.start()
+
+    def _request_stop(*_: object) -> None:
+        # Running renders finish first; their leases would otherwise have to expire before a retry.
+        stop.set()
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
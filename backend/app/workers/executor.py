@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.services.render_service import fail_render_tasks, recover_pool_tasks
+from app.services.task_events import get_task_event_bus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+DISPATCH_FAILED_MESSAGE = "渲染进程不可用，任务未能提交"
+CRASHED_MESSAGE = "渲染进程异常退出"
+
+
+class RenderQueueFullError(RuntimeError):
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("Render queue is full")
+        self.retry_after = retry_after
+
+
+class RenderDispatchError(RuntimeError):
+    """The render pool did not accept a task; the task has been marked failed."""
+
+    def __init__(self) -> None:
+        super().__init__("Render pool is unavailable")
+        self.retry_after = settings.render_retry_after_seconds
+
+
+def _init_worker(nested_page_workers: int | None, events: Any) -> None:
+    from app.core.database import engine
+    from app.services.metrics import get_render_metrics
+    from app.services.task_events import get_task_event_bus
+
+    # Never reuse pooled connections inherited from the parent process.
+    engine.dispose(close=False)
+    settings.render_page_workers = nested_page_workers
+    get_task_event_bus().forward_to(events)
+    get_render_metrics().forward_to(events)
+
+
+class RenderExecutor:
+    """
+    Process pool that runs render tasks outside the API process, with a bounded backlog.
+
+    Capacity is ``max_workers`` running plus ``max_queue`` waiting tasks. Callers take a slot
+    with :meth:`reserve` before creating the task row, so a full queue is rejected before any
+    work is persisted. Tasks sharing a cache key are chained behind the in-flight one, which
+    lets the follower pick up the finished output instead of rendering it again.
+
+    A render process that dies (e.g. killed for memory) breaks the whole pool; its tasks are
+    failed and the pool is replaced on the next submit. Tasks that cannot be handed to the pool
+    at all are failed and their slot released, so no row is left pending without a render.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, start_method: str = "spawn") -> None:
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        # With several render processes busy, fanning each task's pages out again would oversubscribe.
+        nested_page_workers = 1 if max_workers > 1 else settings.render_page_workers
+        self._context = multiprocessing.get_context(start_method)
+        # Status events and metrics reports from the workers are relayed into this process.
+        self._events = self._context.Queue()
+        self._bridge = get_task_event_bus().start_bridge(self._events)
+        self._initargs = (nested_page_workers, self._events)
+        self._pool = self._new_pool()
+        self._lock = threading.RLock()
+        self._reserved = 0
+        self._closed = False
+        self._inflight: dict[str, Future] = {}
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=self._initargs,
+        )
+
+    @property
+    def depth(self) -> int:
+        return self._reserved
+
+    def reserve(self, slots: int = 1) -> None:
+        with self._lock:
+            if self._reserved + slots > self.capacity:
+                raise RenderQueueFullError(retry_after=settings.render_retry_after_seconds)
+            self._reserved += slots
+
+    def release(self, slots: int = 1) -> None:
+        with self._lock:
+            self._reserved = max(0, self._reserved - slots)
+
+    def submit_batch(self, task_ids: list[str]) -> None:
+        """
+        Run a batch using one reserved slot per task, like single submissions, so a large batch is
+        held to the same queue bound. The tasks are spread over at most ``max_workers`` worker
+        calls; each call frees its tasks' slots when it finishes.
+        """
+        from app.workers.render_worker import dispatch_render_batch
+
+        chunks = max(1, min(self.max_workers, len(task_ids)))
+        with self._lock:
+            for index in range(chunks):
+                # Interleave so the first items of the batch finish first across all workers.
+                chunk = task_ids[index::chunks]
+                try:
+                    future = self._submit_locked(dispatch_render_batch, chunk)
+                except Exception as exc:
+                    undispatched = [task_id for rest in range(index, chunks) for task_id in task_ids[rest::chunks]]
+                    self._dispatch_failed(undispatched, len(undispatched), exc)
+                    raise RenderDispatchError() from exc
+                future.add_done_callback(lambda done, chunk=chunk: self._finished(chunk, done))
+
+    def submit(self, task_id: str, cache_key: str | None = None) -> None:
+        """Run a task using a slot taken with :meth:`reserve`; the slot is freed when it finishes."""
+        with self._lock:
+            leader = self._inflight.get(cache_key) if cache_key else None
+            # Resolves once this task has finished (or failed to start); followers wait on it.
+            chained: Future = Future()
+            if cache_key:
+                self._inflight[cache_key] = chained
+                chained.add_done_callback(lambda done: self._forget(cache_key, done))
+            if leader is not None:
+                leader.add_done_callback(lambda _: self._start(task_id, chained))
+                return
+            if not self._start(task_id, chained):
+                raise RenderDispatchError()
+
+    def recover(self) -> int:
+        """Resubmit tasks a previous run left pending or stranded mid-render; called at startup."""
+        with SessionLocal() as db:
+            pending = [(task.id, task.cache_key) for task in recover_pool_tasks(db)]
+        if pending:
+            logger.info("Resubmitting %d render tasks left over from a previous run", len(pending))
+        with self._lock:
+            # Recovered work is admitted even past capacity; new requests wait until it drains.
+            self._reserved += len(pending)
+        for task_id, cache_key in pending:
+            try:
+                self.submit(task_id, cache_key)
+            except RenderDispatchError:
+                pass
+        return len(pending)
+
+    def _start(self, task_id: str, chained: Future) -> bool:
+        from app.workers.render_worker import dispatch_render_task
+
+        with self._lock:
+            if self._closed:
+                # Shutting down: the row stays pending and is resubmitted by the next startup.
+                self._reserved = max(0, self._reserved - 1)
+                chained.set_result(None)
+                return True
+            try:
+                future = self._submit_locked(dispatch_render_task, task_id)
+            except Exception as exc:
+                self._dispatch_failed([task_id], 1, exc)
+                chained.set_result(None)
+                return False
+        future.add_done_callback(lambda done: self._finished([task_id], done, chained))
+        return True
+
+    def _submit_locked(self, fn: Callable[..., None], *args: Any) -> Future:
+        try:
+            return self._pool.submit(fn, *args)
+        except BrokenProcessPool:
+            logger.warning("Render process pool is broken; starting a new one")
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._new_pool()
+            return self._pool.submit(fn, *args)
+
+    def _dispatch_failed(self, task_ids: list[str], slots: int, exc: Exception) -> None:
+        logger.error("Could not dispatch render tasks %s: %r", task_ids, exc)
+        self.release(slots)
+        with SessionLocal() as db:
+            fail_render_tasks(db, task_ids, DISPATCH_FAILED_MESSAGE)
+
+    def _finished(self, task_ids: list[str], future: Future, chained: Future | None = None) -> None:
+        self.release(len(task_ids))
+        # Renders record their own failures; an exception here means the render process died.
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Render process failed on tasks %s", task_ids, exc_info=future.exception())
+            with SessionLocal() as db:
+                fail_render_tasks(db, task_ids, CRASHED_MESSAGE)
+        if chained is not None:
+            chained.set_result(None)
+
+    def _forget(self, cache_key: str, chained: Future) -> None:
+        with self._lock:
+            if self._inflight.get(cache_key) is chained:
+                del self._inflight[cache_key]
+
+    def shutdown(self, wait: bool = True) -> None:
+        # Queued tasks stay "pending" in the database until the next startup resubmits them;
+        # only running renders are awaited.
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._events.put(None)
+        self._bridge.join(timeout=5)
+
+
+class DatabaseRenderQueue:
+    """
+    Dispatcher for ``render_dispatch = "queue"``: the API only inserts pending rows and standalone
+    workers (``python -m app.workers``) claim them. Backpressure counts pending rows instead.
+    """
+
+    def __init__(self, max_queue: int) -> None:
+        self.capacity = max_queue
+
+    @property
+    def depth(self) -> int:
+        from app.workers.task_queue import count_pending
+
+        with SessionLocal() as db:
+            return count_pending(db)
+
+    def reserve(self, slots: int = 1) -> None:
+        if self.depth + slots > self.capacity:
+            raise RenderQueueFullError(retry_after=settings.render_retry_after_seconds)
+
+    def release(self, slots: int = 1) -> None:
+        pass
+
+    def submit(self, task_id: str, cache_key: str | None = None) -> None:
+        pass
+
+    def submit_batch(self, task_ids: list[str]) -> None:
+        pass
+
+    def recover(self) -> int:
+        # Standalone workers re-claim pending rows and rows whose lease expired on their own.
+        return 0
+
+    def shutdown(self, wait: bool = True) -> None:
+        pass
+
+
+def create_render_executor() -> RenderExecutor | DatabaseRenderQueue:
+    if settings.render_dispatch == "queue":
+        return DatabaseRenderQueue(max_queue=settings.render_queue_size)
+    return RenderExecutor(
+        max_workers=settings.render_workers or os.cpu_count() or 1,
+        max_queue=settings.render_queue_size,
+        start_method=settings.render_worker_start_method,
+    )
@@ -1,9 +1,14 @@
-from app.services.render_service import run_render_task
+from app.services.render_service import run_render_task, run_render_tasks
 
 
 def dispatch_render_task(task_id: str) -> None:
     """
-    Phase 1: 使用 FastAPI BackgroundTasks 同进程执行。
+    在 RenderExecutor 的渲染进程池中执行（见 app.workers.executor），不占用 API 进程。
     Phase 2: 迁移到 Redis + 独立 Worker。
     """
     run_render_task(task_id)
+
+
+def dispatch_render_batch(task_ids: list[str]) -> None:
+    """同一进程内连续渲染一组批量任务，共享字体与纸张缓存。"""
+    run_render_tasks(task_ids)
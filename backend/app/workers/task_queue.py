@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import timedelta
+from uuid import uuid4
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.models.render_task import RenderTask
+from app.services.render_service import execute_render_task, utcnow
+from app.services.task_events import publish_task_status
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+EXHAUSTED_MESSAGE = "渲染进程多次中断，已超过最大重试次数"
+# Every statement below commits right away, which expires loaded rows; skip in-Python WHERE evaluation.
+NO_SYNC = {"synchronize_session": False}
+LOG_FORMAT = "%(asctime)s %(processName)s %(levelname)s %(message)s"
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def _claimable(now):
+    """
+    Pending tasks, plus running ones whose lease ran out (their worker crashed or hung) and
+    that have attempts left; exhausted ones wait for :func:`fail_exhausted_tasks`.
+    """
+    return or_(
+        RenderTask.status == "pending",
+        and_(
+            RenderTask.status == "running",
+            RenderTask.lease_expires_at < now,
+            RenderTask.attempts < settings.render_max_attempts,
+        ),
+    )
+
+
+def fail_exhausted_tasks(db: Session) -> int:
+    """Fail tasks whose lease expired after ``render_max_attempts`` claims instead of retrying forever."""
+    now = utcnow()
+    result = db.execute(
+        update(RenderTask)
+        .where(
+            RenderTask.status == "running",
+            RenderTask.lease_expires_at < now,
+            RenderTask.attempts >= settings.render_max_attempts,
+        )
+        .values(status="failed", error_message=EXHAUSTED_MESSAGE, completed_at=now, updated_at=now),
+        execution_options=NO_SYNC,
+    )
+    db.commit()
+    return result.rowcount
+
+
+_exhausted_checked_at = 0.0
+
+
+def _fail_exhausted_periodically(db: Session) -> None:
+    """Run :func:`fail_exhausted_tasks` at most once per lease interval instead of on every poll."""
+    global _exhausted_checked_at
+    now = time.monotonic()
+    if now - _exhausted_checked_at < settings.render_lease_seconds:
+        return
+    _exhausted_checked_at = now
+    fail_exhausted_tasks(db)
+
+
+def claim_next_task(db: Session, worker_id: str) -> RenderTask | None:
+    """
+    Atomically lease the oldest claimable task to ``worker_id``.
+
+    Databases with row locks use ``FOR UPDATE SKIP LOCKED`` so concurrent workers never wait on
+    each other. SQLite has no row locks, so the claim is a compare-and-set ``UPDATE`` that only
+    succeeds while the row is still claimable; a worker that loses the race tries the next row.
+    """
+    _fail_exhausted_periodically(db)
+    now = utcnow()
+    lease = {
+        "status": "running",
+        "worker_id": worker_id,
+        "lease_expires_at": now + timedelta(seconds=settings.render_lease_seconds),
+        "attempts": RenderTask.attempts + 1,
+        "started_at": now,
+        "updated_at": now,
+    }
+
+    if db.get_bind().dialect.name != "sqlite":
+        task_id = db.execute(
+            select(RenderTask.id)
+            .where(_claimable(now))
+            .order_by(RenderTask.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar_one_or_none()
+        if task_id is None:
+            db.rollback()
+            return None
+        db.execute(update(RenderTask).where(RenderTask.id == task_id).values(**lease), execution_options=NO_SYNC)
+        db.commit()
+        return db.get(RenderTask, task_id, populate_existing=True)
+
+    candidates = db.execute(
+        select(RenderTask.id).where(_claimable(now)).order_by(RenderTask.created_at).limit(8)
+    ).scalars().all()
+    for task_id in candidates:
+        result = db.execute(
+            update(RenderTask).where(RenderTask.id == task_id, _claimable(now)).values(**lease),
+            execution_options=NO_SYNC,
+        )
+        db.commit()
+        if result.rowcount == 1:
+            return db.get(RenderTask, task_id, populate_existing=True)
+    return None
+
+
+def renew_lease(db: Session, task_id: str, worker_id: str) -> bool:
+    """Extend the lease while the task is still ours; ``False`` means another worker took it over."""
+    now = utcnow()
+    result = db.execute(
+        update(RenderTask)
+        .where(RenderTask.id == task_id, RenderTask.worker_id == worker_id, RenderTask.status == "running")
+        .values(lease_expires_at=now + timedelta(seconds=settings.render_lease_seconds)),
+        execution_options=NO_SYNC,
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def count_pending(db: Session) -> int:
+    return db.execute(select(func.count()).select_from(RenderTask).where(RenderTask.status == "pending")).scalar_one()
+
+
+class _Heartbeat(threading.Thread):
+    """Renews the lease while a task renders; sets ``lost`` once another worker has taken it over."""
+
+    def __init__(self, task_id: str, worker_id: str) -> None:
+        super().__init__(name=f"heartbeat-{task_id}", daemon=True)
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(settings.render_heartbeat_seconds):
+            with SessionLocal() as db:
+                if not renew_lease(db, self.task_id, self.worker_id):
+                    logger.warning("Lost lease on render task %s; cancelling the render", self.task_id)
+                    self.lost.set()
+                    return
+
+
+def process_next_task(worker_id: str) -> bool:
+    """Claim and render one task, heartbeating its lease meanwhile. Returns ``False`` when idle."""
+    with SessionLocal() as db:
+        task = claim_next_task(db, worker_id)
+        if task is None:
+            return False
+        publish_task_status(task)
+        heartbeat = _Heartbeat(task.id, worker_id)
+        heartbeat.start()
+        try:
+            execute_render_task(db, task, owner=worker_id, cancelled=heartbeat.lost)
+        finally:
+            heartbeat.stopped.set()
+            heartbeat.join()
+    return True
+
+
+def run_worker(stop: threading.Event | None = None, worker_id: str | None = None) -> None:
+    """Drain the queue until ``stop`` is set, sleeping ``render_poll_interval_seconds`` when idle."""
+    stop = stop or threading.Event()
+    worker_id = worker_id or new_worker_id()
+    logger.info("Render worker %s started", worker_id)
+    while not stop.is_set():
+        try:
+            busy = process_next_task(worker_id)
+        except Exception:  # noqa: BLE001
+            logger.exception("Render worker %s failed to claim a task", worker_id)
+            busy = False
+        if not busy:
+            stop.wait(settings.render_poll_interval_seconds)
+
+
+def worker_process_main(stop) -> None:
+    """Entry point of one ``python -m app.workers`` process; the parent owns signal handling."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+    # Each process already owns a core; do not fan pages out into a nested pool.
+    settings.render_page_workers = 1
+    run_worker(stop)
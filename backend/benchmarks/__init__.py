@@ -0,0 +1 @@
+"""Performance benchmarks for the render engine; run modules with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,90 @@
+"""
+Encode-time and output-size benchmark for every render output profile.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.encoders --scale 1.0 --repeat 3
+    python -m benchmarks.encoders --json encoders.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+
+from PIL import Image
+
+from app.schemas.render import OutputFormat, PaperBackground, RenderTaskCreateRequest
+from app.services.encoders import encode_image
+from app.services.render_service import _canvas_size, _layout_handwriting, _render_page
+
+SAMPLE_TEXT = "永和九年，岁在癸丑，暮春之初，会于会稽山阴之兰亭，修禊事也。群贤毕至，少长咸集。\n" * 60
+
+
+def _sample_page(paper_background: PaperBackground, scale: float, font_family: str) -> Image.Image:
+    payload = RenderTaskCreateRequest(
+        text=SAMPLE_TEXT,
+        font_family=font_family,
+        paper_background=paper_background,
+        render_scale=scale,
+        random_seed=20240601,
+    )
+    size = _canvas_size(payload)
+    return _render_page(payload, _layout_handwriting(payload, size), size, 0)
+
+
+def run(scale: float, repeat: int, quality: int, backgrounds: list[PaperBackground], font_family: str) -> list[dict]:
+    results: list[dict] = []
+    for paper_background in backgrounds:
+        image = _sample_page(paper_background, scale, font_family)
+        for output_format in OutputFormat:
+            timings: list[float] = []
+            size_bytes = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                size_bytes = len(encode_image(image, output_format, quality))
+                timings.append((time.perf_counter() - started) * 1000)
+            results.append(
+                {
+                    "paper_background": paper_background.value,
+                    "canvas": f"{image.width}x{image.height}",
+                    "output_format": output_format.value,
+                    "encode_ms": round(statistics.median(timings), 1),
+                    "bytes": size_bytes,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--font-family", default="她屿山海")
+    parser.add_argument(
+        "--background",
+        action="append",
+        choices=[item.value for item in PaperBackground],
+        help="repeatable; defaults to white and real-lined-cream",
+    )
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    args = parser.parse_args()
+
+    backgrounds = [PaperBackground(item) for item in (args.background or ["white", "real-lined-cream"])]
+    results = run(args.scale, args.repeat, args.quality, backgrounds, args.font_family)
+
+    print(f"{'paper':<20} {'canvas':<11} {'format':<15} {'encode ms':>10} {'bytes':>12}")
+    for row in results:
+        print(
+            f"{row['paper_background']:<20} {row['canvas']:<11} {row['output_format']:<15} "
+            f"{row['encode_ms']:>10.1f} {row['bytes']:>12,}"
+        )
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""
+End-to-end load test of the render API: submit, poll the task, download the output.
+
+Every session posts ``/render/tasks``, polls ``/render/tasks/{id}`` until the task finishes and
+downloads ``/files/{id}``. Sessions arrive closed-loop (``--concurrency`` users back to back),
+open-loop (``--rate`` Poisson arrivals per second) or at the offsets of a recorded trace.
+
+The target is a running server (``--url``), the app inside this process (``--in-process``) or,
+by default, a ``uvicorn`` launched with a throwaway database and storage directory. Render
+process CPU time and peak RSS come from ``/metrics`` (standalone ``python -m app.workers``
+processes do not report there).
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.load_test --concurrency 8 --requests 200
+    python -m benchmarks.load_test --rate 4 --duration 60 --url http://127.0.0.1:9000
+    python -m benchmarks.load_test --export-payloads payloads.jsonl --limit 500
+    python -m benchmarks.load_test --replay payloads.jsonl --recorded-timing --speed 2 --json run.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import httpx
+
+API = "/api/v1"
+FINISHED = {"success", "failed", "expired"}
+SAMPLE_TEXT = "永和九年，岁在癸丑，暮春之初，会于会稽山阴之兰亭，修禊事也。群贤毕至，少长咸集。\n"
+TEXT_LENGTHS = (200, 1000, 3000)
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+@dataclass
+class SessionResult:
+    outcome: str  # ok, rejected_429, rejected_503, http_error, task_failed, timeout, transport_error
+    submit_ms: float | None = None
+    total_ms: float | None = None
+
+
+def generated_payloads(seed: int, font_family: str, render_scale: float) -> Iterator[tuple[float, dict]]:
+    """Distinct seeded requests of mixed length, so every submission is a cache miss."""
+    rng = random.Random(seed)
+    index = 0
+    while True:
+        length = rng.choice(TEXT_LENGTHS)
+        text = (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+        yield 0.0, {
+            "text": text,
+            "font_family": font_family,
+            "render_scale": render_scale,
+            "random_seed": seed * 1_000_000 + index,
+        }
+        index += 1
+
+
+def load_replay(path: Path) -> list[tuple[float, dict]]:
+    """Lines are ``{"offset": seconds, "payload": {...}}`` or a bare request payload."""
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            record = json.loads(line)
+            if "payload" in record:
+                records.append((float(record.get("offset", 0.0)), record["payload"]))
+            else:
+                records.append((0.0, record))
+    if not records:
+        raise SystemExit(f"{path} holds no payloads")
+    return records
+
+
+def export_payloads(path: Path, limit: int) -> int:
+    """Write the inputs of the latest ``limit`` single render tasks, with their arrival offsets."""
+    from sqlalchemy import select
+
+    from app.core.database import SessionLocal
+    from app.models.render_task import RenderTask
+
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(RenderTask.created_at, RenderTask.input_json)
+            .where(RenderTask.batch_id.is_(None))
+            .order_by(RenderTask.created_at.desc())
+            .limit(limit)
+        ).all()
+    rows.reverse()
+    with path.open("w", encoding="utf-8") as fp:
+        for created_at, payload in rows:
+            offset = (created_at - rows[0][0]).total_seconds()
+            fp.write(json.dumps({"offset": round(offset, 3), "payload": payload}, ensure_ascii=False) + "\n")
+    return len(rows)
+
+
+def _cycle(records: list[tuple[float, dict]]) -> Iterator[tuple[float, dict]]:
+    while True:
+        yield from records
+
+
+async def run_session(client: httpx.AsyncClient, payload: dict, poll_interval: float, task_timeout: float) -> SessionResult:
+    started = time.perf_counter()
+    try:
+        response = await client.post(f"{API}/render/tasks", json=payload)
+        submit_ms = (time.perf_counter() - started) * 1000
+        if response.status_code in (429, 503):
+            return SessionResult(f"rejected_{response.status_code}", submit_ms)
+        if response.status_code != 202:
+            return SessionResult("http_error", submit_ms)
+        task_id, status = response.json()["task_id"], response.json()["status"]
+
+        deadline = started + task_timeout
+        while status not in FINISHED:
+            if time.perf_counter() > deadline:
+                return SessionResult("timeout", submit_ms)
+            await asyncio.sleep(poll_interval)
+            response = await client.get(f"{API}/render/tasks/{task_id}")
+            if response.status_code != 200:
+                return SessionResult("http_error", submit_ms)
+            status = response.json()["status"]
+        if status != "success":
+            return SessionResult("task_failed", submit_ms)
+
+        response = await client.get(f"{API}/files/{task_id}")
+        if response.status_code != 200:
+            return SessionResult("http_error", submit_ms)
+    except httpx.HTTPError:
+        return SessionResult("transport_error")
+    return SessionResult("ok", submit_ms, (time.perf_counter() - started) * 1000)
+
+
+async def drive(client: httpx.AsyncClient, payloads: Iterator[tuple[float, dict]], args: argparse.Namespace) -> list[SessionResult]:
+    results: list[SessionResult] = []
+    deadline = time.perf_counter() + args.duration if args.duration else math.inf
+    remaining = args.requests if not args.duration else math.inf
+
+    def next_payload() -> tuple[float, dict] | None:
+        nonlocal remaining
+        if remaining <= 0 or time.perf_counter() >= deadline:
+            return None
+        remaining -= 1
+        return next(payloads, None)
+
+    async def session(payload: dict) -> None:
+        results.append(await run_session(client, payload, args.poll_interval, args.task_timeout))
+
+    if args.rate is None and not args.recorded_timing:
+        async def user() -> None:
+            while (item := next_payload()) is not None:
+                await session(item[1])
+
+        await asyncio.gather(*(user() for _ in range(args.concurrency)))
+        return results
+
+    # Open loop: arrivals do not wait for earlier sessions; --concurrency caps sessions in flight.
+    in_flight = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    tasks = []
+
+    async def limited(payload: dict) -> None:
+        async with in_flight:
+            await session(payload)
+
+    while (item := next_payload()) is not None:
+        offset, payload = item
+        if args.recorded_timing:
+            delay = started + offset / args.speed - time.perf_counter()
+        else:
+            delay = rng.expovariate(args.rate)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(limited(payload)))
+    await asyncio.gather(*tasks)
+    return results
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """Prometheus text exposition as ``{"name{labels}": value}``."""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+async def scrape(client: httpx.AsyncClient) -> dict[str, float]:
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return {}
+    return parse_metrics(response.text) if response.status_code == 200 else {}
+
+
+def resource_usage(before: dict[str, float], after: dict[str, float], seconds: float) -> dict[str, float]:
+    def total(samples: dict[str, float], prefix: str) -> float:
+        return sum(value for name, value in samples.items() if name.startswith(prefix))
+
+    def peak(samples: dict[str, float], prefix: str) -> float:
+        return max((value for name, value in samples.items() if name.startswith(prefix)), default=0.0)
+
+    # Render processes report as of their last task; a process missing before had used nothing yet.
+    worker_cpu = total(after, "render_worker_cpu_seconds_total") - total(before, "render_worker_cpu_seconds_total")
+    api_cpu = after.get("process_cpu_seconds_total", 0.0) - before.get("process_cpu_seconds_total", 0.0)
+    return {
+        "worker_processes": sum(1 for name in after if name.startswith("render_worker_cpu_seconds_total")),
+        "worker_cpu_seconds": round(worker_cpu, 2),
+        "worker_cpu_cores": round(worker_cpu / seconds, 2) if seconds else 0.0,
+        "worker_max_rss_mb": round(peak(after, "render_worker_max_rss_bytes") / 2**20, 1),
+        "api_cpu_seconds": round(api_cpu, 2),
+        "api_max_rss_mb": round(after.get("process_max_rss_bytes", 0.0) / 2**20, 1),
+    }
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, math.ceil(fraction * len(ordered)) - 1)], 1)
+
+
+def summarize(results: list[SessionResult], seconds: float) -> dict:
+    outcomes = Counter(result.outcome for result in results)
+    count = len(results) or 1
+    latencies = [result.total_ms for result in results if result.total_ms is not None]
+    submits = [result.submit_ms for result in results if result.submit_ms is not None]
+    errors = sum(n for outcome, n in outcomes.items() if outcome not in ("ok", "rejected_429", "rejected_503"))
+    return {
+        "sessions": len(results),
+        "seconds": round(seconds, 2),
+        "throughput_per_s": round(outcomes["ok"] / seconds, 3) if seconds else 0.0,
+        "latency_ms": {name: percentile(latencies, q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "submit_ms": {name: percentile(submits, q) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "error_rate": round(errors / count, 4),
+        "rate_429": round(outcomes["rejected_429"] / count, 4),
+        "rate_503": round(outcomes["rejected_503"] / count, 4),
+        "outcomes": dict(outcomes),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@asynccontextmanager
+async def launched_server(data_dir: Path, env: dict[str, str]) -> AsyncIterator[httpx.AsyncClient]:
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env, "HW_BACKEND_BACKEND_DIR": str(data_dir)},
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            for _ in range(600):
+                if process.poll() is not None:
+                    raise SystemExit(f"uvicorn exited with code {process.returncode}")
+                try:
+                    if (await client.get(f"{API}/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+            else:
+                raise SystemExit("uvicorn did not become healthy within 60 s")
+            yield client
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@asynccontextmanager
+async def in_process_app(data_dir: Path) -> AsyncIterator[httpx.AsyncClient]:
+    # Settings are read on import, so the data directory has to be set first.
+    os.environ["HW_BACKEND_BACKEND_DIR"] = str(data_dir)
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=60) as client:
+            yield client
+
+
+@asynccontextmanager
+async def target(args: argparse.Namespace) -> AsyncIterator[httpx.AsyncClient]:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            yield client
+        return
+    with tempfile.TemporaryDirectory(prefix="hw-load-") as data_dir:
+        if args.in_process:
+            async with in_process_app(Path(data_dir)) as client:
+                yield client
+        else:
+            env = dict(item.split("=", 1) for item in args.server_env)
+            async with launched_server(Path(data_dir), env) as client:
+                yield client
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    if args.replay:
+        records = load_replay(args.replay)
+        if args.requests is None:
+            args.requests = len(records)
+        payloads: Iterator[tuple[float, dict]] = iter(records) if args.recorded_timing else _cycle(records)
+    else:
+        payloads = generated_payloads(args.seed, args.font_family, args.render_scale)
+    if args.requests is None:
+        args.requests = 100
+
+    async with target(args) as client:
+        before = await scrape(client)
+        started = time.perf_counter()
+        results = await drive(client, payloads, args)
+        seconds = time.perf_counter() - started
+        # Workers report right after their last task; give the final reports time to arrive.
+        await asyncio.sleep(0.5)
+        after = await scrape(client)
+
+    mode = "recorded" if args.recorded_timing else "open" if args.rate is not None else "closed"
+    return {
+        "target": args.url or ("in-process" if args.in_process else "launched"),
+        "mode": mode,
+        "concurrency": args.concurrency,
+        "rate": args.rate,
+        **summarize(results, seconds),
+        "resources": resource_usage(before, after, seconds),
+    }
+
+
+def print_report(report: dict) -> None:
+    latency, submit, resources = report["latency_ms"], report["submit_ms"], report["resources"]
+    print(f"{report['sessions']} sessions in {report['seconds']} s ({report['mode']} loop against {report['target']})")
+    print(f"  throughput   {report['throughput_per_s']} downloads/s")
+    print(f"  latency ms   p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  (submit to download)")
+    print(f"  submit ms    p50 {submit['p50']}  p95 {submit['p95']}  p99 {submit['p99']}")
+    print(f"  errors {report['error_rate']:.1%}  429 {report['rate_429']:.1%}  503 {report['rate_503']:.1%}  {report['outcomes']}")
+    print(
+        f"  workers      {resources['worker_processes']} processes, {resources['worker_cpu_seconds']} CPU s "
+        f"({resources['worker_cpu_cores']} cores), peak RSS {resources['worker_max_rss_mb']} MiB"
+    )
+    print(f"  api          {resources['api_cpu_seconds']} CPU s, peak RSS {resources['api_max_rss_mb']} MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument("--url", help="base URL of a running server, e.g. http://127.0.0.1:9000")
+    where.add_argument("--in-process", action="store_true", help="serve the app inside this process")
+    parser.add_argument(
+        "--server-env", action="append", default=[], metavar="NAME=VALUE", help="extra environment for the launched server"
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="closed-loop users, or the in-flight cap of open loops")
+    parser.add_argument("--rate", type=float, help="open loop: mean session arrivals per second")
+    parser.add_argument("--requests", type=int, help="sessions to start (default 100, or the replay file length)")
+    parser.add_argument("--duration", type=float, help="start sessions for this many seconds instead of --requests")
+    parser.add_argument("--replay", type=Path, help="JSON lines of recorded payloads, see --export-payloads")
+    parser.add_argument("--recorded-timing", action="store_true", help="replay at the recorded offsets")
+    parser.add_argument("--speed", type=float, default=1.0, help="divide recorded offsets by this factor")
+    parser.add_argument("--export-payloads", type=Path, help="write recent task inputs from the database and exit")
+    parser.add_argument("--limit", type=int, default=1000, help="tasks to export")
+    parser.add_argument("--font-family", default="她屿山海")
+    parser.add_argument("--render-scale", type=float, default=0.3)
+    parser.add_argument("--poll-interval", type=float, default=0.25)
+    parser.add_argument("--task-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.export_payloads:
+        print(f"exported {export_payloads(args.export_payloads, args.limit)} payloads to {args.export_payloads}")
+        return
+    if args.recorded_timing and not args.replay:
+        parser.error("--recorded-timing needs --replay")
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Render engine benchmark: background fill, handwriting raster and full renders over a case matrix.
+
+Each case varies one dimension of a reference request (1,000 characters, A4 portrait, white
+paper, scale 0.5, default effects); ``--full`` runs the complete cross product instead. The
+best of ``--repeat`` runs is compared against the committed baseline and the run fails on
+regressions.
+
+Usage (from ``backend/``)::
+
+    python -m benchmarks.render_engine                      # compare with the baseline
+    python -m benchmarks.render_engine --only chars= --repeat 5
+    python -m benchmarks.render_engine --json run.json --update-baseline
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from PIL import Image
+
+from app.core.config import get_settings
+from app.schemas.render import PaperBackground, PaperType, RenderTaskCreateRequest
+from app.services.render_service import _canvas_size, _draw_background, _draw_handwriting, render_handwriting_image
+
+BASELINE_PATH = Path(__file__).with_name("baselines") / "render_engine.json"
+SAMPLE_TEXT = "永和九年，岁在癸丑，暮春之初，会于会稽山阴之兰亭，修禊事也。群贤毕至，少长咸集。此地有崇山峻岭，茂林修竹。\n"
+
+TEXT_LENGTHS = (100, 1000, 4000, 12000)
+SCALES = (0.2, 0.5, 1.0)
+EFFECTS: dict[str, dict[str, int]] = {
+    "none": {"position_jitter": 0, "weight_variation": 0, "note_sloppiness": 0, "scratch_rate": 0},
+    "default": {},
+    "heavy": {"position_jitter": 60, "weight_variation": 60, "note_sloppiness": 80, "scratch_rate": 20},
+}
+REFERENCE = {
+    "chars": 1000,
+    "paper": PaperType.A4_PORTRAIT,
+    "background": PaperBackground.WHITE,
+    "scale": 0.5,
+    "effects": "default",
+}
+
+
+def _text(length: int) -> str:
+    return (SAMPLE_TEXT * (length // len(SAMPLE_TEXT) + 1))[:length]
+
+
+def build_cases(full: bool) -> list[dict]:
+    axes = {
+        "chars": TEXT_LENGTHS,
+        "paper": tuple(PaperType),
+        "background": tuple(PaperBackground),
+        "scale": SCALES,
+        "effects": tuple(EFFECTS),
+    }
+    if full:
+        return [dict(zip(axes, values)) for values in itertools.product(*axes.values())]
+    cases = [dict(REFERENCE)]
+    for axis, values in axes.items():
+        cases += [{**REFERENCE, axis: value} for value in values if value != REFERENCE[axis]]
+    return cases
+
+
+def case_name(case: dict) -> str:
+    return (
+        f"chars={case['chars']}/paper={case['paper'].value}/bg={case['background'].value}"
+        f"/scale={case['scale']}/effects={case['effects']}"
+    )
+
+
+def _payload(case: dict, font_family: str) -> RenderTaskCreateRequest:
+    return RenderTaskCreateRequest(
+        text=_text(case["chars"]),
+        font_family=font_family,
+        paper_type=case["paper"],
+        paper_background=case["background"],
+        render_scale=case["scale"],
+        random_seed=20240601,
+        **EFFECTS[case["effects"]],
+    )
+
+
+def _best_ms(fn: Callable[[], object], repeat: int) -> float:
+    """Fastest of ``repeat`` timed calls after a warm-up; like ``timeit``, the minimum is the least noisy."""
+    fn()  # warm caches (fonts, glyphs, background canvases) so runs measure steady state
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(min(timings), 2)
+
+
+def run(cases: list[dict], repeat: int, font_family: str, output_dir: Path) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for case in cases:
+        payload = _payload(case, font_family)
+        # Drawing over the same canvas again costs the same; allocating it is not what is measured.
+        canvas = Image.new("RGB", _canvas_size(payload), color=(255, 255, 255))
+
+        def background() -> None:
+            _draw_background(canvas, payload.paper_background.value)
+
+        def handwriting() -> None:
+            _draw_handwriting(canvas, payload)
+
+        def full_render() -> None:
+            render_handwriting_image(payload, output_dir / "bench.png")
+
+        name = case_name(case)
+        results[name] = {
+            "draw_background_ms": _best_ms(background, repeat),
+            "draw_handwriting_ms": _best_ms(handwriting, repeat),
+            "render_handwriting_image_ms": _best_ms(full_render, repeat),
+        }
+        print(name, json.dumps(results[name]), flush=True)
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+    min_delta_ms: float,
+) -> list[str]:
+    """Regressions slower than the baseline by more than ``threshold`` and ``min_delta_ms``."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if previous is None:
+                continue
+            if value > previous * (1 + threshold) and value - previous > min_delta_ms:
+                regressions.append(f"{name} {metric}: {previous:.2f} -> {value:.2f} ms (+{value / previous - 1:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--full", action="store_true", help="run the full cross product of every axis")
+    parser.add_argument("--only", help="only run cases whose name contains this substring")
+    parser.add_argument("--font-family", default="她屿山海")
+    parser.add_argument("--page-workers", type=int, default=1, help="render_page_workers for multi-page renders")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio, default 25%%")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore slowdowns smaller than this")
+    parser.add_argument("--confirm", type=int, default=2, help="re-measure regressed cases this many times before failing")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    get_settings().render_page_workers = args.page_workers
+    cases = [case for case in build_cases(args.full) if not args.only or args.only in case_name(case)]
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = run(cases, args.repeat, args.font_family, Path(output_dir))
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "processor": platform.machine()},
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, ensure_ascii=False, indent=2)
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {"results": {}}
+        report["results"] = {**baseline["results"], **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    for _ in range(args.confirm):
+        if not regressions:
+            break
+        # A busy machine slows single runs; only slowdowns that reproduce count.
+        suspects = [case for case in cases if any(line.startswith(f"{case_name(case)} ") for line in regressions)]
+        print(f"re-measuring {len(suspects)} case(s) that look slower")
+        with tempfile.TemporaryDirectory() as output_dir:
+            retry = run(suspects, args.repeat, args.font_family, Path(output_dir))
+        for name, metrics in retry.items():
+            results[name] = {metric: min(value, results[name][metric]) for metric, value in metrics.items()}
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+        print("\n".join(f"  {line}" for line in regressions))
+        sys.exit(1)
+    print(f"no regressions beyond {args.threshold:.0%} across {len(results)} cases")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
+import io
+import json
+import time
+import zipfile
+from uuid import uuid4
+
 from fastapi.testclient import TestClient
+from PIL import Image
 
 from app.main import app
 from app.services.ai_service import PolishResult
 
 
+def _wait_for_status(client: TestClient, task_id: str, timeout: float = 30.0) -> str:
+    deadline = time.monotonic() + timeout
+    while True:
+        task_status = client.get(f"/api/v1/render/tasks/{task_id}").json()["status"]
+        if task_status in {"success", "failed"} or time.monotonic() > deadline:
+            return task_status
+        time.sleep(0.05)
+
+
 def test_health_check() -> None:
     with TestClient(app) as client:
         response = client.get("/api/v1/health")
@@ -26,6 +42,212 @@ def test_submit_render_task() -> None:
         assert isinstance(body["task_id"], str)
 
 
+def test_identical_seeded_submission_reuses_finished_output() -> None:
+    with TestClient(app) as client:
+        payload = {
+            "text": f"缓存命中测试 {uuid4()}",
+            "font_family": "她屿山海",
+            "paper_background": "white",
+            "render_scale": 0.2,
+            "random_seed": 42,
+        }
+        first = client.post("/api/v1/render/tasks", json=payload).json()
+        assert _wait_for_status(client, first["task_id"]) == "success"
+
+        second = client.post("/api/v1/render/tasks", json={**payload, "user_id": "another-user"})
+        assert second.status_code == 202
+        assert second.json()["status"] == "success"
+        assert second.json()["task_id"] != first["task_id"]
+
+        first_file = client.get(f"/api/v1/files/{first['task_id']}")
+        second_file = client.get(f"/api/v1/files/{second.json()['task_id']}")
+        assert second_file.status_code == 200
+        assert second_file.content == first_file.content
+
+
+def test_rendered_file_supports_conditional_and_range_requests() -> None:
+    with TestClient(app) as client:
+        payload = {"text": f"缓存头 {uuid4()}", "font_family": "她屿山海", "render_scale": 0.2, "random_seed": 7}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+        assert _wait_for_status(client, task_id) == "success"
+
+        full = client.get(f"/api/v1/files/{task_id}")
+        assert full.status_code == 200
+        etag = full.headers["etag"]
+        assert "immutable" in full.headers["cache-control"]
+
+        revalidated = client.get(f"/api/v1/files/{task_id}", headers={"If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+        partial = client.get(f"/api/v1/files/{task_id}", headers={"Range": "bytes=0-9"})
+        assert partial.status_code == 206
+        assert partial.content == full.content[:10]
+
+
+def test_rendered_file_variant_is_downscaled_and_stored_once() -> None:
+    with TestClient(app) as client:
+        payload = {"text": f"缩略图 {uuid4()}", "font_family": "她屿山海", "render_scale": 0.3, "random_seed": 3}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+        assert _wait_for_status(client, task_id) == "success"
+
+        response = client.get(f"/api/v1/files/{task_id}/variants", params={"w": 300, "format": "webp"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        with Image.open(io.BytesIO(response.content)) as image:
+            assert image.width == 320
+        etag = response.headers["etag"]
+
+        again = client.get(f"/api/v1/files/{task_id}/variants", params={"w": 320}, headers={"If-None-Match": etag})
+        assert again.status_code == 304
+
+
+def test_multipage_pdf_variant_is_cut_from_its_first_page() -> None:
+    with TestClient(app) as client:
+        payload = {"text": "永" * 1000, "font_family": "她屿山海", "render_scale": 0.2, "random_seed": uuid4().int % 1000}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+        assert _wait_for_status(client, task_id) == "success"
+        assert client.get(f"/api/v1/files/{task_id}").headers["content-type"] == "application/pdf"
+
+        response = client.get(f"/api/v1/files/{task_id}/variants", params={"w": 320})
+        assert response.status_code == 200
+        with Image.open(io.BytesIO(response.content)) as image:
+            assert image.width == 320
+
+
+def test_metrics_expose_render_stages_queue_and_caches() -> None:
+    with TestClient(app) as client:
+        payload = {"text": f"指标 {uuid4()}", "font_family": "她屿山海", "render_scale": 0.2}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+        assert _wait_for_status(client, task_id) == "success"
+
+        # Worker processes report their timings right after the task finishes.
+        deadline = time.monotonic() + 10
+        while True:
+            response = client.get("/metrics")
+            if 'render_stage_seconds_count{stage="rasterize"}' in response.text or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert 'render_stage_seconds_bucket{stage="layout",le="+Inf"}' in body
+        assert 'render_stage_seconds_count{stage="db_commit"}' in body
+        assert 'render_task_seconds_count{outcome="success"}' in body
+        assert 'render_cache_hits_total{cache="glyph_atlas"}' in body
+        assert "render_queue_depth " in body
+        assert 'render_tasks{status="success"}' in body
+        assert "render_worker_cpu_seconds_total{pid=" in body
+        assert "process_max_rss_bytes " in body
+
+
+def test_task_records_stage_timings_and_optional_profile(monkeypatch) -> None:
+    # Render processes read their settings from the environment they are spawned with.
+    monkeypatch.setenv("HW_BACKEND_RENDER_PROFILE_ALLOWED", "true")
+    with TestClient(app) as client:
+        payload = {"text": "性能剖析", "font_family": "她屿山海", "render_scale": 0.2, "debug_profile": True}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+        assert _wait_for_status(client, task_id) == "success"
+
+        task = client.get(f"/api/v1/render/tasks/{task_id}").json()
+        assert {"queue_wait", "background", "layout", "rasterize", "encode", "total"} <= set(task["timings"])
+        assert task["profile_url"] == f"/api/v1/files/{task_id}/profile"
+
+        dump = client.get(task["profile_url"])
+        assert dump.status_code == 200
+        assert dump.headers["content-type"] == "application/octet-stream"
+        summary = client.get(task["profile_url"], params={"format": "text"})
+        assert "render_handwriting_image" in summary.text
+
+
+def test_render_task_events_push_status_until_finished() -> None:
+    with TestClient(app) as client:
+        payload = {"text": "推送状态", "font_family": "她屿山海", "paper_background": "white", "render_scale": 0.2}
+        task_id = client.post("/api/v1/render/tasks", json=payload).json()["task_id"]
+
+        statuses = []
+        with client.stream("GET", f"/api/v1/render/tasks/{task_id}/events") as response:
+            assert response.headers["content-type"].startswith("text/event-stream")
+            for line in response.iter_lines():
+                if line.startswith("data: "):
+                    event = json.loads(line[len("data: "):])
+                    statuses.append(event["status"])
+        assert statuses[-1] == "success"
+        assert event["file_url"] == f"/api/v1/files/{task_id}"
+
+        with client.websocket_connect(f"/api/v1/render/tasks/{task_id}/ws") as websocket:
+            assert websocket.receive_json()["status"] == "success"
+
+
+def test_submit_render_task_rejects_when_queue_is_full(monkeypatch) -> None:
+    with TestClient(app) as client:
+        monkeypatch.setattr(app.state.render_executor, "capacity", 0)
+        response = client.post(
+            "/api/v1/render/tasks",
+            json={"text": "队列已满", "font_family": "她屿山海", "paper_background": "white"},
+        )
+        assert response.status_code == 503
+        assert response.headers["retry-after"].isdigit()
+
+
+def test_render_batch_takes_one_queue_slot_per_text(monkeypatch) -> None:
+    with TestClient(app) as client:
+        executor = app.state.render_executor
+        payload = {"texts": ["一", "二", "三"], "font_family": "她屿山海", "paper_background": "white"}
+        monkeypatch.setattr(executor, "capacity", 2)
+        assert client.post("/api/v1/render/batches", json=payload).status_code == 422
+
+        monkeypatch.setattr(executor, "capacity", 4)
+        executor.reserve(2)
+        try:
+            response = client.post("/api/v1/render/batches", json=payload)
+        finally:
+            executor.release(2)
+        assert response.status_code == 503
+        assert response.headers["retry-after"].isdigit()
+        assert executor.depth == 0
+
+
+def test_render_batch_streams_one_zip_entry_per_text() -> None:
+    with TestClient(app) as client:
+        payload = {
+            "texts": ["第一份", "第二份", "第三份"],
+            "font_family": "她屿山海",
+            "paper_background": "white",
+            "render_scale": 0.2,
+        }
+        submitted = client.post("/api/v1/render/batches", json=payload)
+        assert submitted.status_code == 202
+        batch_id = submitted.json()["batch_id"]
+        assert len(submitted.json()["task_ids"]) == 3
+
+        response = client.get(f"/api/v1/files/batches/{batch_id}")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            assert sorted(archive.namelist()) == ["001.png", "002.png", "003.png"]
+
+        batch = client.get(f"/api/v1/render/batches/{batch_id}").json()
+        assert batch["status"] == "success"
+        assert batch["status_counts"] == {"success": 3}
+
+
+def test_preview_render_returns_inline_image() -> None:
+    with TestClient(app) as client:
+        payload = {
+            "text": "预览测试文本",
+            "font_family": "她屿山海",
+            "paper_background": "real-lined-cream",
+            "random_seed": 7,
+        }
+        response = client.post("/api/v1/render/preview?format=webp", json=payload)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["x-page-count"] == "1"
+        assert response.content[8:12] == b"WEBP"
+
+
 def test_polish_note_endpoint(monkeypatch) -> None:
     def fake_polish_note_text(payload):  # noqa: ANN001
         return PolishResult(
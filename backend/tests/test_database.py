@@ -0,0 +1,66 @@
+import asyncio
+
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.database import (
+    async_database_url,
+    dispose_async_engine,
+    engine,
+    engine_options,
+    get_async_sessionmaker,
+    init_db,
+    upgrade_schema,
+)
+
+
+def test_sqlite_connections_use_wal_and_busy_timeout() -> None:
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert connection.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert connection.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+
+def test_engine_options_per_backend() -> None:
+    assert "pool_size" not in engine_options("sqlite:///app.db")
+    assert engine_options("postgresql://user:pw@db/handwrite")["pool_pre_ping"] is True
+    assert async_database_url("sqlite:///app.db") == "sqlite+aiosqlite:///app.db"
+    assert async_database_url("postgresql://user:pw@db/handwrite") == "postgresql+asyncpg://user:pw@db/handwrite"
+
+
+def test_async_session_reads_the_same_database() -> None:
+    init_db()
+
+    async def count_tasks() -> int:
+        try:
+            async with get_async_sessionmaker()() as db:
+                return (await db.execute(text("SELECT COUNT(*) FROM render_tasks"))).scalar_one()
+        finally:
+            await dispose_async_engine()
+
+    assert asyncio.run(count_tasks()) >= 0
+
+
+def test_upgrade_schema_adds_missing_columns_to_an_existing_database(tmp_path) -> None:
+    init_db()
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as connection:
+        # render_tasks as created by the first release.
+        connection.execute(
+            text(
+                "CREATE TABLE render_tasks (id VARCHAR(36) PRIMARY KEY, user_id VARCHAR(36), status VARCHAR(20) NOT NULL, "
+                "input_json JSON NOT NULL, output_file_path VARCHAR(500), output_file_name VARCHAR(255), "
+                "error_message TEXT, created_at DATETIME NOT NULL, started_at DATETIME, completed_at DATETIME, "
+                "updated_at DATETIME NOT NULL)"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO render_tasks VALUES ('t1', NULL, 'success', '{}', NULL, NULL, NULL, '2024-01-01', NULL, NULL, '2024-01-01')")
+        )
+
+    added = upgrade_schema(old)
+    assert {"render_tasks.worker_id", "render_tasks.lease_expires_at", "render_tasks.attempts"} <= set(added)
+    assert "render_blobs.hash" not in added
+    assert upgrade_schema(old) == []
+    with old.connect() as connection:
+        assert connection.execute(text("SELECT attempts, worker_id FROM render_tasks")).one() == (0, None)
+    assert "ix_render_tasks_lease_expires_at" in {index["name"] for index in inspect(old).get_indexes("render_tasks")}
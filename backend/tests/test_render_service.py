@@ -0,0 +1,557 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageFont, PdfParser
+from sqlalchemy import func, select
+
+from app.core.database import SessionLocal, init_db
+from app.models.render_blob import RenderBlob
+from app.models.render_task import RenderTask
+from app.schemas.ai import NotePolishRequest
+from app.schemas.render import OutputFormat, RenderTaskCreateRequest
+from app.services import ai_service, blob_storage, render_service, retention, variants
+from app.services.asset_service import resolve_font_path
+from app.services.background_cache import BackgroundCache
+from app.services.encoders import ENCODER_PROFILES, encode_image
+from app.services.font_metrics import FontMetricsIndex, ScaledGlyphMetrics
+from app.services.font_registry import FontRegistry
+from app.services.glyph_atlas import GlyphAtlas
+from app.services.ink_compositor import InkLayer
+from app.services.layout_engine import SCRATCH, THICKEN, EffectParams, PageGeometry, get_glyph_metrics, layout_text
+from app.services.render_progress import ProgressReporter
+from app.services.render_service import render_handwriting_image
+from app.services.task_events import get_task_event_bus
+from app.workers.executor import RenderExecutor
+from app.workers.task_queue import claim_next_task, fail_exhausted_tasks, renew_lease
+
+
+def test_glyph_atlas_paste_matches_draw_text() -> None:
+    font = ImageFont.load_default(size=24)
+    atlas = GlyphAtlas(max_bytes=1024 * 1024)
+
+    expected = Image.new("RGB", (120, 60), (255, 248, 220))
+    actual = expected.copy()
+    for char, xy in [("A", (10, 10)), ("g", (40, 20)), ("Q", (-4, 50))]:
+        ImageDraw.Draw(expected).text(xy, char, fill=(30, 30, 30), font=font)
+        atlas.get("default", font, char).paste(actual, xy, (30, 30, 30))
+
+    assert ImageChops.difference(expected, actual).getbbox() is None
+
+
+def test_glyph_atlas_reuses_and_evicts_by_bytes() -> None:
+    font = ImageFont.load_default(size=24)
+    first = GlyphAtlas(max_bytes=1024 * 1024).get("default", font, "W")
+    atlas = GlyphAtlas(max_bytes=first.nbytes * 2)
+
+    assert atlas.get("default", font, "W") is atlas.get("default", font, "W")
+    assert atlas.stats()["hits"] == 1
+
+    for char in "MNOPQ":
+        atlas.get("default", font, char)
+    assert atlas.current_bytes <= atlas.max_bytes
+    assert ("default", 24, "W", 255) not in atlas._glyphs
+
+
+def test_glyph_atlas_counts_faded_glyphs_against_its_budget() -> None:
+    font = ImageFont.load_default(size=24)
+    atlas = GlyphAtlas(max_bytes=1024 * 1024)
+    base = atlas.get("default", font, "W")
+    faded = atlas.get("default", font, "W", 100)
+
+    assert faded is atlas.get("default", font, "W", 100)
+    assert faded.mask.getextrema()[1] == base.mask.getextrema()[1] * 100 // 255
+    assert atlas.current_bytes == base.nbytes + faded.nbytes
+
+
+def test_font_registry_shares_file_bytes_across_sizes() -> None:
+    registry = FontRegistry(max_instances=2)
+
+    small = registry.get("她屿山海", 24)
+    assert registry.get("她屿山海", 24) is small
+    registry.get("她屿山海", 32)
+    registry.get("她屿山海", 40)
+
+    stats = registry.stats()
+    assert stats == {**stats, "entries": 2, "files": 1, "hits": 1, "misses": 3}
+    assert registry.get("不存在的字体", 24) is registry.get("另一个不存在的字体", 24)
+
+
+def test_background_cache_persists_memory_mapped_canvas(tmp_path) -> None:
+    cache = BackgroundCache(cache_dir=tmp_path, max_bytes=64 * 1024 * 1024)
+    canvas = cache.get("real-blank-white", (720, 1024))
+    assert canvas is not None
+    assert cache.get("real-blank-white", (720, 1024)) is canvas
+    assert cache.get("white", (720, 1024)) is None
+
+    reloaded = BackgroundCache(cache_dir=tmp_path, max_bytes=64 * 1024 * 1024).get("real-blank-white", (720, 1024))
+    assert len(list(tmp_path.glob("real-blank-white-720x1024-*.rgbx"))) == 1
+    assert reloaded.readonly
+    assert ImageChops.difference(canvas, reloaded).getbbox() is None
+
+
+def test_background_cache_keeps_its_directory_within_budget(tmp_path) -> None:
+    one_canvas = 720 * 1026 * 4
+    cache = BackgroundCache(cache_dir=tmp_path, max_bytes=one_canvas * 2)
+    for height in (1024, 1025, 1026):
+        cache.get("real-blank-white", (720, height))
+        os.utime(next(tmp_path.glob(f"*-720x{height}-*.rgbx")), (height, height))
+
+    kept = sorted(path.name.split("-")[3] for path in tmp_path.glob("*.rgbx"))
+    assert kept == ["720x1025", "720x1026"]
+    assert not cache._key_locks
+
+
+def test_layout_text_wraps_without_drawing() -> None:
+    geometry = PageGeometry.for_canvas((720, 1024), font_size=24, line_height=1.8)
+    metrics = get_glyph_metrics("她屿山海", 24)
+
+    plain = layout_text("永" * 400, geometry, metrics, 24, max_pages=1)
+    assert set(plain.ys[:3]) == {geometry.margin_top}
+    assert max(plain.xs) + plain.advances[0] <= geometry.max_x
+    assert plain.glyphs == ["永"] and not any(plain.flags)
+    assert plain.truncated and len(plain) < 400
+
+    effects = EffectParams(position_jitter=0.1, weight_variation=1.0, sloppiness=1.0, scratch_rate=1.0)
+    first = layout_text("永和九年", geometry, metrics, 24, effects=effects, random_seed=7)
+    second = layout_text("永和九年", geometry, metrics, 24, effects=effects, random_seed=7)
+    assert first == second
+    assert first.flags[0] & THICKEN and first.flags[0] & SCRATCH
+    assert 1 <= len(first.thicken_offsets(0)) <= 3
+
+
+def test_overflowing_text_continues_onto_more_pages(tmp_path) -> None:
+    geometry = PageGeometry.for_canvas((720, 1024), font_size=24, line_height=1.8)
+    metrics = get_glyph_metrics("她屿山海", 24)
+    effects = EffectParams(position_jitter=0.1, weight_variation=0.2, sloppiness=0.2, scratch_rate=0.1)
+
+    layout = layout_text("永" * 1000, geometry, metrics, 24, effects=effects, random_seed=3)
+    assert len(layout) == 1000 and not layout.truncated
+    assert layout.page_count == max(layout.pages) + 1 >= 2
+    second = layout.for_page(1)
+    assert set(second.pages) == {1}
+    assert min(second.ys) < geometry.margin_top + geometry.line_step
+
+    payload = RenderTaskCreateRequest(
+        text="永" * 1000, font_family="她屿山海", render_scale=0.2, random_seed=3, multipage_format="zip"
+    )
+    progress = ProgressReporter(f"progress-{uuid4()}", chars_total=1000)
+    output_path = render_handwriting_image(payload, tmp_path / "task.png", progress)
+    assert output_path.suffix == ".zip"
+    with zipfile.ZipFile(output_path) as archive:
+        names = archive.namelist()
+    assert len(names) >= 2 and names == [f"page-{page:03d}.png" for page in range(1, len(names) + 1)]
+
+    latest = get_task_event_bus().latest_progress(progress.task_id)
+    assert latest["chars_laid_out"] == 1000 and not latest["truncated"]
+    assert latest["pages_rasterized"] == latest["pages_total"] == len(names)
+
+
+def test_multipage_pdf_is_written_page_by_page_and_flags_truncation(monkeypatch, tmp_path) -> None:
+    monkeypatch.setattr(render_service.settings, "render_max_pages", 2)
+    monkeypatch.setattr(render_service.settings, "render_page_workers", 2)
+    payload = RenderTaskCreateRequest(text="永" * 3000, font_family="她屿山海", render_scale=0.2, random_seed=3)
+    progress = ProgressReporter(f"progress-{uuid4()}", chars_total=3000)
+    try:
+        output_path = render_handwriting_image(payload, tmp_path / "task.png", progress)
+    finally:
+        render_service.shutdown_page_pool()
+
+    assert output_path.suffix == ".pdf"
+    pdf = PdfParser.PdfParser(str(output_path))
+    try:
+        assert len(pdf.pages) == 2
+    finally:
+        pdf.close()
+    cover = variants.cover_path(output_path)
+    with Image.open(cover) as image:
+        assert image.width == min(max(variants.settings.variant_widths), render_service._canvas_size(payload)[0])
+    variant = variants.get_variant(output_path, 160, "webp")
+    with Image.open(variant) as image:
+        assert image.width == 160
+    latest = get_task_event_bus().latest_progress(progress.task_id)
+    assert latest["truncated"] and latest["chars_laid_out"] < 3000
+
+
+def test_ink_layer_stacks_passes_and_honours_ghost_alpha() -> None:
+    glyph = GlyphAtlas(max_bytes=1024 * 1024).get("default", ImageFont.load_default(size=24), "W")
+
+    ghost = InkLayer((60, 40))
+    ghost.add_ghost(glyph.faded(100), (5, 5))
+    assert ghost.coverage.getextrema() == (0, 100)
+
+    ink = InkLayer((60, 40))
+    ink.add_ghost(glyph.faded(100), (5, 5))
+    ink.add_glyph(glyph, (5, 5))
+    assert ink.coverage.getextrema() == (0, 255)
+
+    paper = Image.new("RGB", (60, 40), (255, 255, 255))
+    ink.composite(paper, (30, 30, 30))
+    assert paper.getextrema() == ((30, 255), (30, 255), (30, 255))
+
+
+def test_every_output_profile_encodes_to_its_declared_format() -> None:
+    image = Image.new("RGB", (64, 48), (255, 255, 255))
+    ImageDraw.Draw(image).line([(4, 24), (60, 24)], fill=(30, 30, 30), width=3)
+
+    for output_format, profile in ENCODER_PROFILES.items():
+        with Image.open(io.BytesIO(encode_image(image, output_format, quality=70))) as decoded:
+            assert decoded.format == profile.pil_format
+            assert decoded.size == image.size
+    assert ENCODER_PROFILES[OutputFormat.PNG_GRAY].prepare(image).mode == "L"
+
+
+def test_concurrent_identical_tasks_render_once(monkeypatch, tmp_path) -> None:
+    init_db()
+    calls: list[str] = []
+
+    def slow_render(payload, output_path, progress=None, timer=None):  # noqa: ANN001
+        calls.append(output_path.stem)
+        time.sleep(0.2)
+        output_path = tmp_path / output_path.name
+        output_path.write_bytes(b"png")
+        return output_path
+
+    monkeypatch.setattr(render_service, "render_handwriting_image", slow_render)
+    payload = RenderTaskCreateRequest(text=f"single flight {uuid4()}", random_seed=9)
+    with SessionLocal() as db:
+        task_ids = [render_service.create_render_task(db, payload).id for _ in range(3)]
+
+    threads = [threading.Thread(target=render_service.run_render_task, args=(task_id,)) for task_id in task_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    with SessionLocal() as db:
+        tasks = [render_service.get_render_task_or_none(db, task_id) for task_id in task_ids]
+        assert {task.status for task in tasks} == {"success"}
+        assert len({task.output_file_path for task in tasks}) == 1
+
+
+def test_band_parallel_raster_matches_single_band(monkeypatch) -> None:
+    payload = RenderTaskCreateRequest(
+        text="永和九年，岁在癸丑 gqj\n" * 40,
+        font_family="她屿山海",
+        paper_background="cream",
+        random_seed=11,
+        weight_variation=50,
+        note_sloppiness=80,
+        scratch_rate=30,
+        render_scale=0.2,
+    )
+    size = render_service._canvas_size(payload)
+    layout = render_service._layout_handwriting(payload, size)
+
+    monkeypatch.setattr(render_service.settings, "render_band_threads", 1)
+    single = render_service._render_page(payload, layout, size, 0)
+    monkeypatch.setattr(render_service.settings, "render_band_threads", 5)
+    monkeypatch.setattr(render_service.settings, "render_band_min_pixels", 0)
+    banded = render_service._render_page(payload, layout, size, 0)
+
+    assert ImageChops.difference(single, banded).getbbox() is None
+
+
+def test_queue_leases_tasks_and_retries_expired_leases(monkeypatch) -> None:
+    init_db()
+    monkeypatch.setattr(render_service.settings, "render_max_attempts", 2)
+    long_ago = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    with SessionLocal() as db:
+        task = RenderTask(id=str(uuid4()), status="pending", input_json={}, created_at=long_ago)
+        db.add(task)
+        db.commit()
+        task_id = task.id
+
+        claimed = claim_next_task(db, "worker-a")
+        assert (claimed.id, claimed.worker_id, claimed.attempts) == (task_id, "worker-a", 1)
+        other = claim_next_task(db, "worker-b")
+        assert other is None or other.id != task_id
+        assert renew_lease(db, task_id, "worker-a")
+        assert not renew_lease(db, task_id, "worker-b")
+
+        # A crashed worker stops heartbeating; once the lease lapses the task is claimable again.
+        claimed.lease_expires_at = long_ago
+        db.commit()
+        retried = claim_next_task(db, "worker-b")
+        assert (retried.id, retried.worker_id, retried.attempts) == (task_id, "worker-b", 2)
+
+        retried.lease_expires_at = long_ago
+        db.commit()
+        fail_exhausted_tasks(db)
+        db.refresh(retried)
+        assert retried.status == "failed"
+
+
+def test_worker_that_lost_its_lease_records_nothing() -> None:
+    init_db()
+    long_ago = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    input_json = {"text": f"租约 {uuid4()}", "render_scale": 0.2, "font_family": "她屿山海"}
+    with SessionLocal() as db:
+        task = RenderTask(id=str(uuid4()), status="pending", input_json=input_json, created_at=long_ago)
+        db.add(task)
+        db.commit()
+        stale = claim_next_task(db, "worker-a")
+        stale.lease_expires_at = long_ago
+        db.commit()
+        assert claim_next_task(db, "worker-b").id == task.id
+
+    lost = threading.Event()
+    lost.set()
+    with SessionLocal() as db:
+        render_service.execute_render_task(db, db.get(RenderTask, task.id), owner="worker-b", cancelled=lost)
+        assert db.get(RenderTask, task.id, populate_existing=True).status == "running"
+
+        # worker-a finishes a render after worker-b took the task over: nothing is written.
+        render_service.execute_render_task(db, db.get(RenderTask, task.id), owner="worker-a")
+        row = db.get(RenderTask, task.id, populate_existing=True)
+        assert (row.status, row.worker_id, row.blob_hash) == ("running", "worker-b", None)
+
+        render_service.execute_render_task(db, row, owner="worker-b")
+        row = db.get(RenderTask, task.id, populate_existing=True)
+        assert row.status == "success"
+        assert db.get(RenderBlob, row.blob_hash).ref_count == 1
+
+
+def _wait_until(condition, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_executor_forgets_followers_and_replaces_a_broken_pool() -> None:
+    init_db()
+    with SessionLocal() as db:
+        task = RenderTask(id=str(uuid4()), status="pending", input_json={"text": "x", "render_scale": 0.2})
+        db.add(task)
+        db.commit()
+
+    executor = RenderExecutor(max_workers=1, max_queue=4)
+    try:
+        # Unknown ids are claimed by nobody, so these calls only exercise the chaining.
+        executor.reserve(3)
+        for _ in range(3):
+            executor.submit(str(uuid4()), cache_key="shared-key")
+        _wait_until(lambda: executor.depth == 0)
+        assert executor._inflight == {}
+
+        broken = executor._pool
+        for process in list(broken._processes.values()):
+            process.kill()
+        _wait_until(lambda: broken._broken)
+        executor.reserve()
+        executor.submit(task.id)
+        assert executor._pool is not broken
+        _wait_until(lambda: executor.depth == 0)
+    finally:
+        executor.shutdown()
+    with SessionLocal() as db:
+        assert db.get(RenderTask, task.id).status == "success"
+
+
+def test_pool_recovery_requeues_orphaned_tasks() -> None:
+    init_db()
+    with SessionLocal() as db:
+        pending = RenderTask(id=str(uuid4()), status="pending", input_json={})
+        orphaned = RenderTask(id=str(uuid4()), status="running", input_json={}, worker_id="pool:999999999:dead")
+        alive = RenderTask(id=str(uuid4()), status="running", input_json={}, worker_id=f"pool:{os.getpid()}:live")
+        db.add_all([pending, orphaned, alive])
+        db.commit()
+        ids = [pending.id, orphaned.id, alive.id]
+
+        requeued = {task.id for task in render_service.recover_pool_tasks(db)}
+        assert {pending.id, orphaned.id} <= requeued and alive.id not in requeued
+        render_service.fail_render_tasks(db, ids, "cleanup")
+        assert {db.get(RenderTask, task_id, populate_existing=True).status for task_id in ids} == {"failed"}
+
+
+def test_retention_sweep_expires_stale_and_over_budget_outputs(monkeypatch, tmp_path) -> None:
+    init_db()
+    with SessionLocal() as db:
+        # Outputs of other tests were used more recently and stay within the budget.
+        stored = db.scalar(select(func.coalesce(func.sum(RenderBlob.size_bytes), 0)).where(RenderBlob.ref_count > 0))
+    monkeypatch.setattr(retention.settings, "retention_ttl_hours", {"success": 1.0})
+    monkeypatch.setattr(retention.settings, "render_storage_budget_bytes", stored + 200)
+    now = datetime.now(timezone.utc)
+
+    def finished(age: timedelta, size: int | None) -> str:
+        task_id = str(uuid4())
+        path = tmp_path / f"{task_id}.png"
+        if size is not None:
+            path.write_bytes(b"x" * size)
+        with SessionLocal() as db:
+            db.add(RenderTask(id=task_id, status="success", input_json={}, output_file_path=str(path), completed_at=now - age))
+            db.commit()
+        return task_id
+
+    stale = finished(timedelta(hours=2), 100)
+    least_recent = finished(timedelta(minutes=30), 100)
+    (tmp_path / f"{least_recent}.w320.webp").write_bytes(b"x" * 50)
+    recent = finished(timedelta(minutes=40), 100)
+    vanished = finished(timedelta(minutes=10), None)
+    old_orphan, new_orphan = tmp_path / f"{uuid4()}.png", tmp_path / f"{uuid4()}.png"
+    old_orphan.write_bytes(b"x")
+    new_orphan.write_bytes(b"x")
+    os.utime(old_orphan, (time.time() - 7200, time.time() - 7200))
+    # Downloading counts as use, so the older but just downloaded output outlives ``least_recent``.
+    retention.get_access_recorder().record(recent)
+
+    with SessionLocal() as db:
+        report = retention.sweep_render_storage(db, render_dir=tmp_path)
+        statuses = {task_id: db.get(RenderTask, task_id).status for task_id in (stale, least_recent, recent, vanished)}
+
+    assert statuses == {stale: "expired", least_recent: "expired", recent: "success", vanished: "expired"}
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted([f"{recent}.png", new_orphan.name])
+    assert report.storage_bytes == stored + 101
+
+
+def test_blob_storage_deduplicates_identical_outputs(monkeypatch, tmp_path) -> None:
+    init_db()
+    storage = blob_storage.LocalBlobStorage(tmp_path / "blobs")
+    monkeypatch.setattr(blob_storage, "get_blob_storage", lambda: storage)
+    tasks = [RenderTask(id=str(uuid4()), status="success", input_json={}) for _ in range(2)]
+    with SessionLocal() as db:
+        for task in tasks:
+            output = tmp_path / f"{task.id}.png"
+            output.write_bytes(b"same bytes")
+            blob_storage.store_render_output(db, task, output)
+            db.add(task)
+        db.commit()
+
+        digest = tasks[0].blob_hash
+        assert tasks[1].blob_hash == digest
+        assert tasks[0].output_file_path == str(tmp_path / "blobs" / digest[:2] / digest[2:4] / f"{digest}.png")
+        assert db.get(RenderBlob, digest).ref_count == 2
+        assert [path.name for path in tmp_path.rglob("*.png")] == [f"{digest}.png"]
+
+        blob_storage.release_blobs(db, [digest])
+        assert blob_storage.purge_unreferenced_blobs(db, grace_seconds=0) == (0, 0)
+        blob_storage.release_blobs(db, [digest])
+        # Unreferenced rows and files are kept for the grace period first.
+        assert blob_storage.purge_unreferenced_blobs(db) == (0, 0)
+        assert db.get(RenderBlob, digest, populate_existing=True).released_at is not None
+        assert blob_storage.purge_unreferenced_blobs(db, grace_seconds=0) == (1, len(b"same bytes"))
+    assert not (tmp_path / "blobs" / digest[:2]).exists()
+
+
+def test_retaining_a_new_blob_from_two_sessions_counts_both_references() -> None:
+    init_db()
+    digest = uuid4().hex * 2
+    key = blob_storage.blob_key(digest, ".png")
+    # The second session starts before the first commits, as two workers storing the same bytes.
+    with SessionLocal() as first, SessionLocal() as second:
+        assert first.get(RenderBlob, digest) is None and second.get(RenderBlob, digest) is None
+        blob_storage.retain_blob(first, digest, key, 10)
+        first.commit()
+        blob_storage.retain_blob(second, digest, key, 10)
+        second.commit()
+    with SessionLocal() as db:
+        blob = db.get(RenderBlob, digest)
+        assert (blob.ref_count, blob.storage_key, blob.released_at) == (2, key, None)
+
+
+def test_blob_sweep_removes_only_old_files_without_a_row(monkeypatch, tmp_path) -> None:
+    init_db()
+    storage = blob_storage.LocalBlobStorage(tmp_path / "blobs")
+    monkeypatch.setattr(blob_storage, "get_blob_storage", lambda: storage)
+    keys = []
+    for content in (b"orphan", b"fresh orphan", b"referenced"):
+        source = tmp_path / "output.png"
+        source.write_bytes(content)
+        keys.append(blob_storage.blob_key(blob_storage.file_digest(source), ".png"))
+        storage.put(keys[-1], source)
+    orphan, fresh, referenced = keys
+    (storage.local_path(orphan).with_suffix(".w320.webp")).write_bytes(b"derivative")
+    old = time.time() - 7200
+    for key in (orphan, referenced):
+        os.utime(storage.local_path(key), (old, old))
+    with SessionLocal() as db:
+        blob_storage.retain_blob(db, Path(referenced).stem, referenced, 10)
+        db.commit()
+
+        assert blob_storage.sweep_orphaned_blobs(db, time.time() - 3600) == (1, len(b"orphan"))
+    assert sorted(key for key, _, _ in storage.iter_blobs()) == sorted([fresh, referenced])
+    assert not list(tmp_path.rglob("*.webp"))
+
+
+def test_s3_blob_storage_round_trip(monkeypatch, tmp_path) -> None:
+    moto = pytest.importorskip("moto")
+    boto3 = pytest.importorskip("boto3")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="renders")
+        storage = blob_storage.S3BlobStorage("renders", "outputs/", tmp_path / "cache", client=client)
+        source = tmp_path / "render.png"
+        source.write_bytes(b"png bytes")
+        key = blob_storage.blob_key(blob_storage.file_digest(source), ".png")
+
+        storage.put(key, source)
+        assert storage.describe(key) == f"s3://renders/outputs/{key}"
+        storage.local_path(key).unlink()
+        assert storage.local_path(key).read_bytes() == b"png bytes"
+
+        assert [blob[0] for blob in storage.iter_blobs()] == [key]
+        assert not storage.delete_if_older(key, time.time() - 3600)
+        assert storage.cache_bytes() == len(b"png bytes")
+        assert storage.trim_cache(0, cutoff=time.time() - 3600) == (0, 0)
+        assert storage.trim_cache(0, cutoff=time.time() + 1) == (1, len(b"png bytes"))
+        assert storage.cache_bytes() == 0
+
+        storage.delete(key)
+        assert client.list_objects_v2(Bucket="renders")["KeyCount"] == 0
+        with pytest.raises(FileNotFoundError):
+            storage.local_path(key)
+
+        # A PDF's cover is its own object, so it comes back after a cache trim drops both copies.
+        pdf = tmp_path / "render.pdf"
+        pdf.write_bytes(b"pdf bytes")
+        variants.cover_path(pdf).write_bytes(b"cover bytes")
+        key = blob_storage.blob_key(blob_storage.file_digest(pdf), ".pdf")
+        storage.put(key, pdf)
+        storage.put(blob_storage.cover_key(key), variants.cover_path(pdf))
+        assert storage.trim_cache(0, cutoff=time.time() + 1) == (2, len(b"pdf bytes") + len(b"cover bytes"))
+        assert variants.cover_path(storage.local_path(key)).read_bytes() == b"cover bytes"
+        storage.delete(key)
+        assert client.list_objects_v2(Bucket="renders")["KeyCount"] == 0
+
+
+def test_font_metrics_index_persists_and_matches_renderer_wrapping(tmp_path) -> None:
+    font_path = resolve_font_path("她屿山海")
+    built = FontMetricsIndex.load_or_build(font_path, tmp_path)
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    loaded = FontMetricsIndex.load_or_build(font_path, tmp_path)
+    assert loaded.boxes == built.boxes
+
+    text = "# 复盘｜方法与指标\n" + "①明确北极星指标，拆解到可执行的过程指标 (KPI, 30%)；\n" * 40
+    for font_size in (16, 24, 48):
+        geometry = PageGeometry.for_canvas((2480, 3507), font_size, 1.8)
+        expected = layout_text(text, geometry, get_glyph_metrics("她屿山海", font_size), font_size, random_seed=0)
+        actual = layout_text(text, geometry, ScaledGlyphMetrics(loaded, font_size), font_size, random_seed=0)
+        assert (actual.page_count, actual.bottom) == (expected.page_count, expected.bottom)
+
+
+def test_polish_condenses_a_draft_that_overflows_the_page(monkeypatch) -> None:
+    prompts = []
+    drafts = iter(["长篇草稿内容，" * 1200, "精简后的笔记\n" * 20])
+
+    def fake_completion(messages):  # noqa: ANN001
+        prompts.append(messages[-1]["content"])
+        return next(drafts)
+
+    monkeypatch.setattr(ai_service, "_request_chat_completion", fake_completion)
+    payload = NotePolishRequest(text="整理增长方法论", font_family="她屿山海", max_expand_rounds=0)
+    result = ai_service.polish_note_text(payload)
+
+    assert len(prompts) == 2
+    assert "超出一页" in prompts[1]
+    assert result.condensed_rounds == 1
+    assert 0 < result.estimated_fill_ratio <= 1.0